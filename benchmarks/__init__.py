@@ -0,0 +1,254 @@
+"""
+Benchmarks for the hot paths of python3-ipfs-api.
+
+The benchmarks run against an in-process :py:class:`~ipfs.fakedaemon.FakeDaemon`,
+so they don't need network access or a running IPFS daemon. Run all of them
+with::
+
+   $ python -m benchmarks -o results.json
+
+and compare a later run with those results::
+
+   $ python -m benchmarks -o new.json --compare results.json
+
+A benchmark is a function decorated with :py:func:`benchmark`. It gets a
+:py:class:`Context` and calls :py:meth:`Context.measure` for every variant it
+measures.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from time import perf_counter
+
+from ipfs.fakedaemon import FakeDaemon
+
+
+BENCHMARKS = []
+""" All registered benchmarks as ``(group, function)`` tuples. """
+
+FORMAT_VERSION = 1
+""" The version of the results format. """
+
+
+def benchmark(group):
+    """
+    Decorator that registers a benchmark function.
+
+    :param group: The name of the group the benchmark belongs to, e.g.
+                  ``"codec"``
+    """
+
+    def decorator(f):
+        BENCHMARKS.append((group, f))
+        return f
+    return decorator
+
+
+
+class Result:
+    """
+    The result of a measurement.
+
+    .. py:attribute:: name
+
+       The unique name of the measurement, e.g. ``"codec.json.loads"``
+
+    .. py:attribute:: unit
+
+       The unit of :py:attr:`value`, either ``"ops/s"`` or ``"MB/s"``
+
+    .. py:attribute:: value
+
+       The throughput of the fastest round
+
+    .. py:attribute:: median
+
+       The throughput of the median round
+
+    .. py:attribute:: params
+
+       A dict of parameters of the measurement
+
+    """
+
+    def __init__(self, name, unit, times, work, params):
+        self.name = name
+        self.unit = unit
+        self.times = times
+        self.params = params
+        self.value = work / min(times)
+        self.median = work / statistics.median(times)
+
+
+    def as_dict(self):
+        return {"name": self.name, "unit": self.unit, "value": self.value,
+                "median": self.median, "rounds": len(self.times),
+                "times": self.times, "params": self.params}
+
+
+
+class Context:
+    """
+    Passed to benchmark functions. It provides the fake daemon and collects
+    the results.
+
+    .. py:attribute:: quick
+
+       Whether to run fewer rounds with smaller inputs, e.g. for smoke tests
+
+    """
+
+    def __init__(self, quick = False, latency = 0.0, min_time = 0.2, rounds = 5, filter = None):
+        """
+        :param quick:    See :py:attr:`quick`
+        :param latency:  The latency in seconds the fake daemon adds to every
+                         call
+        :param min_time: The minimum duration of a round in seconds. Work is
+                         repeated within a round until it's reached.
+        :param rounds:   The number of rounds per measurement
+        :param filter:   Only run measurements whose names contain this string
+        """
+
+        self.quick = quick
+        self.latency = latency
+        self.min_time = min_time if (not quick) else min_time / 10
+        self.rounds = rounds if (not quick) else 2
+        self.filter = filter
+        self.results = []
+
+
+    def daemon(self, **kwargs):
+        """
+        Return a started :py:class:`~ipfs.fakedaemon.FakeDaemon` with the
+        configured latency. Use it as context manager to stop it afterwards.
+
+        :param kwargs: Further arguments for the fake daemon
+        """
+        kwargs.setdefault("latency", self.latency)
+        return FakeDaemon(**kwargs).start()
+
+
+    def wants(self, name):
+        """ Return whether the measurement with that name should be run. """
+        return not self.filter or self.filter in name
+
+
+    def measure(self, name, f, ops = 1, nbytes = None, setup = None, **params):
+        """
+        Measure a function.
+
+        :param name:   The name of the measurement
+        :param f:      The function to measure. It's called without arguments,
+                       or with the return value of ``setup``.
+        :param ops:    The number of operations one call of ``f`` does
+        :param nbytes: The number of bytes one call of ``f`` processes. If
+                       given, the throughput is reported in MB/s instead of
+                       ops/s.
+        :param setup:  A function that is called (untimed) before every call
+                       of ``f`` (optional)
+        :param params: Parameters that are stored with the result
+        :return:       The :py:class:`Result` or ``None``, if it was filtered
+        """
+
+        if (not self.wants(name)):
+            return None
+
+        # find the number of calls per round
+        calls = 1
+        while (True):
+            elapsed = self._round(f, setup, calls)
+            if (elapsed >= self.min_time or calls >= 1 << 20):
+                break
+            calls *= 2 if (elapsed <= 0) else max(2, min(int(self.min_time / elapsed) + 1, 10))
+
+        times = [self._round(f, setup, calls) / calls for i in range(self.rounds)]
+        if (nbytes != None):
+            result = Result(name, "MB/s", times, nbytes / 1e6, params)
+        else:
+            result = Result(name, "ops/s", times, ops, params)
+        self.results.append(result)
+        print("{:<56s} {:>12.1f} {:<6s} (median {:.1f})".format(name, result.value, result.unit, result.median), flush = True)
+        return result
+
+
+    @staticmethod
+    def _round(f, setup, calls):
+        elapsed = 0.0
+        for i in range(calls):
+            if (setup):
+                arg = setup()
+                start = perf_counter()
+                f(arg)
+            else:
+                start = perf_counter()
+                f()
+            elapsed += perf_counter() - start
+        return elapsed
+
+
+
+def metadata():
+    """ Return information about the environment the benchmarks ran in. """
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr = subprocess.DEVNULL,
+                                         cwd = os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"format": FORMAT_VERSION,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": commit,
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine()}
+
+
+def write_results(path, context, meta):
+    """ Write the results of a run as JSON to a file. """
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": [r.as_dict() for r in context.results]}, f, indent = 2)
+        f.write("\n")
+
+
+def compare(baseline_path, context, threshold = 0.1):
+    """
+    Print the relative change of every result compared to a previous run.
+
+    :param baseline_path: The path of the results of the previous run
+    :param threshold:     Relative slowdowns larger than this are marked as
+                          regressions
+    :return:              The names of the regressed measurements
+    """
+
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in context.results:
+        old = baseline.get(result.name)
+        if (old == None or old["unit"] != result.unit or not old["value"]):
+            continue
+        change = result.value / old["value"] - 1.0
+        mark = ""
+        if (change < -threshold):
+            mark = "  REGRESSION"
+            regressions.append(result.name)
+        print("{:<56s} {:>+8.1%}{}".format(result.name, change, mark))
+    return regressions
+
+
+
+__all__ = [
+    "BENCHMARKS",
+    "benchmark",
+    "Result",
+    "Context",
+    "metadata",
+    "write_results",
+    "compare"
+]
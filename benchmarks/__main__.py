@@ -0,0 +1,49 @@
+"""
+Run the benchmarks. See ``python -m benchmarks --help``.
+"""
+
+import argparse
+import sys
+
+from . import BENCHMARKS, Context, metadata, write_results, compare
+from . import bench_codec, bench_proxy, bench_merkledag, bench_unixfs
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks",
+                                     description = "Benchmark python3-ipfs-api against an in-process fake daemon.")
+    parser.add_argument("-o", "--output", help = "write the results as JSON to this file")
+    parser.add_argument("-g", "--group", action = "append",
+                        help = "only run benchmarks of this group (may be repeated)")
+    parser.add_argument("-k", "--filter", help = "only run measurements whose names contain this string")
+    parser.add_argument("--quick", action = "store_true", help = "run fewer rounds with smaller inputs")
+    parser.add_argument("--latency", type = float, default = 0.0,
+                        help = "latency in seconds the fake daemon adds to every call")
+    parser.add_argument("--rounds", type = int, default = 5, help = "rounds per measurement")
+    parser.add_argument("--compare", metavar = "BASELINE", help = "compare with the results of a previous run")
+    parser.add_argument("--threshold", type = float, default = 0.1,
+                        help = "relative slowdown reported as regression (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    context = Context(quick = args.quick, latency = args.latency, rounds = args.rounds, filter = args.filter)
+    meta = metadata()
+    meta["latency"] = args.latency
+    meta["quick"] = args.quick
+
+    for group, f in BENCHMARKS:
+        if (args.group and group not in args.group):
+            continue
+        f(context)
+
+    if (args.output):
+        write_results(args.output, context, meta)
+
+    if (args.compare):
+        print()
+        if (compare(args.compare, context, args.threshold)):
+            return 1
+    return 0
+
+
+if (__name__ == "__main__"):
+    sys.exit(main())
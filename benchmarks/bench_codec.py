@@ -0,0 +1,207 @@
+"""
+Encoding and decoding throughput of the codecs.
+"""
+
+import base64
+import codecs
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from ipfs import codec
+from ipfs.fakedaemon import multihash
+from ipfs.proto.merkledag import PBMerkleDag
+from ipfs.proto.unixfs import UnixFsProtocol
+
+from . import benchmark
+
+
+PBNode = codec.PB2(PBMerkleDag, "PBNode")
+UnixFsData = codec.PB2(UnixFsProtocol, "Data")
+GENERIC_PBNODE = codec.Protobuf2(PBMerkleDag, "PBNode")
+GENERIC_UNIXFS_DATA = codec.Protobuf2(UnixFsProtocol, "Data")
+
+
+def links(n):
+    return [{"Name": "file-{:05d}".format(i), "Hash": multihash(str(i).encode()), "Size": 262158 + i}
+            for i in range(n)]
+
+
+@benchmark("codec")
+def bench_json(ctx):
+    for n in ((10, 100) if (ctx.quick) else (10, 100, 1000)):
+        obj = {"Hash": multihash(b"root"), "Links": links(n)}
+        data = codec.JSON.dumps(obj)
+        ctx.measure("codec.json.dumps[links={:d}]".format(n), lambda: codec.JSON.dumps(obj),
+                    nbytes = len(data), links = n)
+        ctx.measure("codec.json.loads[links={:d}]".format(n), lambda: codec.JSON.loads(data),
+                    nbytes = len(data), links = n)
+        ctx.measure("codec.json.load[links={:d}]".format(n), lambda f: codec.JSON.load(f),
+                    setup = lambda: BytesIO(data), nbytes = len(data), links = n)
+
+
+@benchmark("codec")
+def bench_json_vector(ctx):
+    n = 100 if (ctx.quick) else 1000
+    items = [{"Name": l["Name"], "Hash": l["Hash"]} for l in links(n)]
+    data = b"".join(codec.JSON.dumps(item) + b"\n" for item in items)
+    ctx.measure("codec.jsonv.load[items={:d}]".format(n), lambda f: list(codec.JSONV.load(f)),
+                setup = lambda: BytesIO(data), nbytes = len(data), items = n)
+    ctx.measure("codec.jsonv.dump_iter[items={:d}]".format(n), lambda: b"".join(codec.JSONV.dump_iter(items)),
+                nbytes = len(data), items = n)
+
+
+def _legacy_jsonv_load(f):
+    """ JsonVector.load as it was before the backends: a UTF-8 reader over the stream. """
+    for l in codecs.getreader("utf-8")(f):
+        yield json.loads(l)
+
+
+def _count(items):
+    n = 0
+    for item in items:
+        n += 1
+    return n
+
+
+@benchmark("codec")
+def bench_json_stream(ctx):
+    """ Streamed ``refs``-like responses of several hundred MB, by JSON backend. """
+    size = (8 if (ctx.quick) else 256) << 20
+    line = codec.JSON.dumps({"Ref": multihash(b"ref"), "Err": ""}) + b"\n"
+    data = line * (size // len(line))
+    n = size // len(line)
+    ctx.measure("codec.jsonv.stream.legacy[mb={:d}]".format(size >> 20), lambda f: _count(_legacy_jsonv_load(f)),
+                setup = lambda: BytesIO(data), nbytes = len(data), items = n)
+    for name in codec.JSON_BACKENDS:
+        try:
+            jsonv = codec.JsonVector(codec.json_backend(name).name)
+        except ImportError:
+            continue
+        ctx.measure("codec.jsonv.stream.{}[mb={:d}]".format(name, size >> 20), lambda f: _count(jsonv.load(f)),
+                    setup = lambda: BytesIO(data), nbytes = len(data), items = n)
+
+
+@benchmark("codec")
+def bench_json_items(ctx):
+    """ A ``pin/ls`` response of several hundred MB, decoded whole and incrementally. """
+    size = (8 if (ctx.quick) else 256) << 20
+    entry = b'"' + multihash(b"pin").encode() + b'":{"Type":"recursive"}'
+    n = size // (len(entry) + 1)
+    data = b'{"Keys":{' + b",".join([entry.replace(b"Qm", b"Qm%08d" % i, 1) for i in range(n)]) + b"}}"
+    ctx.measure("codec.json.pinls.load[mb={:d}]".format(size >> 20), lambda f: len(codec.JSON.load(f)["Keys"]),
+                setup = lambda: BytesIO(data), nbytes = len(data), items = n)
+    for name in codec.JSON_BACKENDS:
+        try:
+            items = codec.JsonItems(["Keys"], codec.json_backend(name).name)
+        except ImportError:
+            continue
+        ctx.measure("codec.json.pinls.items.{}[mb={:d}]".format(name, size >> 20), lambda f: _count(items.load(f)),
+                    setup = lambda: BytesIO(data), nbytes = len(data), items = n)
+
+
+def record(i):
+    """ A realistic structured node value: a file record with a binary hash. """
+    return {"name": "file-{:05d}.txt".format(i), "size": 262144 + i, "mtime": 1700000000.5 + i, "mode": 0o644,
+            "hash": hashlib.sha256(str(i).encode()).digest(), "tags": ["a", "b"], "deleted": False, "parent": None}
+
+
+def json_record(i):
+    """ :py:func:`record` as it's stored with JSON, i.e. with a base64 hash. """
+    r = record(i)
+    r["hash"] = base64.b64encode(r["hash"]).decode()
+    return r
+
+
+@benchmark("codec")
+def bench_value_codecs(ctx):
+    """ Size and speed of the Merkledag value codecs. """
+    for n in ((1, 100) if (ctx.quick) else (1, 100, 1000)):
+        values = (("cbor", codec.CBOR, record, lambda v: v),
+                  ("json", codec.JSON, json_record,
+                   lambda v: [base64.b64decode(r["hash"]) for r in v["entries"]]),
+                  ("pickle", codec.PICKLE, record, lambda v: v))
+        for name, vcodec, make, post in values:
+            value = {"version": 2, "entries": [make(i) for i in range(n)]}
+            data = vcodec.dumps(value)
+            if (ctx.wants("codec.value.{}".format(name))):
+                print("  {} size[records={:d}]: {:d} bytes".format(name, n, len(data)))
+            ctx.measure("codec.value.{}.dumps[records={:d}]".format(name, n), lambda: vcodec.dumps(value),
+                        nbytes = len(data), records = n, size = len(data))
+            # JSON needs an extra pass to decode the hashes
+            ctx.measure("codec.value.{}.loads[records={:d}]".format(name, n), lambda: post(vcodec.loads(data)),
+                        nbytes = len(data), records = n, size = len(data))
+
+
+@benchmark("codec")
+def bench_compressed(ctx):
+    """ Size and speed of compressed JSON values by compressor. """
+    n = 100 if (ctx.quick) else 1000
+    value = {"version": 2, "entries": [json_record(i) for i in range(n)]}
+    raw = codec.JSON.dumps(value)
+    for name in ("none", "zlib", "bz2", "lzma"):
+        for level in ((None,) if (name != "zlib") else (1, None)):
+            ccodec = codec.Compressed(codec.JSON, name, level)
+            data = ccodec.dumps(value)
+            label = name if (level == None) else "{}{:d}".format(name, level)
+            if (ctx.wants("codec.compressed.{}".format(label))):
+                print("  {} size[records={:d}]: {:d} of {:d} bytes".format(label, n, len(data), len(raw)))
+            ctx.measure("codec.compressed.{}.dumps[records={:d}]".format(label, n), lambda: ccodec.dumps(value),
+                        nbytes = len(raw), records = n, size = len(data))
+            ctx.measure("codec.compressed.{}.loads[records={:d}]".format(label, n), lambda: ccodec.loads(data),
+                        nbytes = len(raw), records = n, size = len(data))
+
+
+@benchmark("codec")
+def bench_protobuf2(ctx):
+    for n in ((0, 100) if (ctx.quick) else (0, 10, 100, 1000)):
+        node = {"Data": b"\x08\x01", "Links": links(n)}
+        data = PBNode.dumps(node)
+        ctx.measure("codec.pb2.node.dumps[links={:d}]".format(n), lambda: PBNode.dumps(node),
+                    nbytes = len(data), links = n)
+        ctx.measure("codec.pb2.node.loads[links={:d}]".format(n), lambda: PBNode.loads(data),
+                    nbytes = len(data), links = n)
+
+    for size in ((4096, 262144) if (ctx.quick) else (256, 4096, 65536, 262144, 1048576)):
+        data = UnixFsData.dumps({"Type": "File", "Data": os.urandom(size), "filesize": size})
+        ctx.measure("codec.pb2.unixfs.loads[size={:d}]".format(size), lambda: UnixFsData.loads(data),
+                    nbytes = len(data), size = size)
+        block = PBNode.dumps({"Data": data})
+        ctx.measure("codec.pb2.block.loads[size={:d}]".format(size),
+                    lambda: UnixFsData.loads(PBNode.loads(block)["Data"]),
+                    nbytes = len(block), size = size)
+
+
+@benchmark("codec")
+def bench_protobuf2_fast(ctx):
+    """ The specialized PBNode/Data codecs against the generic pb2nano codec. """
+    shapes = ((1000, 1 << 20),) if (ctx.quick) else ((1000, 1 << 20), (5000, 4 << 20), (20000, 0))
+    impls = (("generic", GENERIC_PBNODE, GENERIC_UNIXFS_DATA), ("fast", PBNode, UnixFsData))
+    for n, size in shapes:
+        data = GENERIC_UNIXFS_DATA.dumps({"Type": "File", "Data": os.urandom(size), "filesize": size,
+                                          "blocksize": [262144] * n})
+        node = {"Links": links(n), "Data": data}
+        block = GENERIC_PBNODE.dumps(node)
+        suffix = "[links={:d},size={:d}]".format(n, size)
+        params = {"links": n, "size": size}
+        for impl, node_codec, data_codec in impls:
+            ctx.measure("codec.pb2.{}.node.loads{}".format(impl, suffix), lambda: node_codec.loads(block),
+                        nbytes = len(block), impl = impl, **params)
+            # touch every hash, so the deferred base58 encoding is included
+            ctx.measure("codec.pb2.{}.node.loads+hashes{}".format(impl, suffix),
+                        lambda: [l["Hash"] for l in node_codec.loads(block)["Links"]],
+                        nbytes = len(block), impl = impl, **params)
+            ctx.measure("codec.pb2.{}.node.dumps{}".format(impl, suffix), lambda: node_codec.dumps(node),
+                        nbytes = len(block), impl = impl, **params)
+            ctx.measure("codec.pb2.{}.unixfs.loads{}".format(impl, suffix), lambda: data_codec.loads(data),
+                        nbytes = len(data), impl = impl, **params)
+
+        # building a file's block index only needs the sizes
+        lazy = codec.PB2(UnixFsProtocol, "Data", lazy = True, zero_copy = True)
+        for impl, data_codec in (("fast", UnixFsData), ("lazy", lazy)):
+            def index():
+                value = data_codec.loads(data)
+                return value["filesize"], value["blocksize"]
+            ctx.measure("codec.pb2.{}.unixfs.index{}".format(impl, suffix), index,
+                        nbytes = len(data), impl = impl, **params)
@@ -0,0 +1,199 @@
+"""
+Merkledag traversal speed in nodes per second.
+"""
+
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from ipfs import codec
+from ipfs.api import IpfsApi, HttpProxy
+from ipfs.diskcache import DiskCache
+from ipfs.merkledag import FETCH_MODES, Merkledag
+
+from . import benchmark
+from .bench_codec import record, json_record
+
+
+def build_tree(daemon, fanout, depth, data = b"node"):
+    """
+    Store a tree of nodes in the fake daemon.
+
+    :return: The key of the root and the number of nodes
+    """
+
+    if (depth == 0):
+        return daemon.put_node(data), 1
+    links = []
+    count = 1
+    for i in range(fanout):
+        key, n = build_tree(daemon, fanout, depth - 1, data + b"/" + str(i).encode())
+        links.append({"Name": str(i), "Hash": key, "Size": 0})
+        count += n
+    return daemon.put_node(data, links), count
+
+
+def traverse(dag, root, with_data = False):
+    """ Visit all nodes reachable from root, breadth first. """
+    queue = [dag[root]]
+    visited = 0
+    while (queue):
+        node = queue.pop()
+        visited += 1
+        if (with_data):
+            node.value
+        queue.extend(link.follow() for link in node.links)
+    return visited
+
+
+@benchmark("merkledag")
+def bench_traversal(ctx):
+    shapes = ((4, 2),) if (ctx.quick) else ((4, 3), (16, 2), (2, 7))
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        for fanout, depth in shapes:
+            root, count = build_tree(daemon, fanout, depth)
+            params = {"fanout": fanout, "depth": depth, "nodes": count}
+            suffix = "[fanout={:d},depth={:d}]".format(fanout, depth)
+            ctx.measure("merkledag.traverse.links" + suffix,
+                        lambda: traverse(Merkledag(ipfs), root), ops = count, **params)
+            ctx.measure("merkledag.traverse.links+data" + suffix,
+                        lambda: traverse(Merkledag(ipfs), root, True), ops = count, **params)
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_fetch_modes(ctx):
+    """ Traversing a DAG with values, by the way nodes are fetched. """
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 4)
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, fanout, depth)
+        for fetch in FETCH_MODES:
+            ctx.measure("merkledag.traverse.fetch[{}]".format(fetch),
+                        lambda: traverse(Merkledag(ipfs, fetch = fetch), root, True),
+                        ops = count, nodes = count, fetch = fetch)
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_path_resolution(ctx):
+    depth = 4 if (ctx.quick) else 8
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, 1, depth)
+        dag = Merkledag(ipfs)
+
+        def walk():
+            node = dag[root]
+            for i in range(depth):
+                node = node["0"]
+        ctx.measure("merkledag.follow[depth={:d}]".format(depth), walk, ops = depth, depth = depth)
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_concurrent_traversal(ctx):
+    """ Threads traversing the same DAG, with and without request coalescing. """
+    threads = 8
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 3)
+    # coalescing only pays off if requests overlap, so simulate a local daemon
+    latency = ctx.latency or 0.001
+    with ctx.daemon(latency = latency) as daemon:
+        root, count = build_tree(daemon, fanout, depth)
+        for coalesce in (False, True):
+            proxy = HttpProxy(daemon.host, daemon.port, coalesce = coalesce)
+            ipfs = IpfsApi(proxy = proxy)
+            with ThreadPoolExecutor(threads) as pool:
+                run = lambda: list(pool.map(lambda i: traverse(Merkledag(ipfs), root), range(threads)))
+                ctx.measure("merkledag.traverse.threads[coalesce={}]".format(coalesce).lower(), run,
+                            ops = count * threads, threads = threads, nodes = count,
+                            latency = latency, coalesce = coalesce)
+            if (coalesce):
+                print("  {!r}".format(proxy.coalesce_stats()))
+            proxy.close()
+
+
+@benchmark("merkledag")
+def bench_value(ctx):
+    """ Node.value of a structured value, by codec. """
+    n = 100 if (ctx.quick) else 1000
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        for name, vcodec, make in (("cbor", codec.CBOR, record), ("json", codec.JSON, json_record),
+                                   ("pickle", codec.PICKLE, record),
+                                   ("json+zlib", codec.Compressed(codec.JSON), json_record)):
+            data = vcodec.dumps({"version": 2, "entries": [make(i) for i in range(n)]})
+            key = daemon.put_node(data)
+            dag = Merkledag(ipfs, codec = vcodec)
+            ctx.measure("merkledag.value.{}[records={:d}]".format(name, n), lambda: dag[key].value,
+                        records = n, size = len(data))
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_cached_traversal(ctx):
+    """ Traversing the same DAG repeatedly with one Merkledag, with and without the node cache. """
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 4)
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, fanout, depth)
+        for cache_size in (0, 32 << 20):
+            dag = Merkledag(ipfs, cache_size = cache_size)
+            ctx.measure("merkledag.traverse.repeat[cache={:d}]".format(cache_size),
+                        lambda: traverse(dag, root, True), ops = count, nodes = count, cache_size = cache_size)
+            print("  {!r}".format(dag.cache_stats()))
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_disk_cache(ctx):
+    """ Traversing a DAG after a restart, i.e. with a new Merkledag, with and without a warm disk cache. """
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 4)
+    with ctx.daemon() as daemon, tempfile.TemporaryDirectory() as tmp:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, fanout, depth)
+        with DiskCache(tmp) as cache:
+            traverse(Merkledag(ipfs, disk_cache = cache), root, True)
+
+        def restart(disk):
+            if (not disk):
+                return traverse(Merkledag(ipfs), root, True)
+            with DiskCache(tmp) as cache:
+                return traverse(Merkledag(ipfs, disk_cache = cache), root, True)
+
+        for disk in (False, True):
+            ctx.measure("merkledag.traverse.restart[disk_cache={}]".format(disk), lambda: restart(disk),
+                        ops = count, nodes = count, disk_cache = disk)
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_walk(ctx):
+    """ Merkledag.walk with a thread pool against a sequential traversal. """
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 4)
+    # parallel loading only pays off with round trip latency, so simulate a local daemon
+    latency = ctx.latency or 0.001
+    with ctx.daemon(latency = latency) as daemon:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, fanout, depth)
+        ctx.measure("merkledag.walk[sequential]", lambda: traverse(Merkledag(ipfs), root, True),
+                    ops = count, nodes = count, latency = latency)
+        for workers in (1, 8, 32):
+            walk = lambda: sum(1 for _ in Merkledag(ipfs).walk(root, workers = workers, values = True))
+            ctx.measure("merkledag.walk[workers={:d}]".format(workers), walk, ops = count, nodes = count,
+                        workers = workers, latency = latency)
+        ipfs._proxy.close()
+
+
+@benchmark("merkledag")
+def bench_edges(ctx):
+    """ Enumerating all edges of a DAG with one refs request against loading the links of every node. """
+    fanout, depth = (4, 2) if (ctx.quick) else (4, 5)
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        root, count = build_tree(daemon, fanout, depth)
+        ctx.measure("merkledag.edges[links]", lambda: sum(len(n.links) for _, _, n in Merkledag(ipfs).walk(root)),
+                    ops = count - 1, nodes = count)
+        ctx.measure("merkledag.edges[refs]", lambda: sum(1 for _ in Merkledag(ipfs).edges(root)),
+                    ops = count - 1, nodes = count)
+        ipfs._proxy.close()
@@ -0,0 +1,96 @@
+"""
+Request rate of small RPC calls.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from ipfs import codec
+from ipfs.api import IpfsApi, AsyncIpfsApi
+from ipfs.api.proxy import Proxy
+
+from . import benchmark
+
+
+EMPTY = "QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn"
+
+
+
+class NullProxy:
+    """
+    A root proxy that answers every call from memory. It's used to measure
+    the Python overhead of a call without the transport.
+    """
+
+    RESPONSE = b'{"Hash": "QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn", "Links": []}'
+
+    def __init__(self):
+        self.root = Proxy(self, "")
+
+    def _call_endpoint(self, path, args, opts, f_in):
+        return BytesIO(self.RESPONSE)
+
+    def _load_output(self, outputenc, out):
+        return outputenc.load(out)
+
+
+@benchmark("proxy")
+def bench_call_overhead(ctx):
+    proxy = NullProxy()
+    root = proxy.root
+    ipfs = IpfsApi(proxy = proxy)
+    links = root.object.links.compile(codec.JSON)
+    data = root.object.data.compile()
+
+    # proxy chains as they are built for every call without compiled endpoints
+    ctx.measure("proxy.overhead.chain.links", lambda: root.object.links[EMPTY].with_outputenc(codec.JSON)())
+    ctx.measure("proxy.overhead.compiled.links", lambda: links(EMPTY))
+    ctx.measure("proxy.overhead.chain.data", lambda: root.object.data[EMPTY]())
+    ctx.measure("proxy.overhead.compiled.data", lambda: data(EMPTY))
+    ctx.measure("proxy.overhead.api.object.links", lambda: ipfs.object.links(EMPTY))
+
+
+@benchmark("proxy")
+def bench_small_calls(ctx):
+    with ctx.daemon() as daemon:
+        ipfs = daemon.api()
+        node = ipfs.object.put({"Data": b"Hello World"})["Hash"]
+
+        ctx.measure("proxy.version", ipfs.version)
+        ctx.measure("proxy.object.links", lambda: ipfs.object.links(EMPTY))
+        ctx.measure("proxy.object.data", lambda: ipfs.object.data(node).read())
+        ctx.measure("proxy.object.get", lambda: ipfs.object.get(node))
+        ctx.measure("proxy.block.get", lambda: ipfs.block.get(node).read())
+        ipfs._proxy.close()
+
+
+@benchmark("proxy")
+def bench_concurrent_calls(ctx):
+    calls = 64
+    with ctx.daemon() as daemon:
+        for threads in ((4,) if (ctx.quick) else (2, 8, 32)):
+            ipfs = daemon.api()
+            with ThreadPoolExecutor(threads) as pool:
+                run = lambda: list(pool.map(lambda i: ipfs.object.links(EMPTY), range(calls)))
+                ctx.measure("proxy.object.links.threads[threads={:d}]".format(threads), run,
+                            ops = calls, threads = threads)
+            ipfs._proxy.close()
+
+
+@benchmark("proxy")
+def bench_async_calls(ctx):
+    calls = 64
+
+    async def run(ipfs):
+        await asyncio.gather(*(ipfs.object.links(EMPTY) for i in range(calls)))
+
+    with ctx.daemon() as daemon:
+        loop = asyncio.new_event_loop()
+        try:
+            ipfs = AsyncIpfsApi(daemon.host, daemon.port)
+            ctx.measure("proxy.async.object.links[concurrency={:d}]".format(calls),
+                        lambda: loop.run_until_complete(run(ipfs)), ops = calls, concurrency = calls)
+            loop.run_until_complete(ipfs.close())
+        finally:
+            loop.close()
@@ -0,0 +1,70 @@
+"""
+Read throughput of unixfs files for sequential and random reads, across file
+sizes and numbers of blocks.
+"""
+
+import io
+import os
+import random
+
+from ipfs.unixfs import UnixFs
+
+from . import benchmark
+
+
+KB = 1024
+MB = 1024 * KB
+
+
+def read_sequential(f, read_size):
+    n = 0
+    while (True):
+        data = f.read(read_size)
+        if (not data):
+            return n
+        n += len(data)
+
+
+def read_random(f, offsets, read_size):
+    for offset in offsets:
+        f.seek(offset, io.SEEK_SET)
+        f.read(read_size)
+
+
+@benchmark("unixfs")
+def bench_read(ctx):
+    if (ctx.quick):
+        variants = [(1 * MB, 256 * KB)]
+    else:
+        variants = [(64 * KB, 256 * KB), (1 * MB, 256 * KB), (1 * MB, 16 * KB),
+                    (8 * MB, 256 * KB), (8 * MB, 64 * KB)]
+
+    for size, chunk_size in variants:
+        with ctx.daemon(chunk_size = chunk_size) as daemon:
+            ipfs = daemon.api()
+            fs = UnixFs(ipfs)
+            key = daemon.add_bytes(os.urandom(size))
+            blocks = max(1, -(-size // chunk_size))
+            params = {"size": size, "chunk_size": chunk_size, "blocks": blocks}
+            suffix = "[size={:d}K,blocks={:d}]".format(size // KB, blocks)
+
+            ctx.measure("unixfs.open" + suffix, lambda: fs.open(key, "rb"), **params)
+
+            ctx.measure("unixfs.read.all" + suffix, lambda f: f.read(),
+                        setup = lambda: fs.open(key, "rb"), nbytes = size, **params)
+
+            for read_size in (4 * KB, 64 * KB):
+                ctx.measure("unixfs.read.sequential[read={:d}K]{}".format(read_size // KB, suffix),
+                            lambda f: read_sequential(f, read_size),
+                            setup = lambda: fs.open(key, "rb"), nbytes = size,
+                            read_size = read_size, **params)
+
+            reads = 16 if (ctx.quick) else 64
+            read_size = 4 * KB
+            rng = random.Random(size ^ chunk_size)
+            offsets = [rng.randrange(0, max(1, size - read_size)) for i in range(reads)]
+            ctx.measure("unixfs.read.random[read={:d}K]{}".format(read_size // KB, suffix),
+                        lambda f: read_random(f, offsets, read_size),
+                        setup = lambda: fs.open(key, "rb"), ops = reads,
+                        read_size = read_size, reads = reads, **params)
+            ipfs._proxy.close()
@@ -6,17 +6,27 @@ To get started create an instance of :py:class:`IpfsApi`::
    >>> from ipfs.api import IpfsApi
    >>> ipfs = IpfsApi()
 
+If you're using :py:mod:`asyncio`, use :py:class:`AsyncIpfsApi` instead::
+
+   >>> from ipfs.api import AsyncIpfsApi
+   >>> ipfs = AsyncIpfsApi()
+   >>> await ipfs.version()
+
 """
 
 
 from .. import codec
 from .proxy import HttpProxy
+from .aioproxy import AsyncHttpProxy
+from .unix import UnixHttpProxy
+from .balance import MultiHttpProxy
 from .block import BlockApi
 from .dht import DhtApi
 from .object import ObjectApi
 from .config import ConfigApi
 from .name import NameApi
 from .pin import PinApi
+from .refs import RefsApi
 from .file import FileApi
 
 
@@ -53,26 +63,46 @@ class IpfsApi:
 
     """
 
-    def __init__(self, host = "localhost", port = 5001):
+    def __init__(self, host = "localhost", port = 5001, proxy = None, unix_socket = None, timeout = None):
         """
         Create an instance of an IPFS API.
 
-        :param host: The hostname where the API is running.
-        :param port: The port which the API is listening to.
+        :param host:        The hostname where the API is running.
+        :param port:        The port which the API is listening to.
+        :param proxy:       The root proxy used to issue API calls (optional).
+                            If specified, all other parameters are ignored.
+        :param unix_socket: The path of a Unix domain socket the API is
+                            listening to (optional). If specified, ``host``
+                            and ``port`` are ignored.
+        :param timeout:     The default timeout in seconds for every call
+                            (optional). See :py:mod:`ipfs.api.deadline`.
         """
 
-        self._proxy = HttpProxy(host, port)
+        if (proxy == None):
+            proxy = self._create_proxy(host, port, unix_socket, timeout)
+        self._proxy = proxy
         self._rpc = r = self._proxy.root
-        
+        self._id = r.id.compile(codec.JSON)
+        self._version = r.version.compile(codec.JSON)
+        self._resolve = r.resolve.compile(codec.JSON)
+        self._repo_gc = r.repo.gc.compile(codec.JSONV)
+
         self.block = BlockApi(r)
         self.dht = DhtApi(r)
         self.object = ObjectApi(r)
         self.config = ConfigApi(r)
         self.name = NameApi(r)
         self.pin = PinApi(r)
+        self.refs = RefsApi(r)
         self.file = FileApi(r)
 
 
+    def _create_proxy(self, host, port, unix_socket, timeout):
+        if (unix_socket):
+            return UnixHttpProxy(unix_socket, timeout = timeout)
+        return HttpProxy(host, port, timeout = timeout)
+
+
     def id(self, peer_id = None):
         """
         Return information about the specified IPFS peer. If no peer is
@@ -86,7 +116,7 @@ class IpfsApi:
            ``AgentVersion``:    The peer's agent version
            ``ProtocolVersion``: The peer's protocol version
         """
-        return self._rpc.id.with_outputenc(codec.JSON)(peer_id)
+        return self._id(peer_id)
 
 
     def version(self):
@@ -105,7 +135,7 @@ class IpfsApi:
 
         """
 
-        return self._rpc.version.with_outputenc(codec.JSON)()
+        return self._version()
 
 
     def resolve(self, name, recursive = None):
@@ -124,12 +154,50 @@ class IpfsApi:
         
         """
         
-        return self._rpc.resolve.with_outputenc(codec.JSON)(name, recursive = recursive)
+        return self._resolve(name, recursive = recursive)
 
 
     def repo_gc(self):
         """ Perform a garbage collection sweep on the repo. """
-        return self._rpc.repo.gc.with_outputenc(codec.JSONV)()
+        return self._repo_gc()
+
+
+
+class AsyncIpfsApi(IpfsApi):
+    """
+    An :py:mod:`asyncio` wrapper for the IPFS HTTP API. It exposes the same
+    sub-commands and top-level commands as :py:class:`IpfsApi`, but all of them
+    return coroutines.
+
+    Byte streams are returned as
+    :py:class:`~ipfs.api.aioproxy.AsyncResponseStream` and vectors of JSON
+    objects (e.g. :py:meth:`~ipfs.api.dht.DhtApi.query`) as asynchronous
+    iterators.
+
+    Example::
+
+       >>> async with AsyncIpfsApi() as ipfs:
+               key = "QmPZ9gcCEpqKTo6aq61g2nXGUhM4iCL3ewB6LDXZCtioEB"
+               f = await ipfs.file.cat(key)
+               print((await f.read()).decode())
+
+    """
+
+    def _create_proxy(self, host, port, unix_socket, timeout):
+        return AsyncHttpProxy(host, port, unix_socket = unix_socket, timeout = timeout)
+
+
+    async def close(self):
+        """ Close all idle connections to the API. """
+        await self._proxy.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
 
 
 
@@ -141,6 +209,18 @@ __all__ = [
     "name",
     "object",
     "pin",
+    "refs",
     "proxy",
-    "IpfsApi"
+    "aioproxy",
+    "unix",
+    "session",
+    "multipart",
+    "metrics",
+    "coalesce",
+    "deadline",
+    "hedge",
+    "balance",
+    "schedule",
+    "IpfsApi",
+    "AsyncIpfsApi"
 ]
@@ -0,0 +1,447 @@
+"""
+This module handles HTTP RPC requests with :py:mod:`asyncio`.
+
+:py:class:`AsyncHttpProxy` is a root proxy that can be used in place of
+:py:class:`~ipfs.api.proxy.HttpProxy`. All proxies derived from it return
+coroutines instead of results and the bodies of HTTP responses are returned as
+:py:class:`AsyncResponseStream` objects::
+
+   >>> proxy = AsyncHttpProxy()
+   >>> stream = await proxy.root.cat["QmPZ9gcCEpqKTo6aq61g2nXGUhM4iCL3ewB6LDXZCtioEB"]()
+   >>> data = await stream.read()
+
+Usually you don't use this module directly, but
+:py:class:`~ipfs.api.AsyncIpfsApi`.
+"""
+
+import asyncio
+from urllib.parse import urlencode, quote
+
+from .proxy import Proxy, ProxyError, build_params
+from .deadline import DeadlineExceeded, expires_at, remaining
+from .metrics import Instrumented
+from .multipart import MultipartEncoder
+
+
+class AsyncResponseStream:
+    """
+    An asynchronous readable byte stream over the body of an HTTP response.
+
+    Iterating over the stream with ``async for`` yields lines. The underlying
+    connection is given back to the proxy as soon as the body has been read
+    completely or the stream is closed.
+    """
+
+    CHUNK_SIZE = 65536
+    """ The maximum number of bytes read from the connection at once. """
+
+    def __init__(self, proxy, conn, headers, keep_alive, record = None, expires = None):
+        self._proxy = proxy
+        self._expires = expires
+        self._conn = conn
+        self._reader = conn[0]
+        self._keep_alive = keep_alive
+        self._record = record
+        self._buf = bytearray()
+        self._eof = False
+        self._released = False
+
+        self.headers = headers
+        """ The response headers as dict with lower-case keys. """
+
+        if ("chunked" in headers.get("transfer-encoding", "").lower()):
+            self._chunked = True
+            self._remaining = 0
+        elif ("content-length" in headers):
+            self._chunked = False
+            self._remaining = int(headers["content-length"])
+        else:
+            self._chunked = False
+            self._remaining = None
+            self._keep_alive = False
+
+
+    def _release(self, reuse, error = None):
+        if (not self._released):
+            self._released = True
+            self._proxy._release(self._conn, reuse and self._keep_alive)
+            if (self._record):
+                self._proxy._end_call(self._record, error)
+
+
+    def _set_eof(self):
+        self._eof = True
+        self._release(True)
+
+
+    async def _fill(self):
+        """
+        Read the next piece of the body into the buffer.
+
+        :return: False if the end of the body was reached, True otherwise.
+        """
+
+        if (self._eof):
+            return False
+        if (self._expires == None):
+            return await self._fill_once()
+
+        try:
+            return await asyncio.wait_for(self._fill_once(), remaining(self._expires))
+        except (asyncio.TimeoutError, DeadlineExceeded) as e:
+            # the connection is in an unknown state, so it's closed
+            error = DeadlineExceeded("Deadline exceeded while reading response")
+            self._release(False, error)
+            raise error from e
+
+
+    async def _fill_once(self):
+
+        try:
+            if (self._chunked):
+                if (self._remaining == 0):
+                    line = await self._reader.readline()
+                    size = int(line.split(b";", 1)[0].strip(), 16)
+                    if (size == 0):
+                        # skip trailers
+                        while (True):
+                            line = await self._reader.readline()
+                            if (line in (b"\r\n", b"\n", b"")):
+                                break
+                        self._set_eof()
+                        return False
+                    self._remaining = size
+                data = await self._reader.read(min(self._remaining, self.CHUNK_SIZE))
+                self._remaining -= len(data)
+                if (data and self._remaining == 0):
+                    await self._reader.readexactly(2)
+            elif (self._remaining == None):
+                data = await self._reader.read(self.CHUNK_SIZE)
+                if (not data):
+                    self._set_eof()
+                    return False
+            else:
+                if (self._remaining == 0):
+                    self._set_eof()
+                    return False
+                data = await self._reader.read(min(self._remaining, self.CHUNK_SIZE))
+                self._remaining -= len(data)
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ProxyError("Invalid response body: {}".format(e))
+            self._release(False, error)
+            raise error
+
+        if (not data):
+            error = ProxyError("Connection closed while reading response body")
+            self._release(False, error)
+            raise error
+
+        if (self._record):
+            self._record.response_bytes += len(data)
+        self._buf += data
+        return True
+
+
+    async def read(self, n = -1):
+        """
+        Read from the stream.
+
+        :param n: The maximum number of bytes to read. If negative, read until
+                  the end of the stream.
+        :return:  The bytes read. An empty bytes object signals the end of the
+                  stream.
+        """
+
+        if (n == None or n < 0):
+            while (await self._fill()):
+                pass
+            n = len(self._buf)
+        elif (not self._buf):
+            await self._fill()
+
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+
+    async def readline(self):
+        """
+        Read a line from the stream.
+
+        :return: The line including the trailing newline, or an empty bytes
+                 object at the end of the stream.
+        """
+
+        start = 0
+        while (True):
+            i = self._buf.find(b"\n", start)
+            if (i >= 0):
+                n = i + 1
+                break
+            start = len(self._buf)
+            if (not await self._fill()):
+                n = len(self._buf)
+                break
+
+        line = bytes(self._buf[:n])
+        del self._buf[:n]
+        return line
+
+
+    async def close(self):
+        """ Close the stream. Unread data is discarded. """
+        self._buf.clear()
+        self._release(self._eof)
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        line = await self.readline()
+        if (not line):
+            raise StopAsyncIteration
+        return line
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+
+class AsyncHttpProxy(Instrumented):
+    """
+    The asynchronous counterpart of :py:class:`~ipfs.api.proxy.HttpProxy`.
+
+    Connections are kept alive and reused. At most ``max_connections`` requests
+    are sent at the same time, further requests wait for a free connection.
+
+    Calls can be observed with hooks, see :py:mod:`ipfs.api.metrics`.
+    """
+
+    ENDPOINT = "/api/v0"
+    """ The api endpoint we're using. Currently API v0. """
+
+    CHUNK_SIZE = 65536
+    """ The size of chunks in which input streams are sent. """
+
+    def __init__(self, host = "localhost", port = 5001, max_connections = 100, unix_socket = None, timeout = None):
+        """
+        Create an instance of an AsyncHttpProxy.
+
+        :param host:            The hostname where the API is running.
+        :param port:            The port which the API is listening to.
+        :param max_connections: The maximum number of concurrent connections.
+        :param unix_socket:     The path of a Unix domain socket the API is
+                                listening to (optional). If specified,
+                                ``host`` and ``port`` are ignored.
+        :param timeout:         The default timeout in seconds for every call
+                                (optional). See :py:mod:`ipfs.api.deadline`.
+        """
+
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.base_url = "http://{}:{:d}{}".format(host, port, self.ENDPOINT)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.root = Proxy(self, "")
+        self._idle = []
+        self._semaphore = None
+
+
+    async def _open_connection(self):
+        if (self.unix_socket):
+            return await asyncio.open_unix_connection(self.unix_socket)
+        return await asyncio.open_connection(self.host, self.port)
+
+
+    async def _acquire(self):
+        """
+        Return a connection and whether it was reused from the idle pool.
+        """
+
+        while (self._idle):
+            reader, writer = self._idle.pop()
+            if (not reader.at_eof() and not writer.is_closing()):
+                return (reader, writer), True
+            writer.close()
+        return await self._open_connection(), False
+
+
+    def _release(self, conn, reuse):
+        if (reuse and not conn[1].is_closing()):
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        self._semaphore.release()
+
+
+    async def _write_body(self, writer, body):
+        """ Write a :py:class:`~ipfs.api.multipart.MultipartEncoder` as chunked body. """
+
+        async for data in body:
+            # an empty chunk would end the body
+            if (data):
+                writer.write(b"%x\r\n" % len(data))
+                writer.write(data)
+                writer.write(b"\r\n")
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+
+
+    async def _read_head(self, reader):
+        """ Read the status line and headers of a response. """
+
+        status_line = await reader.readline()
+        if (not status_line):
+            raise ConnectionResetError("Connection closed by server")
+        version, status = status_line.decode("latin-1").split(None, 2)[:2]
+
+        headers = {}
+        while (True):
+            line = await reader.readline()
+            if (line in (b"\r\n", b"\n", b"")):
+                break
+            key, value = line.decode("latin-1").split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+
+        keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+        return int(status), headers, keep_alive
+
+
+    async def _call_endpoint(self, path, args, opts, f_in):
+        """
+        Perform an HTTP request thus calling an HTTP RPC function. See
+        :py:meth:`ipfs.api.proxy.HttpProxy._call_endpoint` for the parameters.
+
+        :return: An :py:class:`AsyncResponseStream` with the body of the HTTP
+                 response.
+
+        :raise: Raises a :py:exc:ProxyError if the server responds with an
+                error code
+        """
+
+        if (self._semaphore == None):
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        params = build_params(args, opts)
+        target = quote(self.ENDPOINT + path, safe = "/:@!$&'()*+,;=")
+        if (params):
+            target += "?" + urlencode(params)
+
+        head = ["{} {} HTTP/1.1".format("POST" if (f_in) else "GET", target),
+                "Host: {}:{:d}".format(self.host, self.port),
+                "Accept-Encoding: identity"]
+        if (f_in):
+            body = MultipartEncoder(f_in, chunk_size = self.CHUNK_SIZE)
+            head.append("Content-Type: {}".format(body.content_type))
+            head.append("Transfer-Encoding: chunked")
+        head = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+        expires = expires_at(self.timeout)
+        record = self._begin_call(path, "POST" if (f_in) else "GET", len(args))
+
+        try:
+            if (expires == None):
+                await self._semaphore.acquire()
+            else:
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), remaining(expires))
+                except asyncio.TimeoutError as e:
+                    raise DeadlineExceeded("Deadline exceeded while waiting for a connection") from e
+        except BaseException as e:
+            if (record):
+                self._end_call(record, e)
+            raise
+
+        try:
+            if (expires == None):
+                conn, status, headers, keep_alive = await self._exchange(head, body if (f_in) else None)
+            else:
+                try:
+                    conn, status, headers, keep_alive = await asyncio.wait_for(
+                        self._exchange(head, body if (f_in) else None), remaining(expires))
+                except asyncio.TimeoutError as e:
+                    raise DeadlineExceeded("Deadline exceeded while waiting for response") from e
+        except BaseException as e:
+            self._semaphore.release()
+            if (record):
+                record.request_bytes = body.bytes_sent if (f_in) else 0
+                self._end_call(record, e)
+            raise
+
+        if (record):
+            record.request_bytes = body.bytes_sent if (f_in) else 0
+            record.first_byte(status)
+
+        if (status != 200):
+            stream = AsyncResponseStream(self, conn, headers, keep_alive)
+            text = (await stream.read()).decode("utf-8", "replace")
+            error = ProxyError(text)
+            if (record):
+                record.response_bytes = len(text)
+                self._end_call(record, error)
+            raise error
+        return AsyncResponseStream(self, conn, headers, keep_alive, record, expires)
+
+
+    async def _exchange(self, head, body):
+        """
+        Send a request and read the head of the response.
+
+        :return: The connection, the status, the headers and whether the
+                 connection can be kept alive
+        """
+
+        while (True):
+            conn, reused = await self._acquire()
+            reader, writer = conn
+            try:
+                writer.write(head)
+                if (body):
+                    await self._write_body(writer, body)
+                await writer.drain()
+                status, headers, keep_alive = await self._read_head(reader)
+                return conn, status, headers, keep_alive
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # an idle connection might have been closed by the server.
+                # retry, if no input has been consumed yet.
+                if (reused and not body):
+                    continue
+                raise
+            except BaseException:
+                # e.g. cancelled because of a deadline
+                writer.close()
+                raise
+
+
+    async def _load_output(self, outputenc, out):
+        """
+        Decode the output of an RPC call.
+
+        :param outputenc: The output encoding
+        :param out:       The coroutine returned by :py:meth:`_call_endpoint`
+        :return:          The decoded output
+        """
+        return await outputenc.aload(await out)
+
+
+    async def close(self):
+        """ Close all idle connections. """
+        while (self._idle):
+            reader, writer = self._idle.pop()
+            writer.close()
+
+
+
+__all__ = [
+    "AsyncResponseStream",
+    "AsyncHttpProxy"
+]
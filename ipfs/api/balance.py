@@ -0,0 +1,397 @@
+"""
+This module implements a root proxy that spreads calls over several daemons.
+
+Calls that reference content by key (e.g. ``object/links``, ``block/get`` or
+``cat``) are routed by consistent hashing of the key, so the same content is
+always requested from the same daemon and its caches stay hot. All other
+calls go to the healthy daemon with the fewest calls in progress::
+
+   >>> proxy = MultiHttpProxy([("ipfs-1", 5001), ("ipfs-2", 5001), "ipfs-3:5001"])
+   >>> ipfs = IpfsApi(proxy = proxy)
+
+A daemon that can't be reached is taken out of rotation for a cooldown period,
+which doubles with every consecutive failure. Failed calls without input are
+retried on the next daemon. Errors reported by a daemon (i.e.
+:py:exc:`~ipfs.api.proxy.ProxyError`) don't count as failures and aren't
+retried.
+"""
+
+import hashlib
+from bisect import bisect
+from threading import Lock
+from time import monotonic
+
+import requests
+
+from .coalesce import COALESCABLE_ENDPOINTS, content_addressed
+from .metrics import Instrumented, endpoint_of
+from .proxy import Proxy, ProxyError, HttpProxy
+from .schedule import ScheduledStream
+
+
+AFFINITY_ENDPOINTS = COALESCABLE_ENDPOINTS | frozenset([
+    "/cat",
+    "/file/ls"
+])
+""" Endpoints whose calls are routed by the key they reference. """
+
+
+FAILOVER_ERRORS = (requests.exceptions.ConnectionError, ConnectionError)
+""" Exceptions that indicate that a daemon can't be reached. """
+
+
+def affinity_key(path, args, endpoints = AFFINITY_ENDPOINTS):
+    """
+    Return the key by which a call is routed, or ``None`` if it isn't routed
+    by key.
+
+    Paths like ``/ipfs/<hash>/a/b`` are routed by ``<hash>``, so all calls
+    within a DAG go to the same daemon.
+
+    :param path:      The path of the call relative to the API endpoint
+    :param args:      The arguments of the call
+    :param endpoints: The endpoints whose calls are routed by key
+    """
+
+    if (not content_addressed(path, args, endpoints)):
+        return None
+    if (args):
+        key = args[0]
+    else:
+        endpoint = endpoint_of(path)
+        key = path[len(endpoint) + 1:]
+    if (not isinstance(key, str) or not key):
+        return None
+    if (key.startswith("/ipfs/")):
+        key = key[6:]
+    return key.split("/", 1)[0]
+
+
+
+class HashRing:
+    """
+    A consistent hash ring. Every member is placed on the ring several times,
+    so keys are distributed evenly and only the keys of a member move, if
+    it's removed.
+    """
+
+    def __init__(self, members, replicas = 64):
+        """
+        :param members:  The names of the members
+        :param replicas: The number of points per member on the ring
+        """
+        points = []
+        for member in members:
+            for i in range(replicas):
+                points.append((self._hash("{}#{:d}".format(member, i)), member))
+        points.sort()
+        self._hashes = [h for h, m in points]
+        self._members = [m for h, m in points]
+        self._count = len(set(self._members))
+
+
+    @staticmethod
+    def _hash(s):
+        return int.from_bytes(hashlib.md5(s.encode()).digest()[:8], "big")
+
+
+    def lookup(self, key):
+        """ Return the member responsible for a key. """
+        return self._members[bisect(self._hashes, self._hash(key)) % len(self._members)]
+
+
+    def preference(self, key):
+        """
+        Return all members in the order in which they should be tried for a
+        key, i.e. in ring order starting with the responsible member.
+        """
+
+        i = bisect(self._hashes, self._hash(key))
+        n = len(self._members)
+        order = []
+        for j in range(n):
+            member = self._members[(i + j) % n]
+            if (member not in order):
+                order.append(member)
+                if (len(order) == self._count):
+                    break
+        return order
+
+
+
+class DaemonStats:
+    """
+    Statistics about a daemon of a :py:class:`MultiHttpProxy`.
+
+    .. py:attribute:: name
+
+       The name of the daemon, e.g. ``"localhost:5001"``
+
+    .. py:attribute:: healthy
+
+       Whether the daemon is in rotation
+
+    .. py:attribute:: in_flight
+
+       The number of calls whose response hasn't been read completely
+
+    .. py:attribute:: calls
+
+       The number of calls sent to the daemon
+
+    .. py:attribute:: failures
+
+       The number of calls that failed, because the daemon couldn't be reached
+
+    """
+
+    def __init__(self, name, healthy = True, in_flight = 0, calls = 0, failures = 0):
+        self.name = name
+        self.healthy = healthy
+        self.in_flight = in_flight
+        self.calls = calls
+        self.failures = failures
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"name": self.name, "healthy": self.healthy, "in_flight": self.in_flight,
+                "calls": self.calls, "failures": self.failures}
+
+
+    def __repr__(self):
+        return "DaemonStats(name={!r}, healthy={}, in_flight={:d}, calls={:d}, failures={:d})".format(
+            self.name, self.healthy, self.in_flight, self.calls, self.failures)
+
+
+
+class _Member:
+    """ A daemon of a :py:class:`MultiHttpProxy` and its health. """
+
+    def __init__(self, name, proxy):
+        self.name = name
+        self.proxy = proxy
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+
+
+
+class _InFlight:
+    """
+    A call in progress on a :py:class:`_Member`. The response stream of the
+    call is wrapped in a :py:class:`~ipfs.api.schedule.ScheduledStream`, which
+    releases it at the end of the stream or when it's closed.
+    """
+
+    def __init__(self, proxy, member):
+        self._proxy = proxy
+        self._member = member
+
+
+    def release(self):
+        self._proxy._finished(self._member)
+
+
+
+class MultiHttpProxy(Instrumented):
+    """
+    A root proxy that distributes calls over several daemons. Each daemon is
+    accessed through its own root proxy, e.g. a
+    :py:class:`~ipfs.api.proxy.HttpProxy`.
+    """
+
+    def __init__(self, endpoints, retries = 2, cooldown = 1.0, max_cooldown = 30.0, replicas = 64,
+                 affinity_endpoints = AFFINITY_ENDPOINTS, **kwargs):
+        """
+        Create a proxy for a pool of daemons.
+
+        :param endpoints:          The daemons. Each is either a
+                                   ``(host, port)`` tuple, a ``"host:port"``
+                                   string or a root proxy.
+        :param retries:            How often a failed call without input is
+                                   retried on another daemon
+        :param cooldown:           The time in seconds a daemon is out of
+                                   rotation after it failed. It's doubled for
+                                   every consecutive failure.
+        :param max_cooldown:       The maximum cooldown in seconds
+        :param replicas:           The number of points per daemon on the
+                                   hash ring
+        :param affinity_endpoints: The endpoints whose calls are routed by
+                                   the key they reference
+        :param kwargs:             Further arguments for the
+                                   :py:class:`~ipfs.api.proxy.HttpProxy` of
+                                   every daemon given as address, e.g.
+                                   ``timeout`` or ``coalesce``.
+        """
+
+        self.root = Proxy(self, "")
+        self.retries = retries
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.affinity_endpoints = frozenset(affinity_endpoints)
+        self._members = {}
+        for endpoint in endpoints:
+            name, proxy = self._create_member(endpoint, kwargs)
+            if (name in self._members):
+                raise ValueError("Duplicate endpoint: {}".format(name))
+            self._members[name] = _Member(name, proxy)
+        if (not self._members):
+            raise ValueError("No endpoints")
+        self._ring = HashRing(self._members, replicas)
+        self._lock = Lock()
+        self._next = 0
+
+
+    @staticmethod
+    def _create_member(endpoint, kwargs):
+        if (isinstance(endpoint, str)):
+            host, port = endpoint.rsplit(":", 1)
+            endpoint = (host, int(port))
+        if (isinstance(endpoint, tuple)):
+            host, port = endpoint
+            return "{}:{:d}".format(host, port), HttpProxy(host, port, **kwargs)
+        name = getattr(endpoint, "base_url", None) or "proxy-{:x}".format(id(endpoint))
+        return name, endpoint
+
+
+    @property
+    def proxies(self):
+        """ The root proxies of the daemons. """
+        return [m.proxy for m in self._members.values()]
+
+
+    def add_hook(self, hook):
+        Instrumented.add_hook(self, hook)
+        for proxy in self.proxies:
+            proxy.add_hook(hook)
+
+
+    def remove_hook(self, hook):
+        Instrumented.remove_hook(self, hook)
+        for proxy in self.proxies:
+            proxy.remove_hook(hook)
+
+
+    def endpoint_stats(self):
+        """
+        Return statistics about the daemons.
+
+        :return: A list of :py:class:`DaemonStats`
+        """
+
+        now = monotonic()
+        with self._lock:
+            return [DaemonStats(m.name, m.down_until <= now, m.in_flight, m.calls, m.failures)
+                    for m in self._members.values()]
+
+
+    def close(self):
+        """ Close all pooled connections. """
+        for proxy in self.proxies:
+            proxy.close()
+
+
+    def _candidates(self, path, args):
+        """ Return the members in the order in which they should be tried. """
+
+        now = monotonic()
+        key = affinity_key(path, args, self.affinity_endpoints)
+        with self._lock:
+            if (key != None):
+                members = [self._members[name] for name in self._ring.preference(key)]
+            else:
+                # rotate the members, so ties are broken round-robin
+                members = list(self._members.values())
+                self._next = (self._next + 1) % len(members)
+                members = members[self._next:] + members[:self._next]
+                members.sort(key = lambda m: m.in_flight)
+            healthy = [m for m in members if (m.down_until <= now)]
+            # if no daemon is healthy, try the one that will recover first
+            if (not healthy):
+                healthy = [min(members, key = lambda m: m.down_until)]
+        return healthy[:self.retries + 1]
+
+
+    def _finished(self, member):
+        with self._lock:
+            member.in_flight -= 1
+
+
+    def _succeeded(self, member):
+        with self._lock:
+            member.consecutive_failures = 0
+            member.down_until = 0.0
+
+
+    def _failed(self, member):
+        with self._lock:
+            member.failures += 1
+            member.consecutive_failures += 1
+            delay = self.cooldown * 2 ** (member.consecutive_failures - 1)
+            member.down_until = monotonic() + min(delay, self.max_cooldown)
+
+
+    def _call_endpoint(self, path, args, opts, f_in):
+        """
+        Call an RPC endpoint on one of the daemons. See
+        :py:meth:`~ipfs.api.proxy.HttpProxy._call_endpoint`.
+
+        :raise: The error of the last attempt, if the call failed on all
+                daemons it was tried on
+        """
+
+        error = None
+        for member in self._candidates(path, args):
+            with self._lock:
+                member.in_flight += 1
+                member.calls += 1
+            try:
+                out = member.proxy._call_endpoint(path, args, opts, f_in)
+            except FAILOVER_ERRORS as e:
+                self._finished(member)
+                self._failed(member)
+                error = e
+                # the input might have been consumed
+                if (f_in):
+                    break
+                continue
+            except ProxyError:
+                # the daemon is reachable, it just reported an error
+                self._finished(member)
+                self._succeeded(member)
+                raise
+            except BaseException:
+                # e.g. the deadline has passed, so there's no time left for a
+                # retry
+                self._finished(member)
+                raise
+            self._succeeded(member)
+            # the call is in flight until its response has been read
+            return ScheduledStream(out, _InFlight(self, member))
+        raise error
+
+
+    def _load_output(self, outputenc, out):
+        """
+        Decode the output of an RPC call.
+
+        :param outputenc: The output encoding
+        :param out:       The value returned by :py:meth:`_call_endpoint`
+        :return:          The decoded output
+        """
+        return outputenc.load(out)
+
+
+
+__all__ = [
+    "AFFINITY_ENDPOINTS",
+    "FAILOVER_ERRORS",
+    "affinity_key",
+    "HashRing",
+    "DaemonStats",
+    "MultiHttpProxy"
+]
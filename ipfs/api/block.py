@@ -12,6 +12,9 @@ class BlockApi:
 
     def __init__(self, root):
         self._rpc = root.block
+        self._stat = self._rpc.stat.compile(codec.JSON)
+        self._get = self._rpc.get.compile()
+        self._put = self._rpc.put.compile(codec.JSON)
 
 
     def stat(self, key):
@@ -23,7 +26,7 @@ class BlockApi:
            ``Key``:  The key of that block
            ``Size``: The size of that block in bytes
         """
-        return self._rpc.stat[key].with_outputenc(codec.JSON)()
+        return self._stat(key)
 
 
     def get(self, key):
@@ -41,7 +44,7 @@ class BlockApi:
 
         
         """
-        return self._rpc.get[key]()
+        return self._get(key)
 
 
     def put(self, f):
@@ -60,7 +63,7 @@ class BlockApi:
            {'Key': 'QmbWTwYGcmdyK9CYfNBcfs9nhZs17a6FQ4Y8oea278xx41', 'Size': 6}
 
         """
-        return self._rpc.put.with_outputenc(codec.JSON)(_in = f)
+        return self._put(_in = f)
 
 
 __all__ = ["BlockApi"]
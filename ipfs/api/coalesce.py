@@ -0,0 +1,265 @@
+"""
+This module implements coalescing of concurrent identical RPC calls.
+
+When many threads walk overlapping DAGs, they often request the same node at
+the same time. Content-addressed responses never change, so identical calls
+that overlap can share one HTTP request::
+
+   >>> ipfs = IpfsApi(proxy = HttpProxy("localhost", 5001, coalesce = True))
+   >>> ipfs._proxy.coalesce_stats()
+   CoalesceStats(calls=120, executed=37, merged=83)
+
+Only calls without input to the endpoints listed in
+:py:data:`COALESCABLE_ENDPOINTS` are coalesced, and only if they don't
+reference an IPNS name. The response body of a shared request is read
+completely, and every caller gets its own stream over it.
+"""
+
+import copy
+from threading import Event, Lock
+from time import monotonic
+
+from .deadline import DeadlineExceeded
+from .metrics import endpoint_of
+
+
+COALESCABLE_ENDPOINTS = frozenset([
+    "/object/data",
+    "/object/links",
+    "/object/get",
+    "/object/stat",
+    "/block/get",
+    "/block/stat"
+])
+""" Idempotent endpoints whose responses are determined by a key. """
+
+
+def content_addressed(path, args, endpoints = COALESCABLE_ENDPOINTS):
+    """
+    Return whether the response of a call is determined by its arguments,
+    i.e. the call is idempotent and references content by key.
+
+    :param path:      The path of the call relative to the API endpoint
+    :param args:      The arguments of the call
+    :param endpoints: The endpoints that are considered
+    """
+
+    if (endpoint_of(path) not in endpoints or "/ipns/" in path):
+        return False
+    for arg in args:
+        if (isinstance(arg, str) and arg.startswith("/ipns/")):
+            return False
+    return True
+
+
+
+class CoalesceStats:
+    """
+    Statistics about coalesced calls.
+
+    .. py:attribute:: calls
+
+       The number of calls that were eligible for coalescing
+
+    .. py:attribute:: executed
+
+       The number of requests that were actually sent
+
+    .. py:attribute:: merged
+
+       The number of calls that shared the request of another call
+
+    """
+
+    def __init__(self, calls = 0, executed = 0, merged = 0):
+        self.calls = calls
+        self.executed = executed
+        self.merged = merged
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"calls": self.calls, "executed": self.executed, "merged": self.merged}
+
+
+    def __repr__(self):
+        return "CoalesceStats(calls={:d}, executed={:d}, merged={:d})"\
+            .format(self.calls, self.executed, self.merged)
+
+
+
+class CoalescedCallError(Exception):
+    """
+    Raised in a caller that shared a failed call, if the exception of that
+    call can't be copied. The original exception is its ``__cause__``.
+    """
+
+
+
+class _Flight:
+    """ A call in progress. Only used internally by :py:class:`SingleFlight`. """
+
+    __slots__ = ("done", "result", "error", "retry")
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        # whether the call failed for reasons of its caller
+        self.retry = False
+
+
+
+def _shared_error(error):
+    """
+    Return whether the exception of a call applies to the callers that
+    shared it. Deadlines, transport errors (``OSError``) and exceptions like
+    :py:exc:`KeyboardInterrupt` belong to the caller that ran the call.
+    """
+    return isinstance(error, Exception) and not isinstance(error, (DeadlineExceeded, OSError))
+
+
+def _copy_error(error):
+    """ Return a new exception like ``error``, caused by it. """
+    try:
+        fresh = copy.copy(error)
+    except Exception:
+        fresh = None
+    if (type(fresh) != type(error)):
+        fresh = CoalescedCallError("Coalesced call failed: {}".format(error))
+    fresh.__cause__ = error
+    fresh.__traceback__ = None
+    return fresh
+
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that ask for a key,
+    while a call for it is in progress, wait for that call and get its result
+    (or a copy of its exception). If the call failed because of its own
+    caller, e.g. its deadline expired, a waiting caller runs the call again.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = Lock()
+        self._executed = 0
+        self._merged = 0
+
+
+    def do(self, key, f, timeout = None):
+        """
+        Call ``f`` unless a call with the same key is already in progress.
+
+        :param key:     A hashable key identifying the call
+        :param f:       A function without arguments
+        :param timeout: The maximum time in seconds to wait for a call in
+                        progress (optional)
+        :return:        A tuple of the result of ``f`` and whether it was
+                        shared with another caller
+        :raise:         The exception raised by ``f`` or a copy of it,
+                        :py:exc:`CoalescedCallError` if it can't be copied,
+                        or :py:exc:`~ipfs.api.deadline.DeadlineExceeded` if
+                        the call in progress didn't finish in time
+        """
+
+        expires = monotonic() + timeout if (timeout != None) else None
+        while (True):
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight == None
+                if (leader):
+                    flight = self._flights[key] = _Flight()
+                    self._executed += 1
+                else:
+                    self._merged += 1
+            if (leader):
+                break
+
+            left = max(expires - monotonic(), 0) if (expires != None) else None
+            if (not flight.done.wait(left)):
+                raise DeadlineExceeded("Deadline exceeded while waiting for a coalesced call")
+            if (flight.retry):
+                # run the call as new leader, or wait for another one
+                with self._lock:
+                    self._merged -= 1
+                continue
+            if (flight.error != None):
+                raise _copy_error(flight.error)
+            return flight.result, True
+
+        try:
+            flight.result = f()
+        except BaseException as e:
+            if (_shared_error(e)):
+                flight.error = e
+            else:
+                flight.retry = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+    def in_flight(self):
+        """ Return the number of calls in progress. """
+        with self._lock:
+            return len(self._flights)
+
+
+    def stats(self):
+        """
+        Return statistics about the calls.
+
+        :return: A :py:class:`CoalesceStats` instance
+        """
+        with self._lock:
+            return CoalesceStats(self._executed + self._merged, self._executed, self._merged)
+
+
+
+class Coalescer(SingleFlight):
+    """
+    A :py:class:`SingleFlight` that decides which RPC calls can be coalesced.
+    """
+
+    def __init__(self, endpoints = COALESCABLE_ENDPOINTS):
+        """
+        :param endpoints: The endpoints whose calls may be coalesced (default:
+                          :py:data:`COALESCABLE_ENDPOINTS`)
+        """
+        SingleFlight.__init__(self)
+        self.endpoints = frozenset(endpoints)
+
+
+    def key(self, path, args, opts):
+        """
+        Return the key identifying an RPC call, or ``None`` if it must not be
+        coalesced. Calls with input must never be coalesced.
+
+        See :py:meth:`~ipfs.api.proxy.HttpProxy._call_endpoint` for the
+        parameters.
+        """
+
+        if (not content_addressed(path, args, self.endpoints)):
+            return None
+        key = (path, tuple(args), tuple(sorted((k, str(v)) for k, v in opts.items() if (v != None))))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+
+
+__all__ = [
+    "COALESCABLE_ENDPOINTS",
+    "content_addressed",
+    "CoalesceStats",
+    "CoalescedCallError",
+    "SingleFlight",
+    "Coalescer"
+]
@@ -12,6 +12,7 @@ class ConfigApi:
 
     def __init__(self, root):
         self._rpc = root.config
+        self._show = self._rpc.show.compile(codec.JSON)
 
 
     def show(self):
@@ -20,7 +21,7 @@ class ConfigApi:
 
         :return: The current configuration as dict.
         """
-        return self._rpc.show.with_outputenc(codec.JSON)()
+        return self._show()
 
 
 __all__ = ["ConfigApi"]
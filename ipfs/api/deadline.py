@@ -0,0 +1,165 @@
+"""
+This module implements deadlines for RPC calls.
+
+A deadline is set for a block of code with :py:func:`deadline`. It applies to
+all calls made in that block (by the same thread or task), including calls
+made by high-level APIs such as :py:mod:`ipfs.merkledag` and
+:py:mod:`ipfs.unixfs`. Nested deadlines can only shorten the enclosing one::
+
+   >>> with deadline(2.0):
+           with fs.open("QmPZ9gcCEpqKTo6aq61g2nXGUhM4iCL3ewB6LDXZCtioEB", "rb") as f:
+               data = f.read()
+
+If the deadline expires, :py:exc:`DeadlineExceeded` is raised. Additionally
+root proxies accept a default ``timeout`` for every single call.
+"""
+
+import socket
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+
+_deadline = ContextVar("ipfs_deadline", default = None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """ Raised when a call didn't finish before its deadline. """
+
+
+
+@contextmanager
+def deadline(timeout):
+    """
+    Context manager that sets a deadline for all calls in its block.
+
+    :param timeout: The time in seconds from now on until the deadline. If
+                    it's ``None``, the enclosing deadline (if any) stays in
+                    effect.
+    :return:        The absolute deadline (see :py:func:`expires_at`)
+    """
+
+    if (timeout == None):
+        yield _deadline.get()
+        return
+
+    expires = expires_at(timeout)
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+def expires_at(timeout = None):
+    """
+    Return when a call started now must be finished, as :py:func:`time.monotonic`
+    time.
+
+    :param timeout: A timeout in seconds for the call (optional)
+    :return:        The earlier of the current deadline and ``timeout`` from
+                    now, or ``None`` if there is neither.
+    """
+
+    expires = _deadline.get()
+    if (timeout != None):
+        t = monotonic() + timeout
+        if (expires == None or t < expires):
+            expires = t
+    return expires
+
+
+def remaining(expires):
+    """
+    Return the time left until a deadline.
+
+    :param expires: The deadline as returned by :py:func:`expires_at`, or
+                    ``None``
+    :return:        The time left in seconds, or ``None`` if there's no
+                    deadline.
+    :raise:         :py:exc:`DeadlineExceeded` if the deadline has passed
+    """
+
+    if (expires == None):
+        return None
+    left = expires - monotonic()
+    if (left <= 0):
+        raise DeadlineExceeded("Deadline exceeded")
+    return left
+
+
+TIMEOUT_ERRORS = (socket.timeout, Urllib3TimeoutError)
+""" Exceptions raised by the transport when a socket operation timed out. """
+
+
+
+class DeadlineStream:
+    """
+    A wrapper around a readable stream that raises :py:exc:`DeadlineExceeded`
+    if it's read after a deadline, or if a read times out.
+    """
+
+    def __init__(self, f, expires):
+        self._f = f
+        self._expires = expires
+
+
+    def _call(self, method, *args):
+        remaining(self._expires)
+        try:
+            return method(*args)
+        except TIMEOUT_ERRORS as e:
+            raise DeadlineExceeded("Deadline exceeded while reading response") from e
+
+
+    def read(self, n = -1):
+        return self._call(self._f.read, n)
+
+
+    def read1(self, n = -1):
+        return self._call(getattr(self._f, "read1", self._f.read), n)
+
+
+    def readinto(self, buf):
+        return self._call(self._f.readinto, buf)
+
+
+    def readline(self, limit = -1):
+        return self._call(self._f.readline, limit)
+
+
+    def __iter__(self):
+        while (True):
+            line = self.readline()
+            if (not line):
+                return
+            yield line
+
+
+    def close(self):
+        self._f.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+
+__all__ = [
+    "DeadlineExceeded",
+    "deadline",
+    "expires_at",
+    "remaining",
+    "TIMEOUT_ERRORS",
+    "DeadlineStream"
+]
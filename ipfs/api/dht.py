@@ -12,6 +12,11 @@ class DhtApi:
     
     def __init__(self, root):
         self._rpc = root.dht
+        self._query = self._rpc.query.compile(codec.JSONV)
+        self._findprovs = self._rpc.findprovs.compile(codec.JSONV)
+        self._findpeer = self._rpc.findpeer.compile(codec.JSONV)
+        self._get = self._rpc.get.compile(codec.JSONV)
+        self._put = self._rpc.put.compile(codec.JSONV)
 
 
     def query(self, peer_id):
@@ -21,7 +26,7 @@ class DhtApi:
         :param peer_id: The peer ID to run the query against
         :return: TODO
         """
-        return self._rpc.query[peer_id].with_outputenc(codec.JSONV)()
+        return self._query(peer_id)
 
 
     def find_providers(self, key):
@@ -31,7 +36,7 @@ class DhtApi:
         :param key: The key to find providers for
         :return: TODO
         """
-        return self._rpc.findprovs[key].with_outputenc(codec.JSONV)()
+        return self._findprovs(key)
 
 
     def find_peer(self, peer_id):
@@ -41,7 +46,7 @@ class DhtApi:
         :param peer_id: The peer to search for
         :return: TODO
         """
-        return self._rpc.findpeers[peer_id].with_outputenc(codec.JSONV)()
+        return self._findpeer(peer_id)
 
     
     def get(self, key):
@@ -51,7 +56,7 @@ class DhtApi:
         :param key: The key to find a value for
         :return: TODO
         """
-        return self._rpc.get[key].with_outputenc(codec.JSONV)()
+        return self._get(key)
 
 
     def put(self, key, value):
@@ -62,7 +67,7 @@ class DhtApi:
         :param value: The value to store
         :return: TODO
         """
-        return self._rpc.get[key].with_outputenc(codec.JSONV)(value)
+        return self._put(key, value)
 
 
 __all__ = ["DhtApi"]
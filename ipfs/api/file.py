@@ -3,6 +3,7 @@ This module exposes the IPFS file API.
 """
 
 from .. import codec
+from .multipart import tree_parts
 
 
 class FileApi:
@@ -12,6 +13,11 @@ class FileApi:
     
     def __init__(self, root):
         self._rpc = root
+        self._ls = root.file.ls.compile(codec.JSON)
+        self._iter_ls = root.file.ls.compile(codec.JsonItems(["Objects", "*", "Links"]))
+        self._add = root.add.compile(codec.JSON)
+        self._add_files = root.add.compile(codec.JSONV)
+        self._cat = root.cat.compile()
 
 
     def ls(self, path):
@@ -22,7 +28,19 @@ class FileApi:
         :return:     Retrieves the object named by the path and lists its
                      contents.
         """
-        return self._rpc.file.ls[path].with_outputenc(codec.JSON)()
+        return self._ls(path)
+
+
+    def iter_ls(self, path):
+        """
+        List the contents of a unixfs directory incrementally. See
+        :py:meth:`~ipfs.api.pin.PinApi.iter_ls`.
+
+        :param path: The path to the IPFS object to list links from
+        :return:     An iterator over dicts with the ``Name``, ``Hash``,
+                     ``Size`` and ``Type`` of every entry of the directory.
+        """
+        return self._iter_ls(path)
 
 
     def add(self, f):
@@ -32,7 +50,41 @@ class FileApi:
         :param f: A file-like object that will be added to IPFS
         :return:  A dict containing the ``Hash`` of the file.
         """
-        return self._rpc.add.with_outputenc(codec.JSON)(_in = f)
+        return self._add(_in = f)
+
+
+    def add_files(self, parts, recursive = True):
+        """
+        Add multiple files and directories to IPFS with a single request.
+
+        :param parts:     A list of parts, see
+                          :py:class:`~ipfs.api.multipart.MultipartEncoder`.
+                          Directories must be listed before their contents.
+        :param recursive: Whether directories are added recursively
+        :return:          An iterator over dicts containing the ``Name`` and
+                          ``Hash`` of every added file and directory.
+        """
+        return self._add_files(_in = list(parts), recursive = recursive)
+
+
+    def add_tree(self, path, hidden = False):
+        """
+        Add a local file or directory tree to IPFS with a single request. The
+        files are streamed one after another, so they're never held in memory
+        completely.
+
+        :param path:   The path of the file or directory
+        :param hidden: Whether to include hidden files
+        :return:       See :py:meth:`add_files`. The last dict is the one of
+                       the directory at ``path``.
+
+        Example::
+
+           >>> for entry in IpfsApi().file.add_tree("docs"):
+                   print(entry["Name"], entry["Hash"])
+
+        """
+        return self.add_files(tree_parts(path, hidden))
 
 
     def cat(self, path):
@@ -42,7 +94,7 @@ class FileApi:
         :param path: The path to the IPFS object to read
         :return:     A file-like object with the contents of the file.
         """
-        return self._rpc.cat[path]()
+        return self._cat(path)
 
 
 __all__ = ["FileApi"]
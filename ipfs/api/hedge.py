@@ -0,0 +1,286 @@
+"""
+This module implements hedged requests for idempotent, content-addressed
+reads.
+
+A hedged call is sent once. If it hasn't finished after a delay, that's
+usually reached only by the slowest few percent of calls, a second attempt is
+sent, and whichever attempt finishes first is used. This trades a few extra
+requests for a much shorter tail latency::
+
+   >>> ipfs = IpfsApi(proxy = HttpProxy("localhost", 5001, hedge = True))
+   >>> ipfs._proxy.hedge_stats()
+   HedgeStats(calls=1000, hedged=48, wins=31)
+
+The delay is the configured percentile of recent latencies of the endpoint.
+Until enough latencies have been observed, calls aren't hedged and run on the
+caller's thread. Only calls whose attempts are run in the thread pool can be
+hedged, so if all its workers are busy, further calls also run on the
+caller's thread, without hedging. Only calls to
+the endpoints in :py:data:`~ipfs.api.coalesce.COALESCABLE_ENDPOINTS` are
+hedged, because their responses don't depend on when they're sent.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextvars import copy_context
+from threading import Lock
+from time import monotonic
+
+from .coalesce import COALESCABLE_ENDPOINTS, content_addressed
+from .deadline import DeadlineExceeded, remaining
+
+
+class HedgeStats:
+    """
+    Statistics about hedged calls.
+
+    .. py:attribute:: calls
+
+       The number of calls that were eligible for hedging
+
+    .. py:attribute:: hedged
+
+       The number of calls for which a second attempt was sent
+
+    .. py:attribute:: wins
+
+       The number of calls for which the second attempt finished first
+
+    """
+
+    def __init__(self, calls = 0, hedged = 0, wins = 0):
+        self.calls = calls
+        self.hedged = hedged
+        self.wins = wins
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"calls": self.calls, "hedged": self.hedged, "wins": self.wins}
+
+
+    def __repr__(self):
+        return "HedgeStats(calls={:d}, hedged={:d}, wins={:d})".format(self.calls, self.hedged, self.wins)
+
+
+
+class LatencyWindow:
+    """ The latencies of the most recent calls, to compute percentiles. """
+
+    def __init__(self, size = 256):
+        """
+        :param size: The number of latencies that are kept
+        """
+        self._samples = deque(maxlen = size)
+        self._sorted = None
+
+
+    def __len__(self):
+        return len(self._samples)
+
+
+    def add(self, latency):
+        """ Add a latency in seconds. """
+        self._samples.append(latency)
+        self._sorted = None
+
+
+    def percentile(self, p):
+        """
+        Return the p-th percentile of the latencies.
+
+        :param p: The percentile as fraction, e.g. 0.95
+        """
+
+        s = self._sorted
+        if (s == None):
+            s = self._sorted = sorted(self._samples)
+        if (not s):
+            return 0.0
+        return s[min(int(p * len(s)), len(s) - 1)]
+
+
+
+class Hedger:
+    """
+    Sends hedged attempts of calls. Attempts of calls that may be hedged are
+    run in a thread pool, all other calls on the caller's thread.
+    """
+
+    def __init__(self, percentile = 0.95, min_delay = 0.001, max_delay = 1.0, min_samples = 20,
+                 window = 256, endpoints = COALESCABLE_ENDPOINTS, max_workers = 32):
+        """
+        Create a hedger.
+
+        :param percentile:  The percentile of recent latencies after which a
+                            second attempt is sent
+        :param min_delay:   The minimum delay in seconds before a second
+                            attempt is sent
+        :param max_delay:   The maximum delay in seconds before a second
+                            attempt is sent
+        :param min_samples: The number of latencies of an endpoint that must
+                            have been observed before its calls are hedged
+        :param window:      The number of recent latencies per endpoint that
+                            are kept
+        :param endpoints:   The endpoints whose calls may be hedged
+        :param max_workers: The maximum number of attempts in progress
+        """
+
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.endpoints = frozenset(endpoints)
+        self.max_workers = max_workers
+        self._latencies = {}
+        self._executor = None
+        self._lock = Lock()
+        # the number of attempts submitted to the thread pool and not finished
+        self._active = 0
+        self._calls = 0
+        self._hedged = 0
+        self._wins = 0
+
+
+    def applies(self, path, args):
+        """ Return whether a call may be hedged. """
+        return content_addressed(path, args, self.endpoints)
+
+
+    def record(self, endpoint, latency):
+        """ Add the latency of a successful attempt. """
+        with self._lock:
+            window = self._latencies.get(endpoint)
+            if (window == None):
+                window = self._latencies[endpoint] = LatencyWindow(self.window)
+            window.add(latency)
+
+
+    def delay(self, endpoint):
+        """
+        Return the delay after which a second attempt of a call to the
+        endpoint is sent, or ``None`` if there are too few samples yet.
+        """
+
+        with self._lock:
+            window = self._latencies.get(endpoint)
+            if (window == None or len(window) < self.min_samples):
+                return None
+            return min(max(window.percentile(self.percentile), self.min_delay), self.max_delay)
+
+
+    def _submit(self, endpoint, f, reserve):
+        """
+        Submit an attempt to the thread pool, if at least ``reserve`` workers
+        are idle. Otherwise return ``None``.
+        """
+        with self._lock:
+            if (self._active + reserve > self.max_workers):
+                return None
+            self._active += 1
+            if (self._executor == None):
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix = "ipfs-hedge")
+        # every attempt runs in a copy of the caller's context, so deadlines
+        # and other context variables apply to it
+        return self._executor.submit(copy_context().run, self._pooled_attempt, endpoint, f)
+
+
+    def _pooled_attempt(self, endpoint, f):
+        try:
+            return self._attempt(endpoint, f)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+    def _attempt(self, endpoint, f):
+        start = monotonic()
+        result = f()
+        self.record(endpoint, monotonic() - start)
+        return result
+
+
+    def run(self, endpoint, f, expires = None):
+        """
+        Run a call, hedging it if it's slow.
+
+        :param endpoint: The endpoint of the call
+        :param f:        A function without arguments that does one attempt.
+                         It may be called from a worker thread, so it must be
+                         thread-safe. It should return the complete result,
+                         because the result of a slower attempt is discarded.
+        :param expires:  The deadline of the call (optional, see
+                         :py:func:`~ipfs.api.deadline.expires_at`)
+        :return:         The result of the first successful attempt
+        :raise:          The exception of the first attempt, if all attempts
+                         failed, or :py:exc:`~ipfs.api.deadline.DeadlineExceeded`
+        """
+
+        delay = self.delay(endpoint)
+        # keep a worker for the second attempt
+        first = self._submit(endpoint, f, 2) if (delay != None) else None
+        if (first == None):
+            # the call can't be hedged, so don't pay for a thread switch
+            with self._lock:
+                self._calls += 1
+            return self._attempt(endpoint, f)
+        attempts = [first]
+        pending = {first}
+
+        left = remaining(expires)
+        done, pending = wait(pending, timeout = delay if (left == None) else min(delay, left))
+        if (not done):
+            second = self._submit(endpoint, f, 1)
+            if (second != None):
+                attempts.append(second)
+                pending.add(second)
+
+        with self._lock:
+            self._calls += 1
+            if (len(attempts) > 1):
+                self._hedged += 1
+
+        errors = []
+        while (True):
+            for attempt in attempts:
+                if (attempt.done() and attempt not in pending):
+                    error = attempt.exception()
+                    if (error == None):
+                        if (attempt is not first):
+                            with self._lock:
+                                self._wins += 1
+                        return attempt.result()
+                    if (error not in errors):
+                        errors.append(error)
+            if (not pending):
+                raise errors[0]
+            done, pending = wait(pending, timeout = remaining(expires), return_when = FIRST_COMPLETED)
+            if (not done):
+                raise DeadlineExceeded("Deadline exceeded")
+
+
+    def stats(self):
+        """
+        Return statistics about hedged calls.
+
+        :return: A :py:class:`HedgeStats` instance
+        """
+        with self._lock:
+            return HedgeStats(self._calls, self._hedged, self._wins)
+
+
+    def close(self):
+        """ Shut down the worker threads. Running attempts are finished. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if (executor != None):
+            executor.shutdown(wait = False)
+
+
+
+__all__ = [
+    "HedgeStats",
+    "LatencyWindow",
+    "Hedger"
+]
@@ -0,0 +1,494 @@
+"""
+This module implements instrumentation of HTTP RPC calls.
+
+A hook is any callable that takes a :py:class:`CallRecord`. Add hooks to a
+root proxy and they're called once for every RPC call, after its response
+body has been consumed or closed::
+
+   >>> metrics = MetricsAggregator()
+   >>> ipfs = IpfsApi()
+   >>> ipfs._proxy.add_hook(metrics)
+   >>> ipfs.object.links("QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn")
+   >>> metrics.endpoint("/object/links").latency.percentile(0.99)
+   0.0016
+
+Hooks are called from the thread that finishes the call, so they must be
+thread-safe and should be fast.
+"""
+
+import re
+import sys
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+
+_COMMAND_SEGMENT = re.compile("^[a-z][a-z-]*$")
+
+
+def endpoint_of(path):
+    """
+    Return the endpoint of a path, i.e. the path without arguments that are
+    passed as path segments (e.g. ``"/object/links/<hash>"`` becomes
+    ``"/object/links"``).
+
+    :param path: The path of an RPC call relative to the API endpoint
+    :return:     The path up to the first segment that isn't a command name
+    """
+
+    segments = []
+    for segment in path.split("/")[1:]:
+        if (not _COMMAND_SEGMENT.match(segment)):
+            break
+        segments.append(segment)
+    return "/" + "/".join(segments)
+
+
+
+class CallRecord:
+    """
+    The measurements of one RPC call.
+
+    .. py:attribute:: path
+
+       The path of the RPC function relative to the API endpoint
+
+    .. py:attribute:: method
+
+       The HTTP method
+
+    .. py:attribute:: nargs
+
+       The number of arguments
+
+    .. py:attribute:: request_bytes
+
+       The size of the request body in bytes
+
+    .. py:attribute:: response_bytes
+
+       The number of bytes of the response body that have been read
+
+    .. py:attribute:: queue_time
+
+       The time the call waited to be admitted by a
+       :py:class:`~ipfs.api.schedule.Scheduler` in seconds
+
+    .. py:attribute:: ttfb
+
+       The time to first byte, i.e. until the response headers were received,
+       in seconds
+
+    .. py:attribute:: total_time
+
+       The time until the response body was consumed or closed in seconds
+
+    .. py:attribute:: status
+
+       The HTTP status code, or ``None`` if no response was received
+
+    .. py:attribute:: error
+
+       The exception that made the call fail, or ``None``
+
+    """
+
+    def __init__(self, path, method, nargs):
+        self.path = path
+        self.method = method
+        self.nargs = nargs
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.queue_time = 0.0
+        self.ttfb = None
+        self.total_time = None
+        self.status = None
+        self.error = None
+        self._start = perf_counter()
+
+
+    @property
+    def endpoint(self):
+        """ The endpoint of the call. See :py:func:`endpoint_of`. """
+        return endpoint_of(self.path)
+
+
+    def first_byte(self, status):
+        """ Record that the response headers were received. """
+        self.status = status
+        self.ttfb = perf_counter() - self._start
+
+
+    def finish(self, error = None):
+        """ Record the end of the call. """
+        self.total_time = perf_counter() - self._start
+        if (self.ttfb == None):
+            self.ttfb = self.total_time
+        self.error = error
+
+
+    def __repr__(self):
+        return "CallRecord({} {}, status={}, {:d}B -> {:d}B, ttfb={:.6f}s, total={:.6f}s)".format(
+            self.method, self.path, self.status, self.request_bytes,
+            self.response_bytes, self.ttfb or 0.0, self.total_time or 0.0)
+
+
+
+class Instrumented:
+    """
+    Mixin for root proxies that manages hooks.
+
+    If the root proxy has a true ``DEBUG`` attribute, every call is printed
+    by a :py:class:`DebugHook`.
+    """
+
+    _hooks = ()
+
+    def add_hook(self, hook):
+        """
+        Add a hook that is called with a :py:class:`CallRecord` for every
+        call.
+
+        :param hook: A callable that takes a :py:class:`CallRecord`
+        """
+        self._hooks = self._hooks + (hook,)
+
+
+    def remove_hook(self, hook):
+        """
+        Remove a hook.
+
+        :param hook: The hook to remove
+        """
+        self._hooks = tuple(h for h in self._hooks if (h is not hook))
+
+
+    def _begin_call(self, path, method, nargs):
+        """
+        Return a new :py:class:`CallRecord` or ``None``, if there are no hooks
+        which would receive it.
+        """
+
+        hooks = self._hooks
+        if (getattr(self, "DEBUG", False)):
+            hooks = hooks + (_DEBUG_HOOK,)
+        if (not hooks):
+            return None
+        record = CallRecord(path, method, nargs)
+        record._hooks = hooks
+        return record
+
+
+    @staticmethod
+    def _end_call(record, error = None):
+        """ Finish a :py:class:`CallRecord` and pass it to the hooks. """
+        record.finish(error)
+        for hook in record._hooks:
+            hook(record)
+
+
+
+class MeteredStream:
+    """
+    A wrapper around a readable stream that counts the bytes read and
+    finishes a :py:class:`CallRecord` at the end of the stream or when it's
+    closed.
+    """
+
+    def __init__(self, f, record):
+        self._f = f
+        self._record = record
+        self._done = False
+
+
+    def _count(self, n, eof):
+        self._record.response_bytes += n
+        if (eof and not self._done):
+            self._finish()
+
+
+    def _finish(self, error = None):
+        self._done = True
+        Instrumented._end_call(self._record, error)
+
+
+    def read(self, n = -1):
+        try:
+            data = self._f.read(n) if (n != None) else self._f.read()
+        except BaseException as e:
+            if (not self._done):
+                self._finish(e)
+            raise
+        self._count(len(data), n == None or n < 0 or not data)
+        return data
+
+
+    def read1(self, n = -1):
+        read1 = getattr(self._f, "read1", None)
+        if (read1 == None):
+            return self.read(n)
+        try:
+            data = read1(n)
+        except BaseException as e:
+            if (not self._done):
+                self._finish(e)
+            raise
+        self._count(len(data), not data)
+        return data
+
+
+    def readinto(self, buf):
+        n = self._f.readinto(buf)
+        self._count(n, not n and len(buf) > 0)
+        return n
+
+
+    def readline(self, limit = -1):
+        line = self._f.readline(limit)
+        self._count(len(line), not line)
+        return line
+
+
+    def __iter__(self):
+        while (True):
+            line = self.readline()
+            if (not line):
+                return
+            yield line
+
+
+    def close(self):
+        if (not self._done):
+            self._finish()
+        self._f.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+
+class Histogram:
+    """
+    A histogram with logarithmic buckets, e.g. for latencies in seconds.
+    """
+
+    def __init__(self, lowest = 0.0001, factor = 2.0, num_buckets = 24):
+        """
+        Create a histogram.
+
+        :param lowest:      The upper bound of the first bucket
+        :param factor:      The ratio between the bounds of adjacent buckets
+        :param num_buckets: The number of buckets. Another bucket for larger
+                            values is added.
+        """
+
+        self.bounds = [lowest * factor ** i for i in range(num_buckets)]
+        self.counts = [0] * (num_buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def add(self, value):
+        """ Add a value. """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if (value > self.max):
+            self.max = value
+
+
+    @property
+    def mean(self):
+        """ The mean of all values. """
+        return self.sum / self.count if (self.count) else 0.0
+
+
+    def percentile(self, p):
+        """
+        Return an upper bound for the p-th percentile.
+
+        :param p: The percentile as fraction, e.g. 0.99
+        :return:  The upper bound of the bucket containing the percentile, but
+                  at most the largest value
+        """
+
+        if (not self.count):
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if (seen >= rank and n):
+                return min(self.bounds[i], self.max) if (i < len(self.bounds)) else self.max
+        return self.max
+
+
+    def as_dict(self):
+        """ Return a summary of the histogram as dict. """
+        return {"count": self.count, "mean": self.mean, "max": self.max,
+                "p50": self.percentile(0.5), "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99)}
+
+
+
+class EndpointStats:
+    """
+    Aggregated measurements of an endpoint.
+
+    .. py:attribute:: calls
+
+       The number of calls
+
+    .. py:attribute:: errors
+
+       The number of failed calls
+
+    .. py:attribute:: request_bytes
+
+       The number of bytes sent
+
+    .. py:attribute:: response_bytes
+
+       The number of bytes received
+
+    .. py:attribute:: latency
+
+       A :py:class:`Histogram` of the total times
+
+    .. py:attribute:: ttfb
+
+       A :py:class:`Histogram` of the times to first byte
+
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+
+
+    def add(self, record):
+        """ Add a :py:class:`CallRecord`. """
+        self.calls += 1
+        if (record.error != None or record.status != 200):
+            self.errors += 1
+        self.request_bytes += record.request_bytes
+        self.response_bytes += record.response_bytes
+        self.latency.add(record.total_time)
+        self.ttfb.add(record.ttfb)
+
+
+    def as_dict(self, elapsed = None):
+        """
+        Return the statistics as dict.
+
+        :param elapsed: The time span in seconds over which the throughput is
+                        computed (optional)
+        """
+
+        d = {"calls": self.calls, "errors": self.errors,
+             "request_bytes": self.request_bytes,
+             "response_bytes": self.response_bytes,
+             "latency": self.latency.as_dict(), "ttfb": self.ttfb.as_dict()}
+        if (elapsed):
+            d["calls_per_second"] = self.calls / elapsed
+            d["bytes_per_second"] = (self.request_bytes + self.response_bytes) / elapsed
+        return d
+
+
+
+class MetricsAggregator:
+    """
+    A hook that aggregates call records in memory, per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+
+    def reset(self):
+        """ Discard all measurements. """
+        with self._lock:
+            self._endpoints = {}
+            self._start = perf_counter()
+
+
+    def __call__(self, record):
+        endpoint = record.endpoint
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if (stats == None):
+                self._endpoints[endpoint] = stats = EndpointStats()
+            stats.add(record)
+
+
+    def endpoints(self):
+        """ Return the names of all endpoints that have been called. """
+        with self._lock:
+            return sorted(self._endpoints.keys())
+
+
+    def endpoint(self, endpoint):
+        """
+        Return the statistics of an endpoint.
+
+        :param endpoint: The endpoint, e.g. ``"/object/links"``
+        :return:         An :py:class:`EndpointStats` instance
+        """
+        with self._lock:
+            return self._endpoints.get(endpoint) or EndpointStats()
+
+
+    def as_dict(self):
+        """
+        Return the statistics of all endpoints as dict. Throughput is
+        computed over the time since the aggregator was created or reset.
+        """
+        with self._lock:
+            elapsed = perf_counter() - self._start
+            return {endpoint: stats.as_dict(elapsed) for endpoint, stats in self._endpoints.items()}
+
+
+
+class DebugHook:
+    """ A hook that prints every call to a text stream. """
+
+    def __init__(self, f = None):
+        """
+        :param f: The text stream to print to (default: stdout)
+        """
+        self.f = f
+
+
+    def __call__(self, record):
+        print(repr(record), file = self.f or sys.stdout)
+
+
+_DEBUG_HOOK = DebugHook()
+
+
+
+__all__ = [
+    "endpoint_of",
+    "CallRecord",
+    "Instrumented",
+    "MeteredStream",
+    "Histogram",
+    "EndpointStats",
+    "MetricsAggregator",
+    "DebugHook"
+]
@@ -0,0 +1,315 @@
+"""
+This module encodes the input of HTTP RPC calls as streaming
+``multipart/form-data`` bodies.
+
+Input is never buffered completely. It's read (or encoded) chunk by chunk
+while the request body is being sent.
+
+A body can contain several files and directories, e.g. to add a whole
+directory tree with a single request::
+
+   >>> parts = [DirectoryPart("docs"),
+                FilePart("docs/readme", BytesIO(b"Hello World")),
+                LocalFilePart("docs/logo.png", "/home/user/logo.png")]
+   >>> ipfs.file.add_files(parts)
+
+"""
+
+import asyncio
+import inspect
+import os
+from urllib.parse import quote
+from uuid import uuid4
+
+
+CHUNK_SIZE = 65536
+""" The size of chunks in which input streams are read. """
+
+
+def iter_chunks(f, chunk_size = CHUNK_SIZE):
+    """
+    Iterate over the contents of an input.
+
+    :param f:          A bytes-like object, a readable binary stream or an
+                       iterable of bytes objects.
+    :param chunk_size: The size of the chunks read from streams
+    :return:           An iterator over bytes objects
+    """
+
+    if (isinstance(f, (bytes, bytearray, memoryview))):
+        yield f
+    elif (hasattr(f, "read")):
+        while (True):
+            data = f.read(chunk_size)
+            if (not data):
+                break
+            yield data
+    else:
+        for data in f:
+            if (data):
+                yield data
+
+
+async def aiter_chunks(f, chunk_size = CHUNK_SIZE):
+    """
+    Asynchronously iterate over the contents of an input.
+
+    Additionally to the inputs supported by :py:func:`iter_chunks`, this
+    accepts streams with a coroutine ``read`` method and asynchronous
+    iterables. Synchronous iterators (e.g. from
+    :py:meth:`~ipfs.codec.Codec.dump_iter`) are advanced in an executor, so
+    that they don't block the event loop.
+    """
+
+    if (isinstance(f, (bytes, bytearray, memoryview))):
+        yield f
+    elif (hasattr(f, "read")):
+        while (True):
+            data = f.read(chunk_size)
+            if (inspect.isawaitable(data)):
+                data = await data
+            if (not data):
+                break
+            yield data
+    elif (hasattr(f, "__aiter__")):
+        async for data in f:
+            if (data):
+                yield data
+    else:
+        it = iter(f)
+        loop = asyncio.get_running_loop()
+        while (True):
+            data = await loop.run_in_executor(None, next, it, None)
+            if (data == None):
+                break
+            if (data):
+                yield data
+
+
+
+class FilePart:
+    """
+    A file in a multipart body.
+
+    .. py:attribute:: name
+
+       The path of the file, relative to the root of the uploaded tree
+
+    """
+
+    content_type = "application/octet-stream"
+    """ The content type of the part. """
+
+    def __init__(self, name, f = None, field = "file"):
+        """
+        Create a file part.
+
+        :param name:  The path of the file
+        :param f:     The contents of the file. See :py:func:`iter_chunks`.
+        :param field: The name of the form field
+        """
+
+        self.name = name
+        self.f = f
+        self.field = field
+
+
+    def headers(self):
+        """ Return the headers of this part as bytes. """
+        return ("Content-Disposition: form-data; name=\"{}\"; filename=\"{}\"\r\n"
+                "Content-Type: {}\r\n").format(self.field, quote(self.name, safe = ""), self.content_type).encode()
+
+
+    def open(self):
+        """ Return the contents of this part. """
+        return self.f
+
+
+    def close(self, f):
+        """ Release the contents returned by :py:meth:`open`. """
+        pass
+
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.name)
+
+
+
+class LocalFilePart(FilePart):
+    """
+    A file in a multipart body that is read from the local file system. The
+    file is only opened while its part is being sent.
+    """
+
+    def __init__(self, name, path):
+        """
+        Create a part for a local file.
+
+        :param name: The path of the file in the uploaded tree
+        :param path: The path of the file in the local file system
+        """
+
+        FilePart.__init__(self, name)
+        self.path = path
+
+
+    def open(self):
+        return open(self.path, "rb")
+
+
+    def close(self, f):
+        f.close()
+
+
+
+class DirectoryPart(FilePart):
+    """ A directory in a multipart body. """
+
+    content_type = "application/x-directory"
+
+    def __init__(self, name):
+        FilePart.__init__(self, name, b"")
+
+
+
+def as_part(f):
+    """
+    Return a part for an element of a multipart input.
+
+    :param f: Either a :py:class:`FilePart`, a ``(name, f)`` tuple, where ``f``
+              is ``None`` for directories, or any input accepted by
+              :py:func:`iter_chunks`.
+    :return:  A :py:class:`FilePart`
+    """
+
+    if (isinstance(f, FilePart)):
+        return f
+    elif (isinstance(f, tuple)):
+        name, f = f
+        return DirectoryPart(name) if (f == None) else FilePart(name, f)
+    else:
+        return FilePart("data", f, "data")
+
+
+def tree_parts(path, hidden = False):
+    """
+    Return the parts for a local directory tree.
+
+    :param path:   The path of the directory in the local file system
+    :param hidden: Whether to include files and directories whose names start
+                   with a dot.
+    :return:       A list of :py:class:`DirectoryPart` and
+                   :py:class:`LocalFilePart`. The names are relative to the
+                   parent of ``path``.
+    """
+
+    path = os.path.abspath(path)
+    if (not os.path.isdir(path)):
+        return [LocalFilePart(os.path.basename(path), path)]
+
+    base = os.path.dirname(path)
+    parts = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        if (not hidden):
+            dirnames[:] = [d for d in dirnames if (not d.startswith("."))]
+            filenames = [f for f in filenames if (not f.startswith("."))]
+        dirnames.sort()
+        parts.append(DirectoryPart(os.path.relpath(dirpath, base).replace(os.sep, "/")))
+        for filename in sorted(filenames):
+            local_path = os.path.join(dirpath, filename)
+            parts.append(LocalFilePart(os.path.relpath(local_path, base).replace(os.sep, "/"), local_path))
+    return parts
+
+
+
+class MultipartEncoder:
+    """
+    A streaming ``multipart/form-data`` encoder for the input of an RPC call.
+
+    Iterating over the encoder (synchronously or with ``async for``) yields
+    the request body in chunks.
+    """
+
+    def __init__(self, f_in, boundary = None, chunk_size = CHUNK_SIZE):
+        """
+        Create a multipart encoder.
+
+        :param f_in:       The input. Either a list (or tuple) of parts (see
+                           :py:func:`as_part`) or a single input accepted by
+                           :py:func:`iter_chunks`.
+        :param boundary:   The multipart boundary (optional)
+        :param chunk_size: The size of chunks in which streams are read
+        """
+
+        if (isinstance(f_in, (list, tuple))):
+            self.parts = [as_part(f) for f in f_in]
+        else:
+            self.parts = [as_part(f_in)]
+        self.boundary = boundary or uuid4().hex
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+        """ The number of bytes of the body that have been yielded so far. """
+
+
+    @property
+    def content_type(self):
+        """ The value of the ``Content-Type`` header of the request. """
+        return "multipart/form-data; boundary={}".format(self.boundary)
+
+
+    def _head(self, part):
+        return b"--" + self.boundary.encode() + b"\r\n" + part.headers() + b"\r\n"
+
+
+    def _tail(self):
+        return "--{}--\r\n".format(self.boundary).encode()
+
+
+    def _iter_body(self):
+        for part in self.parts:
+            yield self._head(part)
+            f = part.open()
+            try:
+                yield from iter_chunks(f, self.chunk_size)
+            finally:
+                part.close(f)
+            yield b"\r\n"
+        yield self._tail()
+
+
+    async def _aiter_body(self):
+        for part in self.parts:
+            yield self._head(part)
+            f = part.open()
+            try:
+                async for data in aiter_chunks(f, self.chunk_size):
+                    yield data
+            finally:
+                part.close(f)
+            yield b"\r\n"
+        yield self._tail()
+
+
+    def __iter__(self):
+        for data in self._iter_body():
+            self.bytes_sent += len(data)
+            yield data
+
+
+    async def __aiter__(self):
+        async for data in self._aiter_body():
+            self.bytes_sent += len(data)
+            yield data
+
+
+
+__all__ = [
+    "iter_chunks",
+    "aiter_chunks",
+    "FilePart",
+    "LocalFilePart",
+    "DirectoryPart",
+    "as_part",
+    "tree_parts",
+    "MultipartEncoder"
+]
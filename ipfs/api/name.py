@@ -12,6 +12,8 @@ class NameApi:
 
     def __init__(self, root):
         self._rpc = root.name
+        self._publish = self._rpc.publish.compile(codec.JSON)
+        self._resolve = self._rpc.resolve.compile(codec.JSON)
 
 
     def publish(self, path, resolve = True, lifetime = None, ttl = None):
@@ -28,7 +30,7 @@ class NameApi:
            ``Name``:  The IPNS name of the published object
            ``Value``: The IPFS path of the published object
         """
-        return self._rpc.publish.with_outputenc(codec.JSON)(path, resolve = True, lifetime = lifetime, ttl = ttl)
+        return self._publish(path, resolve = True, lifetime = lifetime, ttl = ttl)
 
 
     def resolve(self, name = None, recursive = None, nocache = None):
@@ -44,7 +46,7 @@ class NameApi:
            ``Path``: The path pubilshed under that name
         :raise: ProxyError if the name can't be resolved
         """
-        return self._rpc.resolve.with_outputenc(codec.JSON)(name, recursive = recursive, nocache = nocache)
+        return self._resolve(name, recursive = recursive, nocache = nocache)
 
 
 __all__ = ["NameApi"]
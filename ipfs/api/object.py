@@ -12,7 +12,7 @@ class ObjectPatchApi:
     
     def __init__(self, rpc, key):
         self.key = key
-        self._rpc = rpc.patch[key]
+        self._rpc = rpc.patch.compile(codec.JSON)
 
 
     def add_link(self, name, hash):
@@ -23,7 +23,7 @@ class ObjectPatchApi:
         :param hash: Hash of object to be linked
         :return:     The new object
         """
-        return self._rpc.with_outputenc(codec.JSON)("add-link", name, hash)
+        return self._rpc(self.key, "add-link", name, hash)
 
 
     def rm_link(self, name):
@@ -33,7 +33,7 @@ class ObjectPatchApi:
         :param name: Link name
         :return:     The new object
         """
-        return self._rpc.with_outputenc(codec.JSON)("rm-link", name)
+        return self._rpc(self.key, "rm-link", name)
 
 
     def set_data(self, f):
@@ -69,6 +69,12 @@ class ObjectApi:
     
     def __init__(self, root):
         self._rpc = root.object
+        self._data = self._rpc.data.compile()
+        self._links = self._rpc.links.compile(codec.JSON)
+        self._get = self._rpc.get.compile(PBNode)
+        self._put = self._rpc.put.compile(codec.JSON, PBNode)
+        self._stat = self._rpc.stat.compile(codec.JSON)
+        self._new = self._rpc.new.compile(codec.JSON)
 
     def data(self, key):
         """
@@ -81,7 +87,7 @@ class ObjectApi:
         :param key: Key of the object to retrieve
         :return HTTPResponse: The raw bytes of that object
         """
-        return self._rpc.data[key]()
+        return self._data(key)
 
     def links(self, key):
         """
@@ -97,7 +103,7 @@ class ObjectApi:
             ``Hash``: The hash of the linked object
             ``Size``: The size of the linked object
         """
-        return self._rpc.links[key].with_outputenc(codec.JSON)()
+        return self._links(key)
 
     def get(self, key):
         """
@@ -115,7 +121,7 @@ class ObjectApi:
            ``Data``:  The raw data stored in this object, if any
            ``Links``: See :py:meth:`~ipfs.api.object.ObjectApi.links`, if any. An object without links can cause the Links item to not exist, the Links item being None or the Links item being the empty list.
         """
-        return self._rpc.get[key].with_outputenc(PBNode)()
+        return self._get(key)
 
     def put(self, node):
         """
@@ -130,7 +136,7 @@ class ObjectApi:
            ``Hash``:  The hash of the object
            ``Links``: The links of the object. See :py:meth:`~ipfs.api.object.ObjectApi.get`.
         """
-        return self._rpc.put.with_inputenc(PBNode).with_outputenc(codec.JSON)(_in = node)
+        return self._put(_in = node)
 
     def stat(self, key):
         """
@@ -145,7 +151,7 @@ class ObjectApi:
         :param key: Key of the object to retrieve
         :return: Dict with stats. See example output.
         """
-        return self._rpc.stat[key].with_outputenc(JSON)()
+        return self._stat(key)
 
     def new(self, template = None):
         """
@@ -156,7 +162,7 @@ class ObjectApi:
         :return: Same as :py:meth:`~ipfs.api.object.ObjectApi.put`
         
         """
-        return self._rpc.new.with_outputenc(codec.JSON)(template)
+        return self._new(template)
     
     def patch(self, key):
         """
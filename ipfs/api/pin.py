@@ -10,6 +10,10 @@ class PinApi:
     
     def __init__(self, root):
         self._rpc = root.pin
+        self._add = self._rpc.add.compile(codec.JSON)
+        self._rm = self._rpc.rm.compile(codec.JSON)
+        self._ls = self._rpc.ls.compile(codec.JSON)
+        self._iter_ls = self._rpc.ls.compile(codec.JsonItems(["Keys"]))
 
 
     def add(self, path):
@@ -20,7 +24,7 @@ class PinApi:
         :return:     A dict with:
            ``Pinned``: List of hashes that have been pinned.
         """
-        return self._rpc.add.with_outputenc(codec.JSON)(path)
+        return self._add(path)
 
 
     def rm(self, path):
@@ -31,7 +35,7 @@ class PinApi:
         :return:     A dict with:
            ``Pinned``: List of hashes that have been unpinned.
         """
-        return self._rpc.rm.with_outputenc(codec.JSON)(path)
+        return self._rm(path)
 
 
     def ls(self):
@@ -42,7 +46,19 @@ class PinApi:
 
         TODO: Example
         """
-        return self._rpc.ls.with_outputenc(codec.JSON)()
+        return self._ls()
+
+
+    def iter_ls(self):
+        """
+        List all pinned objects incrementally. Unlike :py:meth:`ls` the
+        response isn't read completely first, so this returns results early
+        and needs little memory, even if there are millions of pins.
+
+        :return: An iterator over ``(key, info)`` tuples, where ``info`` is a
+                 dict with the ``Type`` of the pin.
+        """
+        return self._iter_ls()
 
 
 __all__ = ["PinApi"]
@@ -2,9 +2,18 @@
 This modules handles HTTP RPC requests, by exposing them via proxies.
 """
 
-import requests
 from io import BytesIO
 
+import requests
+
+from .coalesce import Coalescer
+from .deadline import DeadlineExceeded, DeadlineStream, expires_at, remaining
+from .hedge import Hedger
+from .metrics import Instrumented, MeteredStream, endpoint_of
+from .multipart import MultipartEncoder
+from .schedule import Scheduler, ScheduledStream
+from .session import SharedSession
+
 
 class ProxyError(Exception):
     """ Raised when the HTTP server returns an error code. """
@@ -23,6 +32,7 @@ class Proxy:
     def __init__(self, rootProxy, path):
         self.rootProxy = rootProxy
         self.path = path
+        self._encoded = {}
 
     def _get(self, name):
         """
@@ -34,7 +44,13 @@ class Proxy:
         return Proxy(self.rootProxy, "{}/{}".format(self.path, name))
 
     def __getattr__(self, name):
-        return self._get(name)
+        if (name.startswith("__")):
+            raise AttributeError(name)
+        # There are only a few command names, so children accessed as
+        # attributes are cached. Items (usually keys) aren't.
+        child = self._get(name)
+        self.__dict__[name] = child
+        return child
 
     def __getitem__(self, name):
         return self._get(name)
@@ -60,7 +76,7 @@ class Proxy:
         :return:         A new proxy with the same path but, but with the
                          specified input encoding.
         """
-        return InputEncodingProxy(self, inputenc)
+        return self._encoded_proxy(InputEncodingProxy, inputenc)
 
     def with_outputenc(self, outputenc):
         """
@@ -72,7 +88,37 @@ class Proxy:
         :return:          A new proxy with the same path but, but with the
                           specified output encoding.
         """
-        return OutputEncodingProxy(self, outputenc)
+        return self._encoded_proxy(OutputEncodingProxy, outputenc)
+
+    def _encoded_proxy(self, cls, enc):
+        try:
+            return self._encoded[cls, enc]
+        except KeyError:
+            # codecs are usually singletons, but don't grow without bound if
+            # a new codec is created for every call
+            if (len(self._encoded) >= 16):
+                self._encoded.clear()
+            proxy = self._encoded[cls, enc] = cls(self, enc)
+            return proxy
+
+    def compile(self, outputenc = None, inputenc = None):
+        """
+        Return an :py:class:`Endpoint` for the path of this proxy. The
+        endpoint is resolved once and can then be called with different
+        arguments, e.g. keys, without building new proxies.
+
+        :param outputenc: The output encoding (optional)
+        :param inputenc:  The input encoding (optional)
+        :return:          A new :py:class:`Endpoint`
+
+        Example::
+
+           >>> links = IpfsApi()._rpc.object.links.compile(codec.JSON)
+           >>> links("QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn")
+           {'Hash': 'QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn', 'Links': []}
+
+        """
+        return Endpoint(self.rootProxy, self.path, outputenc, inputenc)
 
 
 
@@ -88,23 +134,16 @@ class InputEncodingProxy(Proxy):
 
     def __call__(self, *args, _in = None, **opts):
         if (_in):
-            # TODO: jgraef: Replace this with something better
-            #
-            # todo: mec-is: I will if you first will let me know what this
-            # callable is supposed to be doing by writing a decent docstring... (;
-            #
-            # NOTE: inputenc.dump expects a writable stream for output, but
-            # calling a proxy with input expects a readable stream for input.
-            # Is there a stream type, which is readable on one end and writable
-            # on the other, but doesn't buffer all the data?
-            buf = BytesIO()
-            _in = self.inputenc.dump(_in, buf)
-            buf.seek(0)
-            _in = buf
+            # The input is encoded chunk by chunk while the request body is
+            # sent, so it's never held in memory completely.
+            _in = self.inputenc.dump_iter(_in)
             opts["inputenc"] = self.inputenc.name
 
         return self.parent(*args, _in = _in, **opts)
 
+    def compile(self, outputenc = None, inputenc = None):
+        return self.parent.compile(outputenc, inputenc or self.inputenc)
+
 
 
 class OutputEncodingProxy(Proxy):
@@ -119,29 +158,176 @@ class OutputEncodingProxy(Proxy):
     def __call__(self, *args, _in = None, **opts):
         opts["encoding"] = self.outputenc.name
         out = self.parent(*args, _in = _in, **opts)
-        return self.outputenc.load(out)
+        return self.rootProxy._load_output(self.outputenc, out)
+
+    def compile(self, outputenc = None, inputenc = None):
+        return self.parent.compile(outputenc or self.outputenc, inputenc)
+
+
+
+class Endpoint:
+    """
+    A compiled RPC function, see :py:meth:`Proxy.compile`.
+
+    Unlike a proxy chain, the path and the encodings of an endpoint are fixed.
+    Keys are passed as arguments instead of path segments, so a call only
+    fills in the arguments.
+    """
+
+    __slots__ = ("rootProxy", "path", "outputenc", "inputenc")
+
+    def __init__(self, rootProxy, path, outputenc = None, inputenc = None):
+        self.rootProxy = rootProxy
+        self.path = path
+        self.outputenc = outputenc
+        self.inputenc = inputenc
+
+    def __call__(self, *args, _in = None, **opts):
+        if (_in and self.inputenc):
+            _in = self.inputenc.dump_iter(_in)
+            opts["inputenc"] = self.inputenc.name
+        outputenc = self.outputenc
+        if (outputenc):
+            opts["encoding"] = outputenc.name
+            out = self.rootProxy._call_endpoint(self.path, args, opts, _in)
+            return self.rootProxy._load_output(outputenc, out)
+        return self.rootProxy._call_endpoint(self.path, args, opts, _in)
+
+    def __repr__(self):
+        return "Endpoint({!r})".format(self.path)
+
+
+
+def build_params(args, opts):
+    """
+    Build the list of query parameters for an RPC call.
+
+    :param args: Iterable of arguments. ``None`` arguments are skipped.
+    :param opts: Dictionary of options. ``None`` options are skipped.
+    :return:     A list of ``(key, value)`` tuples.
+    """
+
+    params = []
+    for arg in args:
+        if (arg != None):
+            params.append(("arg", arg))
+    for opt_key, opt_val in opts.items():
+        if (opt_val != None):
+            params.append((opt_key, str(opt_val)))
+    return params
 
 
 
-class HttpProxy:
+class HttpProxy(Instrumented):
     """
     The root proxy which offers the root attribute from which all proxies are
     derived. This class also actually does the work of doing an HTTP request.
+
+    Every call can be observed with hooks, see :py:mod:`ipfs.api.metrics`.
     """
     
     ENDPOINT = "/api/v0"
     """ The api endpoint we're using. Currently API v0. """
     
     DEBUG = False
-    """ Whether to output debugging information for HTTP requests. """
+    """
+    Whether to output debugging information for HTTP requests. This adds a
+    :py:class:`~ipfs.api.metrics.DebugHook`.
+    """
     
-    def __init__(self, host, port):
+    def __init__(self, host, port, sessions = None, coalesce = False, hedge = False, timeout = None,
+                 schedule = False):
         """ Create an instance of a HTTPProxy. All method calls will be
             executed through HTTP requests.
+
+        :param host:     The hostname where the API is running.
+        :param port:     The port which the API is listening to.
+        :param sessions: The :py:class:`~ipfs.api.session.SessionStrategy`
+                         that provides sessions and configures their
+                         connection pools (default:
+                         :py:class:`~ipfs.api.session.SharedSession`).
+        :param coalesce: Whether concurrent identical calls to
+                         content-addressed endpoints share one request.
+                         Either a bool or a
+                         :py:class:`~ipfs.api.coalesce.Coalescer`. See
+                         :py:mod:`ipfs.api.coalesce`.
+        :param hedge:    Whether slow calls to content-addressed endpoints
+                         are hedged. Either a bool or a
+                         :py:class:`~ipfs.api.hedge.Hedger`. See
+                         :py:mod:`ipfs.api.hedge`.
+        :param timeout:  The default timeout in seconds for every call
+                         (optional). A shorter deadline (see
+                         :py:mod:`ipfs.api.deadline`) takes precedence.
+        :param schedule: Whether requests are admitted by priority and the
+                         number of requests in progress is capped. Either a
+                         bool or a :py:class:`~ipfs.api.schedule.Scheduler`.
+                         See :py:mod:`ipfs.api.schedule`.
         """
         self.base_url = "http://{}:{:d}{}".format(host, port, self.ENDPOINT)
         self.root = Proxy(self, "")
-        self.session = requests.Session()
+        self.sessions = sessions if (sessions != None) else SharedSession()
+        if (coalesce == True):
+            coalesce = Coalescer()
+        self.coalescer = coalesce or None
+        if (hedge == True):
+            hedge = Hedger()
+        self.hedger = hedge or None
+        self.timeout = timeout
+        if (schedule == True):
+            schedule = Scheduler()
+        self.scheduler = schedule or None
+
+
+    @property
+    def session(self):
+        """ The :py:class:`requests.Session` used by the current thread. """
+        return self.sessions.get()
+
+
+    def pool_stats(self):
+        """
+        Return statistics about the connection pools.
+
+        :return: A :py:class:`~ipfs.api.session.PoolStats` instance
+        """
+        return self.sessions.stats()
+
+
+    def coalesce_stats(self):
+        """
+        Return statistics about coalesced calls, or ``None`` if coalescing is
+        disabled.
+
+        :return: A :py:class:`~ipfs.api.coalesce.CoalesceStats` instance
+        """
+        return self.coalescer.stats() if (self.coalescer != None) else None
+
+
+    def hedge_stats(self):
+        """
+        Return statistics about hedged calls, or ``None`` if hedging is
+        disabled.
+
+        :return: A :py:class:`~ipfs.api.hedge.HedgeStats` instance
+        """
+        return self.hedger.stats() if (self.hedger != None) else None
+
+
+    def schedule_stats(self):
+        """
+        Return statistics about scheduled requests, or ``None`` if scheduling
+        is disabled.
+
+        :return: A :py:class:`~ipfs.api.schedule.SchedulerStats` instance
+        """
+        return self.scheduler.stats() if (self.scheduler != None) else None
+
+
+    def close(self):
+        """ Close all pooled connections. """
+        self.sessions.close()
+        if (self.hedger != None):
+            self.hedger.close()
 
 
     def _call_endpoint(self, path, args, opts, f_in):
@@ -158,56 +344,132 @@ class HttpProxy:
                      passing a long option (e.g. --recursive true) to an ipfs
                      shell command.
         
-        :param f_in: Optional input stream. This is like piping a file into
-                     an ipfs shell command.
+        :param f_in: Optional input. This is like piping a file into an ipfs
+                     shell command. This can be a readable stream, a
+                     bytes-like object or an iterable of bytes objects. The
+                     input is streamed as chunked request body. To send
+                     multiple files pass a list of parts (see
+                     :py:class:`~ipfs.api.multipart.MultipartEncoder`).
 
         :return:     A readable file-like object with the return data of the
                      RPC call, i.e. the body of the HTTP response.
 
         :raise: Raises a :py:exc:ProxyError if the server responds with an
-                error code
+                error code, or a
+                :py:exc:`~ipfs.api.deadline.DeadlineExceeded` if the call
+                didn't finish before its deadline.
+        """
+
+        expires = expires_at(self.timeout)
+        if (not f_in and (self.coalescer != None or self.hedger != None)):
+            key = self.coalescer.key(path, args, opts) if (self.coalescer != None) else None
+            hedge = self.hedger != None and self.hedger.applies(path, args)
+            if (key != None):
+                data, _ = self.coalescer.do(key, lambda: self._fetch(path, args, opts, expires, hedge),
+                                            remaining(expires))
+                return BytesIO(data)
+            elif (hedge):
+                return BytesIO(self._fetch(path, args, opts, expires, hedge))
+        return self._request(path, args, opts, f_in, expires)
+
+
+    def _fetch(self, path, args, opts, expires, hedge):
+        """ Return the complete response body of a call without input. """
+        if (hedge):
+            return self.hedger.run(endpoint_of(path), lambda: self._read_all(path, args, opts, expires), expires)
+        return self._read_all(path, args, opts, expires)
+
+
+    def _read_all(self, path, args, opts, expires = None):
+        f = self._request(path, args, opts, None, expires)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+
+    def _request(self, path, args, opts, f_in, expires = None):
         """
+        Send the HTTP request of a call. See :py:meth:`_call_endpoint`.
 
-        params = []
-        for arg in args:
-            if (arg != None):
-                params.append(("arg", arg))
-        for opt_key, opt_val in opts.items():
-            if (opt_val != None):
-                params.append((opt_key, str(opt_val)))
+        :param expires: The deadline of the call (optional, see
+                        :py:func:`~ipfs.api.deadline.expires_at`)
+        """
 
+        params = build_params(args, opts)
         url = self.base_url + path
 
-        # TODO: Support multiple input files
         if (f_in):
-            input_files = [("data", ("data", f_in, "application/octet-stream"))]
+            body = MultipartEncoder(f_in)
+            headers = {"Content-Type": body.content_type}
+            data = iter(body)
             method = "POST"
         else:
-            input_files = None
+            body = None
+            headers = None
+            data = None
             method = "GET"
 
-        if (self.DEBUG):
-            print()
-            print("Request: {} {}".format(method, "(has body)" if (f_in) else ""))
-            print("URL: {}".format(url))
-            if (params):
-                print("Parameters:")
-                for k, v in params:
-                    print("  {}: {}".format(k, v))
-            print()
-
-        resp = self.session.request(method, url, params = params, files = input_files, stream = True)
+        record = self._begin_call(path, method, len(args))
+        scheduler = self.scheduler
+
+        if (scheduler != None):
+            try:
+                wait = scheduler.acquire(expires = expires)
+            except BaseException as e:
+                if (record):
+                    self._end_call(record, e)
+                raise
+            if (record):
+                record.queue_time = wait
+
+        try:
+            try:
+                timeout = remaining(expires)
+                resp = self.session.request(method, url, params = params, headers = headers, data = data,
+                                            stream = True, timeout = timeout)
+            except requests.exceptions.Timeout as e:
+                raise DeadlineExceeded("Deadline exceeded while waiting for response") from e
+        except BaseException as e:
+            if (scheduler != None):
+                scheduler.release()
+            if (record):
+                record.request_bytes = body.bytes_sent if (body) else 0
+                self._end_call(record, e)
+            raise
+
+        if (record):
+            record.request_bytes = body.bytes_sent if (body) else 0
+            record.first_byte(resp.status_code)
 
         if (resp.status_code != 200):
-            raise ProxyError(resp.text)
-
-        if (self.DEBUG):
-            print("Response Headers:")
-            for k, v in resp.headers.items():
-                print("{}: {}".format(k, v))
-            print()
+            error = ProxyError(resp.text)
+            if (scheduler != None):
+                scheduler.release()
+            if (record):
+                record.response_bytes = len(resp.content)
+                self._end_call(record, error)
+            raise error
+
+        out = resp.raw
+        if (scheduler != None):
+            out = ScheduledStream(out, scheduler)
+        if (record):
+            out = MeteredStream(out, record)
+        if (expires != None):
+            out = DeadlineStream(out, expires)
+        return out
+
+
+    def _load_output(self, outputenc, out):
+        """
+        Decode the output of an RPC call.
 
-        return resp.raw
+        :param outputenc: The output encoding
+        :param out:       The value returned by :py:meth:`_call_endpoint`
+        :return:          The decoded output
+        """
+        return outputenc.load(out)
 
 
 __all__ = [
@@ -215,5 +477,6 @@ __all__ = [
     "Proxy",
     "InputEncodingProxy",
     "OutputEncodingProxy",
+    "Endpoint",
     "HttpProxy"
 ]
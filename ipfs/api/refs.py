@@ -0,0 +1,126 @@
+"""
+This module contains the RefsApi, which lists the references of objects.
+"""
+
+import inspect
+
+from .. import codec
+from .proxy import ProxyError
+
+
+EDGE_FORMAT = "<src> <dst> <linkname>"
+""" The format of the refs returned by :py:meth:`RefsApi.edges`. """
+
+
+class RefsApi:
+    """
+    List the hashes of the objects linked by an object, or of all local
+    objects. The responses are streamed, so even the references of a huge
+    DAG are returned early and need little memory.
+    """
+
+    def __init__(self, root):
+        self._rpc = root.refs
+        self._refs = self._rpc.compile(codec.JSONV)
+        self._local = self._rpc.local.compile(codec.JSONV)
+
+
+    def refs(self, path, recursive = None, unique = None, max_depth = None, format = None, edges = None):
+        """
+        List the references of an object.
+
+        :param path:      The path of the object
+        :param recursive: Whether the references of linked objects are
+                          listed too (default: false)
+        :param unique:    Whether objects are only listed once (default:
+                          false)
+        :param max_depth: The maximum depth of recursive references
+                          (optional). Direct links have depth 1.
+        :param format:    The format of each reference with the placeholders
+                          ``<src>``, ``<dst>`` and ``<linkname>`` (default:
+                          ``"<dst>"``)
+        :param edges:     Whether references are formatted as
+                          ``"<src> -> <dst>"`` (default: false)
+        :return:          An iterator over dicts with:
+           ``Ref``: The formatted reference
+           ``Err``: An error message, if the reference couldn't be listed
+        """
+        return self._refs(path, recursive = recursive, unique = unique, format = format, edges = edges,
+                          **{"max-depth": max_depth})
+
+
+    def local(self):
+        """
+        List the hashes of all objects in the local repo.
+
+        :return: An iterator over dicts with ``Ref`` and ``Err``, see
+                 :py:meth:`refs`
+        """
+        return self._local()
+
+
+    def edges(self, path, max_depth = None, unique = None):
+        """
+        List the links of an object and of all objects it links recursively,
+        with one request.
+
+        Example::
+
+           >>> for src, dst, name in IpfsApi().refs.edges(key):
+                   print(src, "-", name, "->", dst)
+
+        :param path:      The path of the object
+        :param max_depth: The maximum depth (optional). Direct links have
+                          depth 1.
+        :param unique:    Whether only the first link to an object is
+                          listed, and its links only once (default: false)
+        :return:          An iterator over ``(src, dst, name)`` tuples with
+                          the hashes of the linking and linked objects and
+                          the link name, in depth-first order
+        :raise:           :py:exc:`~ipfs.api.proxy.ProxyError` if the daemon
+                          reports an error while listing. :py:exc:`TypeError`
+                          with :py:class:`~ipfs.api.AsyncIpfsApi`, use
+                          :py:meth:`aedges` instead.
+        """
+
+        if (inspect.iscoroutinefunction(self._rpc.rootProxy._call_endpoint)):
+            raise TypeError("edges() can't be used with an asynchronous API, use aedges()")
+        for ref in self._edge_refs(path, max_depth, unique):
+            yield self._edge(ref)
+
+
+    async def aedges(self, path, max_depth = None, unique = None):
+        """
+        List the links of an object and of all objects it links recursively,
+        with an :py:class:`~ipfs.api.AsyncIpfsApi`. The links are parsed as
+        they arrive.
+
+        Example::
+
+           >>> async for src, dst, name in AsyncIpfsApi().refs.aedges(key):
+                   print(src, "-", name, "->", dst)
+
+        :return: An asynchronous iterator over ``(src, dst, name)`` tuples.
+                 See :py:meth:`edges` for the parameters.
+        """
+
+        async for ref in await self._edge_refs(path, max_depth, unique):
+            yield self._edge(ref)
+
+
+    def _edge_refs(self, path, max_depth, unique):
+        return self.refs(path, recursive = True, unique = unique, max_depth = max_depth, format = EDGE_FORMAT)
+
+
+    @staticmethod
+    def _edge(ref):
+        if (ref.get("Err")):
+            raise ProxyError(ref["Err"])
+        src, dst, name = ref["Ref"].split(" ", 2)
+        return src, dst, name
+
+
+__all__ = [
+    "EDGE_FORMAT",
+    "RefsApi"
+]
@@ -0,0 +1,440 @@
+"""
+This module implements admission control for RPC calls.
+
+A :py:class:`Scheduler` caps the number of requests that are in progress at
+once. Calls that exceed the cap wait in a queue per priority class, and
+waiting calls of a higher class are always admitted first. Additionally every
+class can be rate-limited by a token bucket::
+
+   >>> scheduler = Scheduler(max_in_flight = 16, rates = {BACKGROUND: (50, 10)})
+   >>> ipfs = IpfsApi(proxy = HttpProxy("localhost", 5001, schedule = scheduler))
+
+The class of a call is set for a block of code with :py:func:`priority`. Calls
+outside such a block are :py:data:`NORMAL`::
+
+   >>> with priority(BACKGROUND):
+           for key in keys:
+               ipfs.pin.add(key)
+
+A request is in progress until its response has been read completely or
+closed, so close streams you don't read to the end.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Condition
+from time import monotonic
+
+from .deadline import DeadlineExceeded, remaining
+
+
+INTERACTIVE = "interactive"
+""" The class of latency-sensitive calls, e.g. reads a user waits for. """
+
+NORMAL = "normal"
+""" The default class. """
+
+BACKGROUND = "background"
+""" The class of bulk work, e.g. prefetching or pinning. """
+
+PRIORITIES = (INTERACTIVE, NORMAL, BACKGROUND)
+""" The priority classes, from highest to lowest. """
+
+
+_priority = ContextVar("ipfs_priority", default = NORMAL)
+
+
+@contextmanager
+def priority(cls):
+    """
+    Context manager that sets the priority class of all calls in its block
+    (by the same thread or task).
+
+    :param cls: One of :py:data:`PRIORITIES`
+    """
+
+    if (cls not in PRIORITIES):
+        raise ValueError("Unknown priority class: {!r}".format(cls))
+    token = _priority.set(cls)
+    try:
+        yield cls
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    """ Return the priority class of calls made now. """
+    return _priority.get()
+
+
+
+class TokenBucket:
+    """
+    A token bucket that allows ``rate`` operations per second on average and
+    bursts of up to ``burst`` operations. It isn't thread-safe.
+    """
+
+    def __init__(self, rate, burst = None):
+        """
+        :param rate:  The number of tokens added per second
+        :param burst: The maximum number of tokens (default: ``rate``, but at
+                      least 1)
+        """
+        self.rate = rate
+        self.burst = burst if (burst != None) else max(rate, 1)
+        self._tokens = self.burst
+        self._last = monotonic()
+
+
+    def take(self, now = None):
+        """
+        Take a token, if one is available.
+
+        :return: 0 if a token was taken, otherwise the time in seconds until
+                 the next token is available
+        """
+
+        if (now == None):
+            now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if (self._tokens >= 1):
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+
+class ClassStats:
+    """
+    Statistics about the calls of a priority class.
+
+    .. py:attribute:: name
+
+       The priority class
+
+    .. py:attribute:: queued
+
+       The number of calls waiting to be admitted
+
+    .. py:attribute:: admitted
+
+       The number of calls that have been admitted
+
+    .. py:attribute:: timeouts
+
+       The number of calls whose deadline expired while waiting
+
+    .. py:attribute:: wait_time
+
+       The total time admitted calls have waited in seconds
+
+    .. py:attribute:: max_wait
+
+       The longest time a call has waited in seconds
+
+    """
+
+    def __init__(self, name, queued = 0, admitted = 0, timeouts = 0, wait_time = 0.0, max_wait = 0.0):
+        self.name = name
+        self.queued = queued
+        self.admitted = admitted
+        self.timeouts = timeouts
+        self.wait_time = wait_time
+        self.max_wait = max_wait
+
+
+    @property
+    def mean_wait(self):
+        """ The average time admitted calls have waited in seconds. """
+        return self.wait_time / self.admitted if (self.admitted) else 0.0
+
+
+    def _copy(self):
+        return ClassStats(self.name, self.queued, self.admitted, self.timeouts, self.wait_time, self.max_wait)
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"name": self.name, "queued": self.queued, "admitted": self.admitted, "timeouts": self.timeouts,
+                "wait_time": self.wait_time, "max_wait": self.max_wait, "mean_wait": self.mean_wait}
+
+
+    def __repr__(self):
+        return "ClassStats(name={!r}, queued={:d}, admitted={:d}, timeouts={:d}, mean_wait={:.6f}s, max_wait={:.6f}s)".format(
+            self.name, self.queued, self.admitted, self.timeouts, self.mean_wait, self.max_wait)
+
+
+
+class SchedulerStats:
+    """
+    Statistics about a :py:class:`Scheduler`.
+
+    .. py:attribute:: in_flight
+
+       The number of admitted calls that are still in progress
+
+    .. py:attribute:: max_in_flight
+
+       The maximum number of calls in progress
+
+    .. py:attribute:: classes
+
+       A dict mapping every priority class to its :py:class:`ClassStats`
+
+    """
+
+    def __init__(self, in_flight, max_in_flight, classes):
+        self.in_flight = in_flight
+        self.max_in_flight = max_in_flight
+        self.classes = classes
+
+
+    @property
+    def queued(self):
+        """ The number of calls waiting to be admitted. """
+        return sum(c.queued for c in self.classes.values())
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                "classes": {name: c.as_dict() for name, c in self.classes.items()}}
+
+
+    def __repr__(self):
+        return "SchedulerStats(in_flight={:d}, max_in_flight={:d}, queued={:d})".format(
+            self.in_flight, self.max_in_flight, self.queued)
+
+
+
+class Scheduler:
+    """
+    Admits calls in priority order, while at most ``max_in_flight`` are in
+    progress. It's thread-safe.
+    """
+
+    def __init__(self, max_in_flight = 8, rates = None):
+        """
+        Create a scheduler.
+
+        :param max_in_flight: The maximum number of calls in progress
+        :param rates:         A dict mapping priority classes to their rate
+                              limit (optional). A rate limit is either the
+                              number of calls per second, or a tuple of that
+                              and the burst size.
+        """
+
+        self.max_in_flight = max_in_flight
+        self._queues = {cls: deque() for cls in PRIORITIES}
+        self._buckets = {}
+        for cls, rate in (rates or {}).items():
+            if (cls not in PRIORITIES):
+                raise ValueError("Unknown priority class: {!r}".format(cls))
+            self._buckets[cls] = TokenBucket(*rate) if (isinstance(rate, tuple)) else TokenBucket(rate)
+        self._stats = {cls: ClassStats(cls) for cls in PRIORITIES}
+        self._in_flight = 0
+        self._cond = Condition()
+
+
+    def _dispatch(self, now):
+        """
+        Admit waiting calls while there is capacity. Must be called with the
+        lock held.
+
+        :return: The time until a rate-limited call can be admitted, or
+                 ``None``
+        """
+
+        wake = None
+        admitted = False
+        while (self._in_flight < self.max_in_flight):
+            for cls in PRIORITIES:
+                queue = self._queues[cls]
+                if (not queue):
+                    continue
+                bucket = self._buckets.get(cls)
+                if (bucket != None):
+                    delay = bucket.take(now)
+                    if (delay > 0):
+                        # lower classes may use the capacity in the meantime
+                        wake = delay if (wake == None) else min(wake, delay)
+                        continue
+                queue.popleft()[1] = True
+                self._in_flight += 1
+                admitted = True
+                break
+            else:
+                break
+        if (admitted):
+            self._cond.notify_all()
+        return wake
+
+
+    def acquire(self, cls = None, expires = None):
+        """
+        Wait until a call is admitted. Every successful call must be followed
+        by a call to :py:meth:`release`.
+
+        :param cls:     The priority class (default: :py:func:`current_priority`)
+        :param expires: The deadline of the call (optional, see
+                        :py:func:`~ipfs.api.deadline.expires_at`)
+        :return:        The time the call waited in seconds
+        :raise:         :py:exc:`~ipfs.api.deadline.DeadlineExceeded` if the
+                        deadline expired while waiting
+        """
+
+        if (cls == None):
+            cls = _priority.get()
+        start = monotonic()
+        # [priority class, admitted]
+        waiter = [cls, False]
+        with self._cond:
+            queue = self._queues[cls]
+            queue.append(waiter)
+            stats = self._stats[cls]
+            stats.queued += 1
+            now = start
+            while (True):
+                wake = self._dispatch(now)
+                if (waiter[1]):
+                    break
+                try:
+                    left = remaining(expires)
+                except DeadlineExceeded:
+                    queue.remove(waiter)
+                    stats.queued -= 1
+                    stats.timeouts += 1
+                    raise
+                if (wake == None or (left != None and left < wake)):
+                    wake = left
+                self._cond.wait(wake)
+                now = monotonic()
+
+            wait = monotonic() - start
+            stats.queued -= 1
+            stats.admitted += 1
+            stats.wait_time += wait
+            stats.max_wait = max(stats.max_wait, wait)
+        return wait
+
+
+    def release(self):
+        """ Record that an admitted call finished. """
+        with self._cond:
+            self._in_flight -= 1
+            self._dispatch(monotonic())
+
+
+    def stats(self):
+        """
+        Return statistics about the scheduled calls.
+
+        :return: A :py:class:`SchedulerStats` instance
+        """
+        with self._cond:
+            return SchedulerStats(self._in_flight, self.max_in_flight,
+                                  {cls: s._copy() for cls, s in self._stats.items()})
+
+
+
+class ScheduledStream:
+    """
+    A wrapper around a readable stream that releases its call at the end of
+    the stream or when it's closed.
+    """
+
+    def __init__(self, f, scheduler):
+        self._f = f
+        self._scheduler = scheduler
+
+
+    def _release(self):
+        scheduler, self._scheduler = self._scheduler, None
+        if (scheduler != None):
+            scheduler.release()
+
+
+    def read(self, n = -1):
+        try:
+            data = self._f.read(n) if (n != None) else self._f.read()
+        except BaseException:
+            self._release()
+            raise
+        if (n == None or n < 0 or not data):
+            self._release()
+        return data
+
+
+    def read1(self, n = -1):
+        read1 = getattr(self._f, "read1", None)
+        if (read1 == None):
+            return self.read(n)
+        try:
+            data = read1(n)
+        except BaseException:
+            self._release()
+            raise
+        if (not data):
+            self._release()
+        return data
+
+
+    def readinto(self, buf):
+        n = self._f.readinto(buf)
+        if (not n and len(buf) > 0):
+            self._release()
+        return n
+
+
+    def readline(self, limit = -1):
+        line = self._f.readline(limit)
+        if (not line):
+            self._release()
+        return line
+
+
+    def __iter__(self):
+        while (True):
+            line = self.readline()
+            if (not line):
+                return
+            yield line
+
+
+    def close(self):
+        self._release()
+        self._f.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __del__(self):
+        self._release()
+
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+
+__all__ = [
+    "INTERACTIVE",
+    "NORMAL",
+    "BACKGROUND",
+    "PRIORITIES",
+    "priority",
+    "current_priority",
+    "TokenBucket",
+    "ClassStats",
+    "SchedulerStats",
+    "Scheduler",
+    "ScheduledStream"
+]
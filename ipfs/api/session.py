@@ -0,0 +1,354 @@
+"""
+This module manages the HTTP sessions and connection pools used by
+:py:class:`~ipfs.api.proxy.HttpProxy`.
+
+A session strategy decides which :py:class:`requests.Session` serves a call
+made by the current thread. :py:class:`SharedSession` shares a single session
+(and its connection pool) between all threads, while
+:py:class:`ThreadLocalSessions` gives every thread its own session.
+
+Example::
+
+   >>> sessions = ThreadLocalSessions(pool_maxsize = 4)
+   >>> ipfs = IpfsApi(proxy = HttpProxy("localhost", 5001, sessions = sessions))
+   >>> sessions.stats()
+   PoolStats(sessions=1, pools=1, connections=1, requests=12)
+
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from threading import Lock, local
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from weakref import finalize
+
+
+_sockets_lock = Lock()
+
+
+class CountingPoolMixin:
+    """
+    Counts the sockets opened by the connections of an urllib3 connection
+    pool in ``num_sockets``. urllib3's ``num_connections`` only counts
+    connection objects, which silently open a new socket if the old one was
+    closed, e.g. by the server.
+    """
+
+    num_sockets = 0
+
+    def _new_conn(self):
+        return self._counted(super()._new_conn())
+
+
+    def _counted(self, conn):
+        """ Make a connection count the sockets it opens. """
+        connect = conn.connect
+        def counting_connect(*args, **kwargs):
+            with _sockets_lock:
+                self.num_sockets += 1
+            return connect(*args, **kwargs)
+        conn.connect = counting_connect
+        return conn
+
+
+
+class CountingHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+
+class CountingHTTPSConnectionPool(CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+
+class PoolingAdapter(HTTPAdapter):
+    """
+    An :py:class:`~requests.adapters.HTTPAdapter` that exposes its pools,
+    which count the sockets they open (see :py:class:`CountingPoolMixin`).
+    The counters of closed pools are kept.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._closed = PoolStats()
+        HTTPAdapter.__init__(self, *args, **kwargs)
+
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool,
+                                                   "https": CountingHTTPSConnectionPool}
+
+
+    def connection_pools(self):
+        """ Return the urllib3 connection pools of this adapter. """
+        pools = self.poolmanager.pools
+        return [pool for pool in map(pools.get, pools.keys()) if (pool != None)]
+
+
+    def pool_stats(self):
+        """
+        Return statistics about the pools of this adapter. The numbers of
+        connections and requests include those of closed pools.
+
+        :return: A :py:class:`PoolStats` instance
+        """
+        stats = PoolStats(0, 0, self._closed.connections, self._closed.requests)
+        for pool in self.connection_pools():
+            stats.pools += 1
+            stats.connections += _num_sockets(pool)
+            stats.requests += pool.num_requests
+        return stats
+
+
+    def _retire_pool(self, pool):
+        """ Keep the counters of a pool that is closed. """
+        self._closed.connections += _num_sockets(pool)
+        self._closed.requests += pool.num_requests
+
+
+    def close(self):
+        for pool in self.connection_pools():
+            self._retire_pool(pool)
+        HTTPAdapter.close(self)
+
+
+
+def _num_sockets(pool):
+    """ Return the number of sockets a pool opened, see :py:class:`CountingPoolMixin`. """
+    return pool.num_sockets if (isinstance(pool, CountingPoolMixin)) else pool.num_connections
+
+
+
+class PoolStats:
+    """
+    Statistics about connection pools.
+
+    .. py:attribute:: sessions
+
+       The number of sessions
+
+    .. py:attribute:: pools
+
+       The number of connection pools
+
+    .. py:attribute:: connections
+
+       The number of connections (sockets) opened, i.e. pool misses
+
+    .. py:attribute:: requests
+
+       The number of requests sent
+
+    """
+
+    def __init__(self, sessions = 0, pools = 0, connections = 0, requests = 0):
+        self.sessions = sessions
+        self.pools = pools
+        self.connections = connections
+        self.requests = requests
+
+
+    @property
+    def hits(self):
+        """ The number of requests that reused a pooled connection. """
+        return max(self.requests - self.connections, 0)
+
+
+    @property
+    def misses(self):
+        """ The number of requests that had to open a new connection. """
+        return self.connections
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"sessions": self.sessions, "pools": self.pools,
+                "connections": self.connections, "requests": self.requests,
+                "hits": self.hits, "misses": self.misses}
+
+
+    def __repr__(self):
+        return "PoolStats(sessions={:d}, pools={:d}, connections={:d}, requests={:d})"\
+            .format(self.sessions, self.pools, self.connections, self.requests)
+
+
+
+class SessionStrategy:
+    """
+    Abstract strategy that provides sessions to threads.
+
+    Implement :py:meth:`get` to implement a strategy.
+    """
+
+    def __init__(self, pool_connections = 10, pool_maxsize = 10, pool_block = False, keep_alive = True):
+        """
+        Create a session strategy.
+
+        :param pool_connections: The number of connection pools (i.e. hosts)
+                                 to cache per session
+        :param pool_maxsize:     The maximum number of connections per host
+                                 that are kept in a pool
+        :param pool_block:       Whether to block, when all connections of a
+                                 pool are in use, instead of opening a
+                                 connection that is discarded afterwards
+        :param keep_alive:       Whether to keep connections alive
+        """
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self._adapters = set()
+        self._mounts = [(prefix, PoolingAdapter) for prefix in ("https://", "http://")]
+        self._retired = PoolStats()
+        self._num_sessions = 0
+        self._lock = Lock()
+
+
+    def mount(self, prefix, adapter_class):
+        """
+        Register an adapter for an URL prefix. It will be mounted on all
+        sessions created afterwards.
+
+        :param prefix:        The URL prefix, e.g. ``"http+unix://"``
+        :param adapter_class: A callable that takes the pool parameters of
+                              :py:class:`~requests.adapters.HTTPAdapter` and
+                              returns a :py:class:`PoolingAdapter`.
+        """
+        self._mounts.append((prefix, adapter_class))
+
+
+    def copy(self):
+        """
+        Return a strategy of the same type, with the same parameters and
+        mounted adapters, that hasn't created any sessions yet.
+        """
+        strategy = type(self)(pool_connections = self.pool_connections,
+                              pool_maxsize = self.pool_maxsize,
+                              pool_block = self.pool_block,
+                              keep_alive = self.keep_alive)
+        strategy._mounts = list(self._mounts)
+        return strategy
+
+
+    def _create_session(self):
+        session = requests.Session()
+        adapters = []
+        for prefix, adapter_class in self._mounts:
+            adapter = adapter_class(pool_connections = self.pool_connections,
+                                    pool_maxsize = self.pool_maxsize,
+                                    pool_block = self.pool_block)
+            session.mount(prefix, adapter)
+            adapters.append(adapter)
+        if (not self.keep_alive):
+            session.headers["Connection"] = "close"
+        with self._lock:
+            self._adapters.update(adapters)
+            self._num_sessions += 1
+        finalize(session, self._retire, adapters)
+        return session
+
+
+    def _retire(self, adapters):
+        """ Close the adapters of a discarded session, but keep their counters. """
+        with self._lock:
+            self._num_sessions -= 1
+            for adapter in adapters:
+                self._adapters.discard(adapter)
+                stats = adapter.pool_stats()
+                self._retired.connections += stats.connections
+                self._retired.requests += stats.requests
+        for adapter in adapters:
+            adapter.close()
+
+
+    def get(self):
+        """
+        Return the session for the current thread.
+
+        Override this method to implement a strategy.
+        """
+        raise NotImplementedError()
+
+
+    def stats(self):
+        """
+        Return statistics about the connection pools. The numbers of
+        connections and requests include those of discarded sessions.
+
+        :return: A :py:class:`PoolStats` instance
+        """
+
+        with self._lock:
+            adapters = list(self._adapters)
+            stats = PoolStats(self._num_sessions, 0, self._retired.connections, self._retired.requests)
+
+        for adapter in adapters:
+            adapter_stats = adapter.pool_stats()
+            stats.pools += adapter_stats.pools
+            stats.connections += adapter_stats.connections
+            stats.requests += adapter_stats.requests
+        return stats
+
+
+    def close(self):
+        """ Close all pooled connections. """
+        with self._lock:
+            adapters = list(self._adapters)
+        for adapter in adapters:
+            adapter.close()
+
+
+
+class SharedSession(SessionStrategy):
+    """
+    All threads share one session. Make sure ``pool_maxsize`` is at least the
+    number of threads that make calls concurrently.
+    """
+
+    def __init__(self, *args, **kwargs):
+        SessionStrategy.__init__(self, *args, **kwargs)
+        self._session = None
+        self._create_lock = Lock()
+
+
+    def get(self):
+        if (self._session == None):
+            with self._create_lock:
+                if (self._session == None):
+                    self._session = self._create_session()
+        return self._session
+
+
+
+class ThreadLocalSessions(SessionStrategy):
+    """
+    Every thread gets its own session and connection pool. The session of a
+    thread is discarded when the thread terminates.
+    """
+
+    def __init__(self, *args, **kwargs):
+        SessionStrategy.__init__(self, *args, **kwargs)
+        self._local = local()
+
+
+    def get(self):
+        try:
+            return self._local.session
+        except AttributeError:
+            self._local.session = session = self._create_session()
+            return session
+
+
+
+__all__ = [
+    "CountingPoolMixin",
+    "CountingHTTPConnectionPool",
+    "CountingHTTPSConnectionPool",
+    "PoolingAdapter",
+    "PoolStats",
+    "SessionStrategy",
+    "SharedSession",
+    "ThreadLocalSessions"
+]
@@ -0,0 +1,150 @@
+"""
+This module implements a transport that talks to the API over a Unix domain
+socket instead of TCP.
+
+Either pass the path of the socket to :py:class:`~ipfs.api.IpfsApi`::
+
+   >>> ipfs = IpfsApi(unix_socket = "/var/run/ipfs/api.sock")
+
+or create a :py:class:`UnixHttpProxy` yourself::
+
+   >>> ipfs = IpfsApi(proxy = UnixHttpProxy("/var/run/ipfs/api.sock"))
+
+"""
+
+import socket
+from functools import partial
+from threading import Lock
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+from .proxy import HttpProxy
+from .session import CountingPoolMixin, PoolingAdapter, SharedSession
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """ An urllib3 HTTP connection over a Unix domain socket. """
+
+    def __init__(self, socket_path, *args, **kwargs):
+        HTTPConnection.__init__(self, "localhost", *args, **kwargs)
+        self.socket_path = socket_path
+
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if (isinstance(self.timeout, (int, float))):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+
+class UnixHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+    """ An urllib3 connection pool for :py:class:`UnixHTTPConnection`. """
+
+    ConnectionCls = UnixHTTPConnection
+
+    def __init__(self, socket_path, **kwargs):
+        HTTPConnectionPool.__init__(self, "localhost", **kwargs)
+        self.socket_path = socket_path
+
+
+    def _new_conn(self):
+        self.num_connections += 1
+        return self._counted(self.ConnectionCls(self.socket_path, timeout = self.timeout.connect_timeout,
+                                                **self.conn_kw))
+
+
+
+class UnixAdapter(PoolingAdapter):
+    """
+    A :py:class:`~requests.adapters.HTTPAdapter` that sends all requests to
+    one Unix domain socket, regardless of the host in the URL.
+    """
+
+    def __init__(self, socket_path, **kwargs):
+        self.socket_path = socket_path
+        self._pool = None
+        self._pool_lock = Lock()
+        PoolingAdapter.__init__(self, **kwargs)
+
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if (self._pool == None):
+                self._pool = UnixHTTPConnectionPool(self.socket_path,
+                                                    maxsize = self._pool_maxsize,
+                                                    block = self._pool_block)
+            return self._pool
+
+
+    def get_connection_with_tls_context(self, request, verify, proxies = None, cert = None):
+        return self._get_pool()
+
+
+    def get_connection(self, url, proxies = None):
+        return self._get_pool()
+
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+
+    def connection_pools(self):
+        return [self._pool] if (self._pool != None) else []
+
+
+    def close(self):
+        with self._pool_lock:
+            if (self._pool != None):
+                self._retire_pool(self._pool)
+                self._pool.close()
+                self._pool = None
+        PoolingAdapter.close(self)
+
+
+
+class UnixHttpProxy(HttpProxy):
+    """
+    A root proxy that sends HTTP requests over a Unix domain socket. Apart
+    from the transport it behaves exactly like
+    :py:class:`~ipfs.api.proxy.HttpProxy`.
+    """
+
+    SCHEME = "http+unix"
+    """ The URL scheme for which the Unix socket adapter is mounted. """
+
+    def __init__(self, socket_path, sessions = None, **kwargs):
+        """
+        Create an instance of an UnixHttpProxy.
+
+        :param socket_path: The path of the Unix domain socket the API is
+                            listening to.
+        :param sessions:    The :py:class:`~ipfs.api.session.SessionStrategy`
+                            (default:
+                            :py:class:`~ipfs.api.session.SharedSession`).
+                            The proxy uses a copy of it, which it mounts the
+                            Unix socket adapter on, so the strategy that is
+                            passed isn't changed.
+        :param kwargs:      Further arguments, see
+                            :py:class:`~ipfs.api.proxy.HttpProxy`
+        """
+
+        sessions = sessions.copy() if (sessions != None) else SharedSession()
+        sessions.mount(self.SCHEME + "://", partial(UnixAdapter, socket_path))
+        HttpProxy.__init__(self, "localhost", 0, sessions = sessions, **kwargs)
+        self.socket_path = socket_path
+        self.base_url = "{}://ipfs{}".format(self.SCHEME, self.ENDPOINT)
+
+
+
+__all__ = [
+    "UnixHTTPConnection",
+    "UnixHTTPConnectionPool",
+    "UnixAdapter",
+    "UnixHttpProxy"
+]
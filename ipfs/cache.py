@@ -0,0 +1,174 @@
+"""
+This module implements an in-memory LRU cache with a byte budget. It's used
+by :py:class:`~ipfs.merkledag.Merkledag` to share decoded node values and
+links between nodes. Content-addressed data never changes, so the cache
+doesn't need to expire entries.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class CacheStats:
+    """
+    Statistics about a :py:class:`LruCache`.
+
+    .. py:attribute:: hits
+
+       The number of lookups that found an entry
+
+    .. py:attribute:: misses
+
+       The number of lookups that didn't find an entry
+
+    .. py:attribute:: evictions
+
+       The number of entries that were removed to stay within the budget
+
+    .. py:attribute:: entries
+
+       The number of entries
+
+    .. py:attribute:: size
+
+       The total size of all entries in bytes
+
+    .. py:attribute:: max_size
+
+       The budget in bytes
+
+    """
+
+    def __init__(self, hits = 0, misses = 0, evictions = 0, entries = 0, size = 0, max_size = 0):
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.entries = entries
+        self.size = size
+        self.max_size = max_size
+
+
+    @property
+    def hit_rate(self):
+        """ The fraction of lookups that found an entry. """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if (lookups) else 0.0
+
+
+    def as_dict(self):
+        """ Return the statistics as dict. """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": self.entries,
+                "size": self.size, "max_size": self.max_size, "hit_rate": self.hit_rate}
+
+
+    def __repr__(self):
+        return "CacheStats(hits={:d}, misses={:d}, evictions={:d}, entries={:d}, size={:d}, max_size={:d})"\
+            .format(self.hits, self.misses, self.evictions, self.entries, self.size, self.max_size)
+
+
+
+class LruCache:
+    """
+    A thread-safe mapping that evicts the least recently used entries, when
+    the total size of its entries exceeds a budget. The size of every entry
+    is given when it's added.
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: The budget in bytes
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = Lock()
+
+
+    def get(self, key, default = None):
+        """
+        Look up an entry and mark it as recently used.
+
+        :param key:     The key
+        :param default: The value returned if there is no entry
+        :return:        The value of the entry or ``default``
+        """
+
+        with self._lock:
+            try:
+                value, size = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+
+    def put(self, key, value, size):
+        """
+        Add or replace an entry and evict old entries if necessary. Entries
+        larger than the budget aren't added.
+
+        :param key:   The key
+        :param value: The value
+        :param size:  The size of the entry in bytes
+        """
+
+        if (size > self.max_size):
+            self.discard(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if (old != None):
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while (self._size > self.max_size):
+                _, (_, evicted) = self._entries.popitem(last = False)
+                self._size -= evicted
+                self._evictions += 1
+
+
+    def discard(self, key):
+        """ Remove an entry, if it exists. """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if (old != None):
+                self._size -= old[1]
+
+
+    def clear(self):
+        """ Remove all entries. """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+    def stats(self):
+        """
+        Return statistics about the cache.
+
+        :return: A :py:class:`CacheStats` instance
+        """
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._size,
+                              self.max_size)
+
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+__all__ = [
+    "CacheStats",
+    "LruCache"
+]
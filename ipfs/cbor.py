@@ -0,0 +1,393 @@
+"""
+This module implements encoding and decoding of CBOR (RFC 8949), a compact,
+self-describing binary format with the data model of JSON plus byte strings.
+
+It's used by :py:data:`ipfs.codec.CBOR`, e.g. to store structured values in
+merkledag nodes::
+
+   >>> dag = Merkledag(IpfsApi(), codec = codec.CBOR)
+   >>> node = dag.builder().value({"name": "foo", "key": b"\\x12\\x20..."}).build()
+
+The following types are supported:
+
+ * ``None``, ``bool``, ``int`` (of any size), ``float`` and ``str``
+ * ``bytes`` (``bytearray`` and ``memoryview`` are encoded as bytes)
+ * ``list`` and ``tuple`` (decoded as list)
+ * ``dict`` and other mappings (decoded as dict)
+ * :py:class:`Tag` for tagged values other than bignums
+
+Integers, lengths and floats are encoded in their shortest form, so equal
+values always have the same encoding. Maps keep their order.
+
+If the `cbor2 <https://pypi.org/project/cbor2/>`_ package is installed, its C
+decoder is used, which is several times faster. It decodes some standard
+tags (e.g. dates) to Python objects instead of :py:class:`Tag`.
+"""
+
+from collections.abc import Mapping
+from io import BytesIO
+from struct import Struct, error as StructError
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class CborError(ValueError):
+    """ Raised if data can't be decoded or a value can't be encoded. """
+    pass
+
+
+
+class Tag:
+    """
+    A tagged value.
+
+    .. py:attribute:: tag
+
+       The tag number
+
+    .. py:attribute:: value
+
+       The tagged value
+
+    """
+
+    __slots__ = ("tag", "value")
+
+    def __init__(self, tag, value):
+        self.tag = tag
+        self.value = value
+
+
+    def __eq__(self, other):
+        return isinstance(other, Tag) and other.tag == self.tag and other.value == self.value
+
+
+    def __hash__(self):
+        return hash((self.tag, self.value))
+
+
+    def __repr__(self):
+        return "Tag({:d}, {!r})".format(self.tag, self.value)
+
+
+
+_UINT16 = Struct(">H")
+_UINT32 = Struct(">I")
+_UINT64 = Struct(">Q")
+_FLOAT16 = Struct(">e")
+_FLOAT32 = Struct(">f")
+_FLOAT64 = Struct(">d")
+
+_BREAK = object()
+_SIMPLE = {20: False, 21: True, 22: None, 23: None}
+
+
+MAX_DEPTH = 512
+""" The maximum nesting depth of arrays, maps and tags that is decoded. """
+
+
+def _read_length(buf, i, info):
+    """ Decode the argument of a data item head. """
+    if (info == 24):
+        return buf[i], i + 1
+    elif (info == 25):
+        return _UINT16.unpack_from(buf, i)[0], i + 2
+    elif (info == 26):
+        return _UINT32.unpack_from(buf, i)[0], i + 4
+    elif (info == 27):
+        return _UINT64.unpack_from(buf, i)[0], i + 8
+    raise CborError("Invalid additional information {:d}".format(info))
+
+
+def _read_chunks(buf, i, major, depth):
+    """ Decode the chunks of an indefinite-length byte or text string. """
+    chunks = []
+    while (True):
+        b = buf[i]
+        if (b == 0xFF):
+            return chunks, i + 1
+        if (b >> 5 != major or b & 31 == 31):
+            raise CborError("Invalid chunk in indefinite-length string")
+        chunk, i = _decode(buf, i, depth)
+        chunks.append(chunk)
+
+
+def _decode(buf, i, depth = 0):
+    """
+    Decode a data item.
+
+    :param buf:   The buffer
+    :param i:     The offset of the data item in the buffer
+    :param depth: The number of arrays, maps and tags the item is nested in
+    :return:      The value and the offset after the data item
+    """
+
+    if (depth > MAX_DEPTH):
+        raise CborError("Data items nested deeper than {:d} levels".format(MAX_DEPTH))
+    b = buf[i]
+    i += 1
+    major = b >> 5
+    n = b & 31
+    if (n >= 24):
+        if (major == 7):
+            if (n == 25):
+                return _FLOAT16.unpack_from(buf, i)[0], i + 2
+            elif (n == 26):
+                return _FLOAT32.unpack_from(buf, i)[0], i + 4
+            elif (n == 27):
+                return _FLOAT64.unpack_from(buf, i)[0], i + 8
+            elif (n == 31):
+                return _BREAK, i
+        if (n == 31):
+            # indefinite length
+            if (major == 2):
+                chunks, i = _read_chunks(buf, i, 2, depth)
+                return b"".join(chunks), i
+            elif (major == 3):
+                chunks, i = _read_chunks(buf, i, 3, depth)
+                return "".join(chunks), i
+            elif (major == 4):
+                values = []
+                while (True):
+                    value, i = _decode(buf, i, depth + 1)
+                    if (value is _BREAK):
+                        return values, i
+                    values.append(value)
+            elif (major == 5):
+                values = {}
+                while (True):
+                    key, i = _decode(buf, i, depth + 1)
+                    if (key is _BREAK):
+                        return values, i
+                    values[key], i = _decode(buf, i, depth + 1)
+            raise CborError("Invalid indefinite length for major type {:d}".format(major))
+        n, i = _read_length(buf, i, n)
+
+    if (major == 0):
+        return n, i
+    elif (major == 3):
+        # loads() detects strings that are truncated at the end of the data
+        j = i + n
+        return str(buf[i:j], "utf-8"), j
+    elif (major == 5):
+        # every key and value takes at least one byte
+        if (2 * n > len(buf) - i):
+            raise CborError("Truncated map")
+        values = {}
+        for k in range(n):
+            # most keys are short strings, so decode them here
+            b = buf[i]
+            if (0x60 <= b < 0x78):
+                j = i + 1 + b - 0x60
+                key = str(buf[i + 1:j], "utf-8")
+                i = j
+            else:
+                key, i = _decode(buf, i, depth + 1)
+            b = buf[i]
+            if (b < 0x18):
+                values[key] = b
+                i += 1
+            elif (0x60 <= b < 0x78):
+                j = i + 1 + b - 0x60
+                values[key] = str(buf[i + 1:j], "utf-8")
+                i = j
+            else:
+                values[key], i = _decode(buf, i, depth + 1)
+        return values, i
+    elif (major == 4):
+        if (n > len(buf) - i):
+            raise CborError("Truncated array")
+        values = [None] * n
+        for k in range(n):
+            b = buf[i]
+            if (b < 0x18):
+                values[k] = b
+                i += 1
+            else:
+                values[k], i = _decode(buf, i, depth + 1)
+        return values, i
+    elif (major == 2):
+        j = i + n
+        return bytes(buf[i:j]), j
+    elif (major == 1):
+        return -1 - n, i
+    elif (major == 6):
+        value, i = _decode(buf, i, depth + 1)
+        if (n == 2 or n == 3):
+            if (type(value) != bytes):
+                raise CborError("Invalid bignum")
+            x = int.from_bytes(value, "big")
+            return (x if (n == 2) else -1 - x), i
+        return Tag(n, value), i
+    else:
+        try:
+            return _SIMPLE[n], i
+        except KeyError:
+            raise CborError("Unsupported simple value {:d}".format(n)) from None
+
+
+def _tag_hook(a, b):
+    # cbor2 < 6 passes (decoder, tag), later versions (tag, immutable)
+    tag = a if (isinstance(a, cbor2.CBORTag)) else b
+    return Tag(tag.tag, tag.value)
+
+
+def _loads_cbor2(data):
+    f = BytesIO(data)
+    try:
+        value = cbor2.CBORDecoder(f, tag_hook = _tag_hook).decode()
+    except (cbor2.CBORDecodeError, RecursionError) as e:
+        raise CborError(str(e)) from None
+    if (f.tell() != len(data)):
+        raise CborError("Extra data after data item")
+    return value
+
+
+def loads(data):
+    """
+    Decode a value.
+
+    :param data: A bytes-like object that contains exactly one data item
+    :return:     The value
+    :raise:      :py:exc:`CborError` if the data is invalid
+    """
+
+    if (cbor2 != None):
+        return _loads_cbor2(data)
+    return _loads(data)
+
+
+def _loads(data):
+    """ Decode a value without cbor2. """
+    try:
+        value, i = _decode(data, 0)
+    except CborError:
+        raise
+    except (IndexError, ValueError, OverflowError, StructError) as e:
+        raise CborError("Truncated or invalid data: {}".format(e)) from None
+    except TypeError as e:
+        # e.g. an array as key of a map
+        raise CborError("Invalid map key: {}".format(e)) from None
+    except RecursionError:
+        raise CborError("Data items nested too deeply") from None
+    if (value is _BREAK):
+        raise CborError("Unexpected break")
+    if (i > len(data)):
+        raise CborError("Truncated data")
+    elif (i < len(data)):
+        raise CborError("Extra data after data item")
+    return value
+
+
+
+def _write_head(out, major, n):
+    """ Append the head of a data item with argument n. """
+    major <<= 5
+    if (n < 24):
+        out.append(major | n)
+    elif (n < 0x100):
+        out.append(major | 24)
+        out.append(n)
+    elif (n < 0x10000):
+        out.append(major | 25)
+        out += _UINT16.pack(n)
+    elif (n < 0x100000000):
+        out.append(major | 26)
+        out += _UINT32.pack(n)
+    else:
+        out.append(major | 27)
+        out += _UINT64.pack(n)
+
+
+def _encode(out, value):
+    t = type(value)
+    if (t == str):
+        data = value.encode("utf-8")
+        _write_head(out, 3, len(data))
+        out += data
+    elif (t == int):
+        if (value >= 0):
+            if (value < 0x10000000000000000):
+                _write_head(out, 0, value)
+            else:
+                out.append(0xC2)
+                _encode(out, value.to_bytes((value.bit_length() + 7) // 8, "big"))
+        else:
+            value = -1 - value
+            if (value < 0x10000000000000000):
+                _write_head(out, 1, value)
+            else:
+                out.append(0xC3)
+                _encode(out, value.to_bytes((value.bit_length() + 7) // 8, "big"))
+    elif (t == dict or (t != list and t != tuple and isinstance(value, Mapping))):
+        _write_head(out, 5, len(value))
+        for k, v in value.items():
+            _encode(out, k)
+            _encode(out, v)
+    elif (t == list or t == tuple):
+        _write_head(out, 4, len(value))
+        for v in value:
+            _encode(out, v)
+    elif (t == bytes or t == bytearray or t == memoryview):
+        _write_head(out, 2, len(value))
+        out += value
+    elif (value is None):
+        out.append(0xF6)
+    elif (t == bool):
+        out.append(0xF5 if (value) else 0xF4)
+    elif (t == float):
+        _encode_float(out, value)
+    elif (t == Tag):
+        _write_head(out, 6, value.tag)
+        _encode(out, value.value)
+    else:
+        raise CborError("Can't encode value of type {}".format(t.__name__))
+
+
+def _encode_float(out, value):
+    """ Append a float in the shortest encoding that represents it exactly. """
+    try:
+        data = _FLOAT16.pack(value)
+        if (_FLOAT16.unpack(data)[0] == value or value != value):
+            out.append(0xF9)
+            out += data
+            return
+    except OverflowError:
+        pass
+    try:
+        data = _FLOAT32.pack(value)
+        if (_FLOAT32.unpack(data)[0] == value):
+            out.append(0xFA)
+            out += data
+            return
+    except OverflowError:
+        pass
+    out.append(0xFB)
+    out += _FLOAT64.pack(value)
+
+
+def dumps(value):
+    """
+    Encode a value.
+
+    :param value: The value
+    :return:      The encoded value as bytes
+    :raise:       :py:exc:`CborError` if the value has an unsupported type
+    """
+
+    out = bytearray()
+    _encode(out, value)
+    return bytes(out)
+
+
+
+__all__ = [
+    "MAX_DEPTH",
+    "CborError",
+    "Tag",
+    "loads",
+    "dumps"
+]
@@ -2,12 +2,109 @@
 This modules handles various encodings formats used by the IPFS HTTP API.
 """
 
+import asyncio
+import bz2
+import concurrent.futures
 import json
+import lzma
 import pickle
+import re
+import zlib
 from pb2nano.reader import Pb2WireReader, Pb2Reader
 from pb2nano.writer import Pb2WireWriter, Pb2Writer
-import codecs
+from collections.abc import Mapping
 from io import BytesIO
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+
+from . import cbor
+from .proto.fast import FAST_CODECS
+from .proto.lazy import LazyMessage, check_types
+
+
+class _PipeWriter:
+    """
+    A writable binary stream that passes chunks of the written data to a
+    bounded queue. This is only used internally by :py:meth:`Codec.dump_iter`.
+    """
+
+    def __init__(self, queue, chunk_size, closed):
+        self._queue = queue
+        self._chunk_size = chunk_size
+        self._closed = closed
+        self._buf = bytearray()
+
+
+    def _put(self, item):
+        while (True):
+            if (self._closed.is_set()):
+                raise BrokenPipeError("Reading end of pipe closed")
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return
+            except Full:
+                pass
+
+
+    def write(self, data):
+        self._buf += data
+        if (len(self._buf) >= self._chunk_size):
+            self._put(bytes(self._buf))
+            self._buf.clear()
+        return len(data)
+
+
+    def close(self, exc = None):
+        if (self._buf):
+            self._put(bytes(self._buf))
+            self._buf.clear()
+        self._put(exc)
+
+
+class _AsyncPipeReader:
+    """
+    A readable binary stream over an asynchronous stream, that is read from a
+    thread other than the one running the event loop. Items appended to
+    :py:attr:`items` are passed to a bounded queue before every read, so they
+    don't wait for data that hasn't arrived yet. This is only used internally
+    by :py:meth:`JsonItems.aload`.
+    """
+
+    def __init__(self, f, loop, queue, closed):
+        self._f = f
+        self._loop = loop
+        self._queue = queue
+        self._closed = closed
+        self.items = []
+
+
+    def _wait(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        while (True):
+            if (self._closed.is_set()):
+                future.cancel()
+                raise BrokenPipeError("Reading end of pipe closed")
+            try:
+                return future.result(timeout = 0.1)
+            except concurrent.futures.TimeoutError:
+                pass
+
+
+    def flush(self):
+        if (self.items):
+            self._wait(self._queue.put(self.items))
+            self.items = []
+
+
+    def read(self, n = -1):
+        self.flush()
+        return self._wait(self._f.read(n))
+
+
+    def close(self, exc = None):
+        self.flush()
+        self._wait(self._queue.put(exc))
+
 
 
 class Codec:
@@ -52,6 +149,69 @@ class Codec:
         raise NotImplementedError()
 
 
+    async def aload(self, f):
+        """
+        Load a object from an asynchronous stream, e.g. an
+        :py:class:`~ipfs.api.aioproxy.AsyncResponseStream`.
+
+        :param f: The asynchronous stream to load from
+        :return:  The object loaded from the stream
+
+        The default implementation reads the whole stream and calls
+        :py:meth:`loads`.
+        """
+        return self.loads(await f.read())
+
+
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = 4):
+        """
+        Dump an object as an iterator over chunks of bytes.
+
+        The default implementation runs :py:meth:`dump` in a separate thread,
+        which writes into a bounded pipe. Thus at most ``max_chunks`` chunks
+        are held in memory at any time, regardless of the size of the encoded
+        object. Codecs whose :py:meth:`dumps` is cheap override this to slice
+        its result instead, which saves starting a thread for every call.
+
+        :param obj:        The object to dump
+        :param chunk_size: The approximate size of the chunks
+        :param max_chunks: The number of chunks that may be buffered
+        :return:           An iterator over bytes objects
+        """
+
+        queue = Queue(max_chunks)
+        closed = Event()
+        pipe = _PipeWriter(queue, chunk_size, closed)
+
+        def producer():
+            try:
+                self.dump(obj, pipe)
+            except BrokenPipeError:
+                return
+            except BaseException as e:
+                pipe.close(e)
+            else:
+                pipe.close()
+
+        thread = Thread(target = producer, daemon = True)
+        thread.start()
+        try:
+            while (True):
+                item = queue.get()
+                if (item == None):
+                    break
+                elif (isinstance(item, BaseException)):
+                    raise item
+                yield item
+        finally:
+            closed.set()
+            try:
+                while (True):
+                    queue.get_nowait()
+            except Empty:
+                pass
+
+
     def dumps(self, obj):
         """
         Dump an object as bytes object.
@@ -86,38 +246,694 @@ class Codec:
 
 
 
+def _join_chunks(pieces, chunk_size):
+    """
+    Join the pieces yielded by ``pieces`` to chunks of about ``chunk_size``
+    bytes. Pieces are either all strings, which are UTF-8 encoded, or all
+    bytes.
+    """
+
+    buf = []
+    n = 0
+    for piece in pieces:
+        buf.append(piece)
+        n += len(piece)
+        if (n >= chunk_size):
+            yield _join(buf)
+            buf.clear()
+            n = 0
+    if (buf):
+        yield _join(buf)
+
+
+def _slices(data, chunk_size):
+    """
+    Slice an encoded object to chunks of ``chunk_size`` bytes. This is used by
+    the ``dump_iter`` of codecs whose ``dumps`` is cheap, instead of running
+    ``dump`` in a thread.
+    """
+    return (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+def _join(pieces):
+    if (isinstance(pieces[0], str)):
+        return "".join(pieces).encode("utf-8")
+    return b"".join(pieces)
+
+
+
+class JsonBackend:
+    """
+    A JSON library used by the JSON codecs.
+
+    .. py:attribute:: name
+
+       The name of the library, e.g. ``"json"``
+
+    .. py:attribute:: loads
+
+       A function that parses a bytes object
+
+    .. py:attribute:: dumps
+
+       A function that serializes an object to a bytes object. It must handle
+       any :py:class:`~collections.abc.Mapping` (e.g. lazily decoded messages)
+       like a dict.
+
+    """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+    def __repr__(self):
+        return "JsonBackend({!r})".format(self.name)
+
+
+
+def _mapping_default(obj):
+    if (isinstance(obj, Mapping)):
+        return dict(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def _stdlib_backend():
+    encoder = json.JSONEncoder(default = _mapping_default)
+    def loads(data):
+        if (isinstance(data, (memoryview, bytearray))):
+            data = bytes(data)
+        return json.loads(data)
+    def dumps(obj):
+        return encoder.encode(obj).encode("utf-8")
+    backend = JsonBackend("json", loads, dumps)
+    backend.iterencode = encoder.iterencode
+    return backend
+
+
+def _orjson_backend():
+    import orjson
+    def dumps(obj):
+        return orjson.dumps(obj, default = _mapping_default)
+    return JsonBackend("orjson", orjson.loads, dumps)
+
+
+def _ujson_backend():
+    import ujson
+    def loads(data):
+        if (isinstance(data, memoryview)):
+            data = bytes(data)
+        return ujson.loads(data)
+    def dumps(obj):
+        return ujson.dumps(obj, default = _mapping_default).encode("utf-8")
+    return JsonBackend("ujson", loads, dumps)
+
+
+JSON_BACKENDS = {
+    "orjson": _orjson_backend,
+    "ujson": _ujson_backend,
+    "json": _stdlib_backend
+}
+"""
+Maps the names of the supported JSON libraries to functions that return a
+:py:class:`JsonBackend` for them, in order of preference. The functions raise
+:py:exc:`ImportError`, if the library isn't installed.
+"""
+
+_backends = {}
+_default_backend = None
+_fastest_backend = None
+
+
+def _fastest():
+    """
+    Return the backend used by default: the fastest installed library parses,
+    but the standard library serializes. Other libraries differ in their
+    output (e.g. orjson is compact, rejects non-str keys and large ints and
+    writes NaN as null), so encoded values, and thus the hashes of nodes,
+    would depend on the installed libraries.
+    """
+
+    global _fastest_backend
+    if (_fastest_backend == None):
+        stdlib = json_backend("json")
+        for name in JSON_BACKENDS:
+            try:
+                fast = json_backend(name)
+                break
+            except ImportError:
+                pass
+        if (fast is stdlib):
+            _fastest_backend = stdlib
+        else:
+            _fastest_backend = JsonBackend("{}+json".format(fast.name), fast.loads, stdlib.dumps)
+            _fastest_backend.iterencode = stdlib.iterencode
+    return _fastest_backend
+
+
+def json_backend(name = None):
+    """
+    Return a JSON backend.
+
+    :param name: The name of the library (see :py:data:`JSON_BACKENDS`). By
+                 default the backend set by :py:func:`set_json_backend` is
+                 used, or one that parses with the fastest installed library
+                 and serializes with the standard library.
+    :return:     A :py:class:`JsonBackend`
+    :raise:      :py:exc:`ImportError` if the library isn't installed
+    """
+
+    if (name == None):
+        if (_default_backend != None):
+            return _default_backend
+        return _fastest()
+    backend = _backends.get(name)
+    if (backend == None):
+        try:
+            factory = JSON_BACKENDS[name]
+        except KeyError:
+            raise ValueError("Unknown JSON backend: {!r}".format(name)) from None
+        backend = _backends[name] = factory()
+    return backend
+
+
+def set_json_backend(name = None):
+    """
+    Set the backend used by JSON codecs that were created without one, e.g.
+    :py:data:`JSON` and :py:data:`JSONV`.
+
+    :param name: The name of the library, or ``None`` for the default (see
+                 :py:func:`json_backend`). Setting another library than
+                 ``"json"`` also changes the output of serialization.
+    :return:     The :py:class:`JsonBackend`
+    """
+
+    global _default_backend
+    _default_backend = None
+    backend = json_backend(name)
+    if (name != None):
+        _default_backend = backend
+    return backend
+
+
+
 class Json(Codec):
     """ Encoding and decoding of JSON. """
 
     name = "json"
-    
+
+    def __init__(self, backend = None):
+        """
+        :param backend: The name of the JSON library (see
+                        :py:func:`json_backend`), or ``None`` for the default
+                        one
+        """
+        self._backend = backend
+
+    @property
+    def backend(self):
+        """ The :py:class:`JsonBackend` used by this codec. """
+        return json_backend(self._backend)
+
     def load(self, f):
-        reader = codecs.getreader("utf-8")
-        f_txt = reader(f)
-        return json.load(f_txt)
+        return self.backend.loads(f.read())
+
+    def loads(self, data):
+        return self.backend.loads(data)
 
     def dump(self, obj, f):
-        writer = codecs.getwriter("utf-8")
-        f_bytes = writer(f)
-        json.dump(obj, f_bytes)
+        f.write(self.backend.dumps(obj))
+
+    def dumps(self, obj):
+        return self.backend.dumps(obj)
 
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = None):
+        backend = self.backend
+        iterencode = getattr(backend, "iterencode", None)
+        if (iterencode != None):
+            return _join_chunks(iterencode(obj), chunk_size)
+        return _slices(backend.dumps(obj), chunk_size)
 
-class JsonVector(Codec):
+
+class JsonVector(Json):
     """ Encoding and decoding of a stream of lines that contain JSON. """
 
     name = "json"
 
+    chunk_size = 262144
+    """ The number of bytes read from a stream at once. """
+
     def load(self, f):
-        reader = codecs.getreader("utf-8")
-        f_txt = reader(f)
+        loads = self.backend.loads
+        for lines in self._batches(f):
+            if (len(lines) == 1):
+                yield loads(lines[0])
+                continue
+            # parsing all lines of a chunk as one array saves the per-call
+            # overhead of the JSON library
+            try:
+                items = loads(b"[" + b",".join(lines) + b"]")
+            except ValueError:
+                # parse line by line to report the error at the right item
+                items = map(loads, lines)
+            yield from items
+
+    def _batches(self, f):
+        """
+        Yield lists of the complete, non-empty lines (without newlines) of a
+        binary stream, one list per chunk read.
+        """
 
-        for l in f_txt:
-            yield json.loads(l)
+        # read1 returns whatever is available, so lines are parsed as soon as
+        # they arrived, instead of when a whole chunk is full
+        read = getattr(f, "read1", f.read)
+        chunk_size = self.chunk_size
+        # pieces of a line that spans several chunks
+        pending = []
+        while (True):
+            chunk = read(chunk_size)
+            if (not chunk):
+                break
+            if (b"\n" not in chunk):
+                pending.append(chunk)
+                continue
+            lines = chunk.split(b"\n")
+            if (pending):
+                pending.append(lines[0])
+                lines[0] = b"".join(pending)
+                pending.clear()
+            tail = lines.pop()
+            if (tail):
+                pending.append(tail)
+            lines = [l for l in lines if (l.strip())]
+            if (lines):
+                yield lines
+        if (pending):
+            line = b"".join(pending)
+            if (line.strip()):
+                yield [line]
+
+    async def aload(self, f):
+        return self._aload_lines(f)
+
+    async def _aload_lines(self, f):
+        loads = self.backend.loads
+        async for l in f:
+            if (l.strip()):
+                yield loads(l)
 
     def dump(self, obj, f):
+        dumps = self.backend.dumps
         for x in obj:
-            json.dump(x, f)
-            f.write("\n")
+            f.write(dumps(x) + b"\n")
+
+    def loads(self, data):
+        return self.load(BytesIO(data))
+
+    def dumps(self, obj):
+        return Codec.dumps(self, obj)
+
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = None):
+        dumps = self.backend.dumps
+        def pieces():
+            for x in obj:
+                yield dumps(x)
+                yield b"\n"
+        return _join_chunks(pieces(), chunk_size)
+
+
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_STRUCTURE = re.compile(rb'[\[\]{}"]')
+_SCALAR = re.compile(rb"[^,:\[\]{}\s]+")
+
+def _runs():
+    """
+    Compile the expressions that match runs of complete array elements and
+    object members. Each is followed by a comma, so it can't be truncated.
+    Values nested deeper than two levels don't match and are read by
+    :py:class:`_JsonTokenizer` instead.
+    """
+    string = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+    flat = rb'(?:[^{}\[\]"]|' + string + rb')*'
+    nested = rb'(?:[^{}\[\]"]|' + string + rb'|\{' + flat + rb'\}|\[' + flat + rb'\])*'
+    value = rb'(?:' + string + rb'|\{' + nested + rb'\}|\[' + nested + rb'\]|[^\s,:\[\]{}"]+)'
+    elements = re.compile(rb'(?:\s*' + value + rb'\s*,)*')
+    members = re.compile(rb'(?:\s*' + string + rb'\s*:\s*' + value + rb'\s*,)*')
+    return elements, members
+
+_ELEMENTS, _MEMBERS = _runs()
+
+
+class _JsonTokenizer:
+    """
+    Reads the structure of a JSON document from a binary stream, while only
+    buffering the value that is currently read. This is only used internally
+    by :py:class:`JsonItems`.
+    """
+
+    def __init__(self, f, chunk_size):
+        self._read = getattr(f, "read1", f.read)
+        self._chunk_size = chunk_size
+        self._eof = False
+        self.buf = bytearray()
+        self.pos = 0
+
+
+    def _fill(self):
+        """ Read more data. Return ``False`` at the end of the stream. """
+        if (self._eof):
+            return False
+        chunk = self._read(self._chunk_size)
+        if (not chunk):
+            self._eof = True
+            return False
+        self.buf += chunk
+        return True
+
+
+    def _compact(self):
+        """ Drop the data before the current position. """
+        if (self.pos >= self._chunk_size):
+            del self.buf[:self.pos]
+            self.pos = 0
+
+
+    def peek(self):
+        """ Skip whitespace and return the next byte. """
+        while (True):
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if (self.pos < len(self.buf)):
+                return self.buf[self.pos]
+            self._compact()
+            if (not self._fill()):
+                raise ValueError("Unexpected end of JSON document")
+
+
+    def expect(self, c):
+        if (self.peek() != c):
+            raise ValueError("Expected {!r} at {!r}".format(chr(c), bytes(self.buf[self.pos:self.pos + 20])))
+        self.pos += 1
+
+
+    def separator(self, end):
+        """
+        Consume a ``,`` or the closing byte ``end``.
+
+        :return: Whether there are more members
+        """
+        c = self.peek()
+        self.pos += 1
+        if (c == 0x2C):
+            return True
+        elif (c == end):
+            return False
+        raise ValueError("Expected ',' or {!r} at {!r}".format(chr(end), bytes(self.buf[self.pos - 1:self.pos + 20])))
+
+
+    def string(self):
+        """ Read a string and return it decoded. """
+        while (True):
+            m = _STRING.match(self.buf, self.pos)
+            if (m != None):
+                break
+            if (not self._fill()):
+                raise ValueError("Unterminated string")
+        self.pos = m.end()
+        s = m.group()
+        if (b"\\" in s):
+            return json.loads(s)
+        return s[1:-1].decode("utf-8")
+
+
+    def skip(self, keep = True):
+        """
+        Skip a value.
+
+        :param keep: Whether the value must stay in the buffer. Otherwise
+                     large values are dropped while they're read.
+        :return:     The offset of the value in :py:attr:`buf`, if ``keep``
+                     is set
+        """
+
+        c = self.peek()
+        start = self.pos
+        buf = self.buf
+        if (c == 0x22):
+            self.string()
+            return start
+        elif (c != 0x5B and c != 0x7B):
+            while (True):
+                m = _SCALAR.match(buf, self.pos)
+                if (m == None):
+                    raise ValueError("Invalid JSON value at {!r}".format(bytes(buf[self.pos:self.pos + 20])))
+                # a number might continue in the next chunk
+                if (m.end() < len(buf) or not self._fill()):
+                    self.pos = m.end()
+                    return start
+
+        depth = 0
+        i = start
+        while (True):
+            m = _STRUCTURE.search(buf, i)
+            if (m != None):
+                j = m.start()
+                c = buf[j]
+                if (c == 0x22):
+                    m = _STRING.match(buf, j)
+                    if (m != None):
+                        i = m.end()
+                        continue
+                    # the string continues in the next chunk
+                    i = j
+                elif (c == 0x5B or c == 0x7B):
+                    depth += 1
+                    i = j + 1
+                    continue
+                else:
+                    depth -= 1
+                    i = j + 1
+                    if (depth == 0):
+                        self.pos = i
+                        return start
+                    continue
+            else:
+                i = len(buf)
+            if (not keep):
+                self.pos = i
+                self._compact()
+                i = self.pos
+            if (not self._fill()):
+                raise ValueError("Unexpected end of JSON document")
+
+
+    def value(self, loads):
+        """ Read a value and decode it with ``loads``. """
+        start = self.skip()
+        value = loads(bytes(self.buf[start:self.pos]))
+        self._compact()
+        return value
+
+
+    def run(self, expr):
+        """
+        Read the complete elements or members (see :py:func:`_runs`) that
+        are in the buffer.
+
+        :return: Their bytes without the trailing comma, or ``None``
+        """
+        start = self.pos
+        end = expr.match(self.buf, start).end()
+        if (end == start):
+            return None
+        self.pos = end
+        return bytes(self.buf[start:end - 1])
+
+
+
+class JsonItems(Json):
+    """
+    Incremental decoding of a single JSON document, e.g. the response of
+    ``pin/ls``. Instead of the whole document, :py:meth:`load` returns an
+    iterator over the items of the array or object at ``path``. Items are
+    decoded as soon as they arrived, and only one item is held in memory at
+    any time::
+
+       >>> keys = codec.JsonItems(["Keys"])
+       >>> for key, info in keys.load(f):
+               print(key, info["Type"])
+
+    Arrays yield their elements, objects yield ``(key, value)`` tuples. If
+    the value at ``path`` is ``null`` or missing, nothing is yielded.
+
+    :py:meth:`aload` returns an asynchronous iterator, which parses the
+    stream incrementally in a separate thread.
+    """
+
+    name = "json"
+
+    chunk_size = 65536
+    """ The number of bytes read from a stream at once. """
+
+    batch_size = 1000
+    """
+    The maximum number of items that :py:meth:`aload` passes from the parsing
+    thread to the event loop at once.
+    """
+
+    def __init__(self, path, backend = None):
+        """
+        :param path:    A sequence of object keys and array indices that
+                        lead to the array or object whose items are
+                        returned. ``"*"`` matches every key or index.
+        :param backend: The name of the JSON library (see
+                        :py:func:`json_backend`), or ``None`` for the default
+                        one
+        """
+        Json.__init__(self, backend)
+        self.path = tuple(path)
+
+    def load(self, f):
+        tokenizer = _JsonTokenizer(f, self.chunk_size)
+        yield from self._walk(tokenizer, self.path, self.backend.loads)
+        # check that the document ends here
+        try:
+            tokenizer.peek()
+        except ValueError:
+            return
+        raise ValueError("Extra data after JSON document")
+
+    def loads(self, data):
+        return self.load(BytesIO(data))
+
+    async def aload(self, f):
+        return self._aload_items(f)
+
+    async def _aload_items(self, f, max_batches = 4):
+        queue = asyncio.Queue(max_batches)
+        closed = Event()
+        reader = _AsyncPipeReader(f, asyncio.get_running_loop(), queue, closed)
+
+        def producer():
+            try:
+                for item in self.load(reader):
+                    reader.items.append(item)
+                    if (len(reader.items) >= self.batch_size):
+                        reader.flush()
+            except BrokenPipeError:
+                return
+            except BaseException as e:
+                reader.close(e)
+            else:
+                reader.close()
+
+        thread = Thread(target = producer, daemon = True)
+        thread.start()
+        try:
+            while (True):
+                items = await queue.get()
+                if (items == None):
+                    break
+                elif (isinstance(items, BaseException)):
+                    raise items
+                for item in items:
+                    yield item
+        finally:
+            closed.set()
+            while (not queue.empty()):
+                queue.get_nowait()
+
+    def _walk(self, tokenizer, path, loads):
+        """ Yield the items at ``path`` relative to the next value. """
+
+        c = tokenizer.peek()
+        if (not path):
+            if (c == 0x5B or c == 0x7B):
+                yield from self._items(tokenizer, loads, c == 0x7B)
+            else:
+                start = tokenizer.skip()
+                if (tokenizer.buf[start:tokenizer.pos] != b"null"):
+                    raise ValueError("The value at {!r} is neither an array nor an object".format(self.path))
+            return
+
+        head, rest = path[0], path[1:]
+        def child(name):
+            if (head == "*" or head == name):
+                yield from self._walk(tokenizer, rest, loads)
+            else:
+                tokenizer.skip(False)
+        if (c == 0x5B):
+            yield from self._elements(tokenizer, child)
+        elif (c == 0x7B):
+            yield from self._members(tokenizer, child)
+        else:
+            tokenizer.skip(False)
+
+    @staticmethod
+    def _items(tokenizer, loads, is_object):
+        """ Yield the items of the array or object that is the next value. """
+
+        if (is_object):
+            begin, close, expr = b"{", 0x7D, _MEMBERS
+        else:
+            begin, close, expr = b"[", 0x5D, _ELEMENTS
+        tokenizer.expect(begin[0])
+        if (tokenizer.peek() == close):
+            tokenizer.pos += 1
+            return
+        while (True):
+            # decode all complete items in the buffer at once, which is much
+            # faster than decoding them one by one
+            run = tokenizer.run(expr)
+            if (run != None):
+                items = loads(begin + run + bytes([close]))
+                yield from (items.items() if (is_object) else items)
+                tokenizer._compact()
+            # the next item might be incomplete or the last one
+            if (is_object):
+                if (tokenizer.peek() != 0x22):
+                    raise ValueError("Expected object key")
+                key = tokenizer.string()
+                tokenizer.expect(0x3A)
+                yield (key, tokenizer.value(loads))
+            else:
+                yield tokenizer.value(loads)
+            if (not tokenizer.separator(close)):
+                return
+
+    @staticmethod
+    def _elements(tokenizer, element):
+        """
+        Yield from the iterables returned by ``element(index)`` for every
+        element of an array. ``element`` must consume the element.
+        """
+        tokenizer.expect(0x5B)
+        if (tokenizer.peek() == 0x5D):
+            tokenizer.pos += 1
+            return
+        i = 0
+        while (True):
+            yield from element(i)
+            i += 1
+            if (not tokenizer.separator(0x5D)):
+                return
+
+    @staticmethod
+    def _members(tokenizer, member):
+        """ Like :py:meth:`_elements`, but for the members of an object. """
+        tokenizer.expect(0x7B)
+        if (tokenizer.peek() == 0x7D):
+            tokenizer.pos += 1
+            return
+        while (True):
+            if (tokenizer.peek() != 0x22):
+                raise ValueError("Expected object key")
+            key = tokenizer.string()
+            tokenizer.expect(0x3A)
+            yield from member(key)
+            if (not tokenizer.separator(0x7D)):
+                return
 
 
 class Protobuf2(Codec):
@@ -125,37 +941,400 @@ class Protobuf2(Codec):
     
     name = "protobuf"
     
-    def __init__(self, protocol, message):
+    def __init__(self, protocol, message, lazy = False, zero_copy = False):
         """
         Create an instance of a Protobuf2 encoding.
 
-        :param protocol: The Protobuf protocol to be used
-        :param message:  The type in which the top-level message is expected to
-                         be.
+        :param protocol:  The Protobuf protocol to be used
+        :param message:   The type in which the top-level message is expected
+                          to be.
+        :param lazy:      Whether messages are decoded to
+                          :py:class:`~ipfs.proto.lazy.LazyMessage` objects,
+                          whose fields are only decoded when accessed. A
+                          :py:exc:`ValueError` is raised, if the message
+                          has fields of types they don't support.
+        :param zero_copy: Whether ``bytes`` fields are decoded as
+                          :py:class:`memoryview` slices of the input instead
+                          of copies. This is only supported by lazy and
+                          specialized decoding.
         """
 
         self.protocol = protocol
         if (type(message) == str):
             message = self.protocol.messages[message]
         self.message = message
+        self.lazy = lazy
+        self.zero_copy = zero_copy
+        if (lazy):
+            check_types(protocol, message)
+
+
+    def _load_lazy(self, data):
+        return LazyMessage(data, self.protocol, self.message, self.zero_copy).scan()
+
+
+    def _unchanged(self, obj):
+        """ Return the encoding of obj, if it's a lazy message of this type. """
+        if (isinstance(obj, LazyMessage) and obj.message is self.message):
+            return obj.buffer
+        return None
 
 
     def load(self, f):
+        if (self.lazy):
+            return self._load_lazy(f.read())
         wire_reader = Pb2WireReader(f)
         reader = Pb2Reader(wire_reader, self.protocol, self.message)
         return reader.read()
 
 
+    def loads(self, data):
+        if (self.lazy):
+            return self._load_lazy(data)
+        return Codec.loads(self, data)
+
+
     def dump(self, obj, f):
+        data = self._unchanged(obj)
+        if (data != None):
+            f.write(data)
+            return
         wire_writer = Pb2WireWriter(f)
         writer = Pb2Writer(wire_writer, self.protocol, self.message)
         writer.write(obj)
 
 
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = None):
+        # the writer buffers every embedded message to prefix its length, so
+        # dumping into a pipe wouldn't bound the memory anyway
+        return _slices(self.dumps(obj), chunk_size)
+
+
     def __str__(self):
         return "{}/{}".format(self.name, self.message.name)
 
 
+class FastProtobuf2(Protobuf2):
+    """
+    Encoding and decoding of a protobuf2 message with a specialized decoder
+    and encoder. See :py:mod:`ipfs.proto.fast`.
+    """
+
+    def __init__(self, protocol, message, decode, encode, lazy = False, zero_copy = False):
+        """
+        Create an instance of a FastProtobuf2 encoding.
+
+        :param protocol:  The Protobuf protocol to be used
+        :param message:   The type in which the top-level message is expected
+                          to be.
+        :param decode:    A function that decodes a message from bytes. It
+                          takes the bytes and the ``zero_copy`` flag.
+        :param encode:    A function that encodes a message to bytes
+        :param lazy:      See :py:class:`Protobuf2`
+        :param zero_copy: See :py:class:`Protobuf2`
+        """
+
+        Protobuf2.__init__(self, protocol, message, lazy, zero_copy)
+        self._decode = decode
+        self._encode = encode
+
+
+    def load(self, f):
+        return self.loads(f.read())
+
+
+    def loads(self, data):
+        if (self.lazy):
+            return self._load_lazy(data)
+        return self._decode(data, self.zero_copy)
+
+
+    def dump(self, obj, f):
+        f.write(self.dumps(obj))
+
+
+    def dumps(self, obj):
+        data = self._unchanged(obj)
+        if (data != None):
+            return bytes(data)
+        return self._encode(obj)
+
+
+class Cbor(Codec):
+    """
+    Encoding and decoding of CBOR, a compact binary alternative to JSON that
+    supports bytes. See :py:mod:`ipfs.cbor`.
+    """
+
+    name = "cbor"
+
+    def load(self, f):
+        return cbor.loads(f.read())
+
+    def loads(self, data):
+        return cbor.loads(data)
+
+    def dump(self, obj, f):
+        f.write(cbor.dumps(obj))
+
+    def dumps(self, obj):
+        return cbor.dumps(obj)
+
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = None):
+        return _slices(cbor.dumps(obj), chunk_size)
+
+
+class Compressor:
+    """
+    A compression algorithm used by :py:class:`Compressed`.
+
+    .. py:attribute:: name
+
+       The name of the algorithm, e.g. ``"zlib"``
+
+    .. py:attribute:: id
+
+       The number that identifies the algorithm in the header of compressed
+       data (0-255)
+
+    """
+
+    def __init__(self, name, id, compressobj, decompressobj):
+        """
+        :param name:          The name of the algorithm
+        :param id:            The number of the algorithm in headers
+        :param compressobj:   A function that takes the compression level (or
+                              ``None`` for the default) and returns an object
+                              with ``compress(data)`` and ``flush()`` methods
+        :param decompressobj: A function that returns an object with a
+                              ``decompress(data)`` method
+        """
+        self.name = name
+        self.id = id
+        self.compressobj = compressobj
+        self.decompressobj = decompressobj
+
+
+    def __repr__(self):
+        return "Compressor({!r}, {:d})".format(self.name, self.id)
+
+
+
+class _Stored:
+    """ The compressor and decompressor of uncompressed data. """
+
+    def compress(self, data):
+        return data
+
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+def _zlib_compressobj(level):
+    return zlib.compressobj(level if (level != None) else zlib.Z_DEFAULT_COMPRESSION)
+
+
+def _bz2_compressobj(level):
+    return bz2.BZ2Compressor(level if (level != None) else 9)
+
+
+def _lzma_compressobj(level):
+    return lzma.LZMACompressor(preset = level)
+
+
+COMPRESSORS = {}
+""" Maps the names and ids of the registered compressors to :py:class:`Compressor` instances. """
+
+
+def register_compressor(compressor):
+    """
+    Register a compression algorithm, so it can be used by
+    :py:class:`Compressed`.
+
+    :param compressor: A :py:class:`Compressor`
+    :raise:            :py:exc:`ValueError` if its name or id is taken
+    """
+
+    if (compressor.name in COMPRESSORS or compressor.id in COMPRESSORS):
+        raise ValueError("Compressor already registered: {!r}".format(compressor))
+    if (not 0 <= compressor.id < 256):
+        raise ValueError("Invalid compressor id: {:d}".format(compressor.id))
+    COMPRESSORS[compressor.name] = COMPRESSORS[compressor.id] = compressor
+
+
+register_compressor(Compressor("none", 0, lambda level: _Stored(), _Stored))
+register_compressor(Compressor("zlib", 1, _zlib_compressobj, zlib.decompressobj))
+register_compressor(Compressor("bz2", 2, _bz2_compressobj, bz2.BZ2Decompressor))
+register_compressor(Compressor("lzma", 3, _lzma_compressobj, lzma.LZMADecompressor))
+
+
+_COMPRESSED_MAGIC = 0x00
+
+
+class _CompressingWriter:
+    """
+    A writable binary stream that compresses the written data into another
+    stream. This is only used internally by :py:class:`Compressed`.
+    """
+
+    def __init__(self, f, compressobj):
+        self._f = f
+        self._compressobj = compressobj
+
+    def write(self, data):
+        out = self._compressobj.compress(data)
+        if (out):
+            self._f.write(out)
+        return len(data)
+
+    def close(self):
+        out = self._compressobj.flush()
+        if (out):
+            self._f.write(out)
+
+
+class _DecompressingReader:
+    """
+    A readable binary stream that decompresses the data read from another
+    stream. This is only used internally by :py:class:`Compressed`.
+    """
+
+    def __init__(self, f, decompressobj, head = b"", chunk_size = 65536):
+        self._read = getattr(f, "read1", f.read)
+        self._decompressobj = decompressobj
+        self._chunk_size = chunk_size
+        self._buf = decompressobj.decompress(head) if (head) else b""
+        self._eof = False
+
+    def _fill(self):
+        """ Decompress more data. Return ``False`` at the end of the stream. """
+        while (not self._eof):
+            chunk = self._read(self._chunk_size)
+            if (not chunk):
+                self._eof = True
+                flush = getattr(self._decompressobj, "flush", None)
+                if (flush != None):
+                    self._buf += flush()
+                return bool(self._buf)
+            out = self._decompressobj.decompress(chunk)
+            if (out):
+                self._buf = self._buf + out if (self._buf) else out
+                return True
+        return False
+
+    def read1(self, n = -1):
+        if (not self._buf):
+            self._fill()
+        if (n == None or n < 0 or n >= len(self._buf)):
+            data, self._buf = self._buf, b""
+        else:
+            data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def read(self, n = -1):
+        if (n == None or n < 0):
+            chunks = [self._buf]
+            self._buf = b""
+            while (self._fill()):
+                chunks.append(self._buf)
+                self._buf = b""
+            return b"".join(chunks) if (len(chunks) > 1) else chunks[0]
+        while (len(self._buf) < n and self._fill()):
+            pass
+        return self.read1(n)
+
+
+class Compressed(Codec):
+    """
+    Wraps another codec and compresses the data it encodes::
+
+       >>> dag = Merkledag(IpfsApi(), codec = codec.Compressed(codec.JSON))
+
+    The compressed data starts with a two byte header: a zero byte and the
+    id of the compressor (see :py:data:`COMPRESSORS`). Thus data can be
+    decoded regardless of the compressor it was encoded with. Data that
+    doesn't start with a zero byte (e.g. written by the inner codec before
+    compression was enabled) is passed to the inner codec unchanged.
+    """
+
+    def __init__(self, inner, compressor = "zlib", level = None):
+        """
+        :param inner:      The codec that encodes and decodes the values
+        :param compressor: The name of the compressor used for encoding (see
+                           :py:data:`COMPRESSORS`). ``"none"`` only writes
+                           the header.
+        :param level:      The compression level (default: the compressor's
+                           default)
+        """
+
+        self.inner = inner
+        self.compressor = COMPRESSORS[compressor]
+        self.level = level
+        self.name = inner.name
+
+
+    def _header(self):
+        return bytes((_COMPRESSED_MAGIC, self.compressor.id))
+
+
+    @staticmethod
+    def _decompressor(header):
+        """ Return the decompressor of the data with the given header. """
+        try:
+            return COMPRESSORS[header[1]].decompressobj()
+        except (KeyError, IndexError):
+            raise ValueError("Unknown compressor in header: {!r}".format(bytes(header))) from None
+
+
+    def dump(self, obj, f):
+        f.write(self._header())
+        writer = _CompressingWriter(f, self.compressor.compressobj(self.level))
+        self.inner.dump(obj, writer)
+        writer.close()
+
+
+    def dumps(self, obj):
+        compressobj = self.compressor.compressobj(self.level)
+        return b"".join((self._header(), compressobj.compress(self.inner.dumps(obj)), compressobj.flush()))
+
+
+    def dump_iter(self, obj, chunk_size = 65536, max_chunks = 4):
+        def pieces():
+            yield self._header()
+            compressobj = self.compressor.compressobj(self.level)
+            for data in self.inner.dump_iter(obj, chunk_size, max_chunks):
+                out = compressobj.compress(data)
+                if (out):
+                    yield out
+            yield compressobj.flush()
+        return _join_chunks(pieces(), chunk_size)
+
+
+    def load(self, f):
+        head = f.read(2)
+        if (len(head) < 2 or head[0] != _COMPRESSED_MAGIC):
+            return self.inner.load(_DecompressingReader(f, _Stored(), head))
+        return self.inner.load(_DecompressingReader(f, self._decompressor(head)))
+
+
+    def loads(self, data):
+        if (len(data) < 2 or data[0] != _COMPRESSED_MAGIC):
+            return self.inner.loads(data)
+        decompressobj = self._decompressor(data[:2])
+        # a memoryview avoids copying the compressed data
+        data = decompressobj.decompress(memoryview(data)[2:])
+        flush = getattr(decompressobj, "flush", None)
+        rest = flush() if (flush != None) else b""
+        return self.inner.loads(data + rest if (rest) else data)
+
+
+    def __str__(self):
+        return "{}+{}".format(self.inner, self.compressor.name)
+
+
 class Pickle(Codec):
     """ Encoding and decoding with pickle """
 
@@ -178,20 +1357,49 @@ JSONV = JsonVector()
 PICKLE = Pickle()
 """ The singleton instance of the pickle encoding. """
 
-def PB2(protocol, message):
+CBOR = Cbor()
+""" The singleton instance of the CBOR encoding. """
+
+def PB2(protocol, message, lazy = False, zero_copy = False):
     """
     Return a Protobuf2 instance depending on the protocol and message type.
+
+    For the messages in :py:data:`ipfs.proto.fast.FAST_CODECS` a
+    :py:class:`FastProtobuf2` instance is returned.
+
+    :param lazy:      Whether fields are only decoded when accessed. See
+                      :py:mod:`ipfs.proto.lazy`.
+    :param zero_copy: Whether ``bytes`` fields are decoded as
+                      :py:class:`memoryview` slices of the input
     """
-    return Protobuf2(protocol, message)
+
+    if (type(message) == str):
+        message = protocol.messages[message]
+    fast = FAST_CODECS.get(message)
+    if (fast != None):
+        return FastProtobuf2(protocol, message, *fast, lazy = lazy, zero_copy = zero_copy)
+    return Protobuf2(protocol, message, lazy, zero_copy)
         
 
 
 __all__ = [
     "Codec",
+    "JsonBackend",
+    "JSON_BACKENDS",
+    "json_backend",
+    "set_json_backend",
     "Json",
     "JsonVector",
+    "JsonItems",
     "Protobuf2",
+    "FastProtobuf2",
+    "Cbor",
+    "Compressor",
+    "COMPRESSORS",
+    "register_compressor",
+    "Compressed",
     "JSON",
     "JSONV",
+    "CBOR",
     "PB2"
 ]
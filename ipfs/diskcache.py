@@ -0,0 +1,382 @@
+"""
+This module implements a persistent cache for content-addressed data, which
+is shared by all processes that open the same directory::
+
+   >>> cache = DiskCache("/var/cache/ipfs-dag", max_size = 4 << 30)
+   >>> dag = Merkledag(IpfsApi(), disk_cache = cache)
+
+Entries are appended to pack files. Every pack file has an index file with a
+fixed-size entry per record, which every process reads into a dict. Records
+are read through memory maps, so a hit doesn't copy the data until it's
+decoded.
+
+The cache is split into generations of about ``max_size / generations``
+bytes, each with its own pack and index file. Only the newest generation is
+written to. If the total size exceeds ``max_size``, the oldest generations
+are deleted. Hits in the oldest generation are copied to the newest one, so
+data that is still in use survives.
+
+Writers hold an exclusive :py:func:`fcntl.flock` on a lock file, while they
+append or delete generations. Readers don't lock: records are never changed
+after they're indexed, and a deleted pack file stays readable through
+existing memory maps. On platforms without :py:mod:`fcntl` the cache must
+only be used by one process at a time.
+"""
+
+import hashlib
+import mmap
+import os
+import zlib
+from contextlib import contextmanager
+from struct import Struct
+from threading import RLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .cache import CacheStats
+
+
+_RECORD = Struct(">20sII")
+""" The header of a record in a pack file: key digest, length, CRC-32. """
+
+_ENTRY = Struct(">20sQI")
+""" An entry of an index file: key digest, offset of the data, length. """
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode("utf-8")).digest()
+
+
+
+class DiskCache:
+    """
+    A persistent, size-bounded cache that maps string keys to bytes. The
+    data stored for a key must never change, e.g. because the key is the
+    hash of the data. It's thread-safe and can be used by several processes
+    at once.
+    """
+
+    def __init__(self, path, max_size = 1 << 30, generations = 8):
+        """
+        Open or create a cache.
+
+        :param path:        The directory of the cache. It's created if it
+                            doesn't exist.
+        :param max_size:    The maximum size of all pack files in bytes
+        :param generations: The number of generations the size is split
+                            into. More generations evict less data at once,
+                            but use more files.
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.generation_size = max(max_size // generations, 1)
+        os.makedirs(path, exist_ok = True)
+        # digest -> (generation, offset, length)
+        self._index = {}
+        # generation -> digests indexed from its index file
+        self._generations = {}
+        # generation -> bytes read from its index file
+        self._index_pos = {}
+        # generation -> memory map of its pack file
+        self._maps = {}
+        # the generations and the state of the files at the last refresh
+        self._seen = ([], None)
+        self._lock = RLock()
+        self._lock_fd = os.open(os.path.join(path, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._lock:
+            self._refresh()
+
+
+    def _file(self, generation, ext):
+        return os.path.join(self.path, "{:08d}.{}".format(generation, ext))
+
+
+    @contextmanager
+    def _locked(self):
+        """ Hold the lock of this process and the lock file. """
+        with self._lock:
+            if (fcntl != None):
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if (fcntl != None):
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+
+    def _list_generations(self):
+        generations = []
+        for name in os.listdir(self.path):
+            if (name.endswith(".idx")):
+                try:
+                    generations.append(int(name[:-4]))
+                except ValueError:
+                    pass
+        generations.sort()
+        return generations
+
+
+    def _idx_sizes(self, generations):
+        """ Return the sizes of the index files of ``generations``. """
+        sizes = []
+        for generation in generations:
+            try:
+                sizes.append(os.path.getsize(self._file(generation, "idx")))
+            except FileNotFoundError:
+                sizes.append(None)
+        return sizes
+
+
+    def _changed(self):
+        """
+        Return whether the files changed since the last refresh. Creating or
+        deleting a generation changes the modification time of the
+        directory, appending an index entry the size of its index file.
+        """
+        generations, state = self._seen
+        return (os.stat(self.path).st_mtime_ns, self._idx_sizes(generations)) != state
+
+
+    def _refresh(self):
+        """
+        Read the index entries written by other processes and forget deleted
+        generations. Must be called with the lock of this process held.
+        """
+
+        # the directory is looked at before it's listed, so changes while
+        # it's read are noticed by the next refresh
+        mtime = os.stat(self.path).st_mtime_ns
+        generations = self._list_generations()
+        self._seen = (generations, (mtime, self._idx_sizes(generations)))
+        alive = set(generations)
+        for generation in [g for g in self._generations if (g not in alive)]:
+            self._forget(generation)
+
+        for generation in generations:
+            pos = self._index_pos.get(generation, 0)
+            try:
+                with open(self._file(generation, "idx"), "rb") as f:
+                    f.seek(pos)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            # ignore an entry that is still being written
+            n = len(data) - len(data) % _ENTRY.size
+            digests = self._generations.setdefault(generation, [])
+            for digest, offset, length in _ENTRY.iter_unpack(memoryview(data)[:n]):
+                self._index[digest] = (generation, offset, length)
+                digests.append(digest)
+            self._index_pos[generation] = pos + n
+
+
+    def _forget(self, generation):
+        """ Remove a deleted generation from the index. """
+        for digest in self._generations.pop(generation, ()):
+            entry = self._index.get(digest)
+            if (entry != None and entry[0] == generation):
+                del self._index[digest]
+        self._index_pos.pop(generation, None)
+        # the memory map stays valid as long as data read from it is used
+        self._maps.pop(generation, None)
+
+
+    def _map(self, generation, end):
+        """ Return a memory map of a pack file that covers ``end`` bytes. """
+        m = self._maps.get(generation)
+        if (m == None or len(m) < end):
+            with open(self._file(generation, "pack"), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if (size < end):
+                    return None
+                m = mmap.mmap(f.fileno(), size, access = mmap.ACCESS_READ)
+            self._maps[generation] = m
+        return m
+
+
+    def _read(self, digest, generation, offset, length):
+        """ Read and verify a record. Return ``None`` if it's gone or corrupt. """
+        start = offset - _RECORD.size
+        try:
+            m = self._map(generation, offset + length)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (m == None):
+            return None
+        view = memoryview(m)
+        record_digest, record_length, crc = _RECORD.unpack_from(view, start)
+        data = view[offset:offset + length]
+        if (record_digest != digest or record_length != length or zlib.crc32(data) != crc):
+            return None
+        return data
+
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        :param key: The key
+        :return:    The data as read-only :py:class:`memoryview` of the pack
+                    file, or ``None``
+        """
+
+        digest = _digest(key)
+        with self._lock:
+            entry = self._index.get(digest)
+            if (entry == None and self._changed()):
+                # another process might have added it
+                self._refresh()
+                entry = self._index.get(digest)
+            data = self._read(digest, *entry) if (entry != None) else None
+            if (data == None):
+                self._misses += 1
+                return None
+            self._hits += 1
+            generations = self._generations
+            if (len(generations) > 1 and entry[0] == min(generations)):
+                # keep data that is used from being evicted with its generation
+                self._append(digest, data, True)
+            return data
+
+
+    def put(self, key, data):
+        """
+        Add an entry, unless it exists already.
+
+        :param key:  The key
+        :param data: A bytes-like object
+        """
+
+        digest = _digest(key)
+        with self._lock:
+            if (digest not in self._index):
+                self._append(digest, data, False)
+
+
+    def _append(self, digest, data, promote):
+        with self._locked():
+            self._refresh()
+            entry = self._index.get(digest)
+            if (entry != None and (not promote or entry[0] == max(self._generations))):
+                return
+            generation = self._writable_generation(_RECORD.size + len(data))
+            pack = os.open(self._file(generation, "pack"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                offset = os.fstat(pack).st_size + _RECORD.size
+                os.writev(pack, [_RECORD.pack(digest, len(data), zlib.crc32(data)), data])
+            finally:
+                os.close(pack)
+            # the index entry is written last, so indexed records are complete
+            idx = os.open(self._file(generation, "idx"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # drop an entry that a crashed writer left incomplete
+                size = os.fstat(idx).st_size
+                if (size % _ENTRY.size):
+                    os.ftruncate(idx, size - size % _ENTRY.size)
+                os.write(idx, _ENTRY.pack(digest, offset, len(data)))
+            finally:
+                os.close(idx)
+            self._refresh()
+
+
+    def _writable_generation(self, size):
+        """
+        Return the generation to append a record to. Start a new generation
+        and evict old ones as needed. Must be called with the lock file
+        held.
+        """
+
+        generations = sorted(self._generations)
+        if (generations):
+            current = generations[-1]
+            try:
+                used = os.path.getsize(self._file(current, "pack"))
+            except FileNotFoundError:
+                used = 0
+            if (used + size <= self.generation_size or used == 0):
+                return current
+        current = generations[-1] + 1 if (generations) else 0
+        # create the index file first, so other processes see the generation
+        open(self._file(current, "idx"), "ab").close()
+        generations.append(current)
+        self._generations[current] = []
+
+        sizes = {}
+        for generation in generations:
+            try:
+                sizes[generation] = os.path.getsize(self._file(generation, "pack"))
+            except FileNotFoundError:
+                sizes[generation] = 0
+        total = sum(sizes.values()) + size
+        while (total > self.max_size and len(generations) > 1):
+            oldest = generations.pop(0)
+            total -= sizes[oldest]
+            self._evictions += len(self._generations.get(oldest, ()))
+            for ext in ("idx", "pack"):
+                try:
+                    os.unlink(self._file(oldest, ext))
+                except FileNotFoundError:
+                    pass
+            self._forget(oldest)
+        return current
+
+
+    def size(self):
+        """ Return the total size of the pack files in bytes. """
+        total = 0
+        for generation in self._list_generations():
+            try:
+                total += os.path.getsize(self._file(generation, "pack"))
+            except FileNotFoundError:
+                pass
+        return total
+
+
+    def stats(self):
+        """
+        Return statistics about the cache. Hits, misses and evictions are
+        counted by this process only.
+
+        :return: A :py:class:`~ipfs.cache.CacheStats` instance
+        """
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._index), self.size(),
+                              self.max_size)
+
+
+    def close(self):
+        """ Close the lock file. Data that was read stays valid. """
+        with self._lock:
+            self._maps.clear()
+            if (self._lock_fd != None):
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+    def __contains__(self, key):
+        with self._lock:
+            return _digest(key) in self._index
+
+
+    def __len__(self):
+        return len(self._index)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+__all__ = [
+    "DiskCache"
+]
@@ -0,0 +1,854 @@
+"""
+This module implements an in-process stand-in for the IPFS daemon.
+
+:py:class:`FakeDaemon` serves the parts of the ``/api/v0`` HTTP API that are
+used by this library on top of an in-memory or on-disk blockstore. Objects
+are encoded and hashed like go-ipfs does it, so keys are the same as on a real
+daemon. It's meant for tests and repeatable benchmarks on machines without
+network or a running daemon::
+
+   >>> from ipfs.fakedaemon import FakeDaemon
+   >>> with FakeDaemon(latency = 0.001) as daemon:
+           ipfs = daemon.api()
+           key = ipfs.file.add(BytesIO(b"Hello World"))["Hash"]
+           print(ipfs.file.cat(key).read())
+   b'Hello World'
+
+Latency and bandwidth can be injected to simulate a remote or slow daemon.
+"""
+
+import hashlib
+import json
+import os
+import socketserver
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Lock, Thread
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from base58 import b58encode
+
+from . import codec
+from .proto.merkledag import PBMerkleDag
+from .proto.unixfs import UnixFsProtocol
+
+
+PBNode = codec.PB2(PBMerkleDag, "PBNode")
+UnixFsData = codec.PB2(UnixFsProtocol, "Data")
+
+CHUNK_SIZE = 262144
+""" The default size of the chunks files are split into. """
+
+
+def multihash(data):
+    """
+    Return the base58 encoded SHA2-256 multihash of data.
+
+    :param data: A bytes-like object
+    :return:     The multihash as str
+    """
+
+    encoded = b58encode(b"\x12\x20" + hashlib.sha256(data).digest())
+    return encoded.decode("ascii") if (isinstance(encoded, bytes)) else encoded
+
+
+
+class FakeDaemonError(Exception):
+    """ Raised by commands. It's reported to the client as error response. """
+
+
+
+class MemoryBlockstore:
+    """ A blockstore that keeps all blocks in memory. """
+
+    def __init__(self):
+        self._blocks = {}
+        self._lock = Lock()
+
+
+    def put(self, data):
+        """
+        Store a block.
+
+        :param data: The contents of the block
+        :return:     The key of the block
+        """
+        key = multihash(data)
+        with self._lock:
+            self._blocks[key] = bytes(data)
+        return key
+
+
+    def get(self, key):
+        """
+        Return the contents of a block.
+
+        :raise: :py:exc:`FakeDaemonError` if the block doesn't exist
+        """
+        try:
+            return self._blocks[key]
+        except KeyError:
+            raise FakeDaemonError("block not found: {}".format(key))
+
+
+    def has(self, key):
+        """ Return whether a block exists. """
+        return key in self._blocks
+
+
+    def delete(self, key):
+        """ Delete a block. """
+        with self._lock:
+            self._blocks.pop(key, None)
+
+
+    def keys(self):
+        """ Return the keys of all blocks. """
+        with self._lock:
+            return list(self._blocks.keys())
+
+
+
+class DiskBlockstore:
+    """ A blockstore that stores every block in a file of a directory. """
+
+    def __init__(self, directory):
+        """
+        :param directory: The directory where the blocks are stored. It's
+                          created if it doesn't exist.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+
+    def _path(self, key):
+        if ("/" in key or key.startswith(".")):
+            raise FakeDaemonError("invalid key: {}".format(key))
+        return os.path.join(self.directory, key)
+
+
+    def put(self, data):
+        key = multihash(data)
+        path = self._path(key)
+        if (not os.path.exists(path)):
+            tmp = "{}.{:d}.tmp".format(path, os.getpid())
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return key
+
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FakeDaemonError("block not found: {}".format(key))
+
+
+    def has(self, key):
+        return os.path.exists(self._path(key))
+
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+    def keys(self):
+        return [key for key in os.listdir(self.directory) if (not key.endswith(".tmp"))]
+
+
+
+class JsonLines:
+    """ A command result that is sent as a stream of JSON objects, one per line. """
+
+    def __init__(self, items):
+        self.items = items
+
+
+
+def parse_multipart(body, content_type):
+    """
+    Parse a ``multipart/form-data`` body.
+
+    :param body:         The body as bytes
+    :param content_type: The value of the ``Content-Type`` header
+    :return:             A list of ``(filename, content_type, data)`` tuples
+    """
+
+    boundary = None
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if (key.lower() == "boundary"):
+            boundary = value.strip("\"")
+    if (not boundary):
+        raise FakeDaemonError("no multipart boundary")
+
+    parts = []
+    for segment in (b"\r\n" + body).split(b"\r\n--" + boundary.encode())[1:]:
+        if (segment.startswith(b"--")):
+            break
+        head, _, data = segment[2:].partition(b"\r\n\r\n")
+        filename = ""
+        part_type = "application/octet-stream"
+        for line in head.decode("utf-8").split("\r\n"):
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            if (key == "content-disposition"):
+                for param in value.split(";")[1:]:
+                    pkey, _, pvalue = param.strip().partition("=")
+                    if (pkey == "filename"):
+                        filename = unquote(pvalue.strip("\""))
+            elif (key == "content-type"):
+                part_type = value.strip()
+        parts.append((filename, part_type, data))
+    return parts
+
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeDaemon/0.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def handle_one_request(self):
+        try:
+            BaseHTTPRequestHandler.handle_one_request(self)
+        except ConnectionError:
+            # the client gave up on the call, e.g. because of a deadline
+            self.close_connection = True
+
+    def do_GET(self):
+        self.server.fake_daemon._handle(self)
+
+    def do_POST(self):
+        self.server.fake_daemon._handle(self)
+
+
+
+class _UnixHandler(_Handler):
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return "unix"
+
+
+
+class _TcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+
+class FakeDaemon:
+    """
+    An in-process HTTP server that implements the IPFS API used by this
+    library.
+
+    Supported commands: ``id``, ``version``, ``resolve``, ``add``, ``cat``,
+    ``object/{data,links,get,put,stat,new,patch}``, ``block/{get,put,stat}``,
+    ``pin/{add,rm,ls}``, ``name/{publish,resolve}``, ``file/ls``,
+    ``config/show`` and ``repo/gc``.
+
+    .. py:attribute:: calls
+
+       A :py:class:`~collections.Counter` of the number of calls per command
+
+    """
+
+    ENDPOINT = "/api/v0/"
+
+    WRITE_SIZE = 16384
+    """ The size of the pieces in which response bodies are written. """
+
+    def __init__(self, host = "127.0.0.1", port = 0, blockstore = None, latency = 0.0, bandwidth = None, unix_socket = None, chunk_size = CHUNK_SIZE):
+        """
+        Create a fake daemon. Call :py:meth:`start` to start serving.
+
+        :param host:        The address to listen on
+        :param port:        The port to listen on. By default a free port is
+                            chosen.
+        :param blockstore:  The blockstore (default:
+                            :py:class:`MemoryBlockstore`)
+        :param latency:     The delay in seconds before a response is sent.
+                            Either a number or a callable that returns the
+                            delay for every request, e.g. to simulate tail
+                            latency.
+        :param bandwidth:   The maximum bandwidth per response in bytes per
+                            second (optional)
+        :param unix_socket: The path of a Unix domain socket to listen on
+                            instead of TCP (optional)
+        :param chunk_size:  The size of the chunks added files are split into
+        """
+
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.blockstore = blockstore if (blockstore != None) else MemoryBlockstore()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.chunk_size = chunk_size
+        self.peer_id = multihash(b"fakedaemon")
+        self.pins = set()
+        self.names = {}
+        self.calls = Counter()
+        self._lock = Lock()
+        self._server = None
+        self._thread = None
+
+        # like a freshly initialized repo, the empty object and the empty
+        # directory are always available
+        self.put_node()
+        self.put_node(UnixFsData.dumps({"Type": "Directory"}))
+
+        self._commands = {}
+        for attr in dir(self):
+            if (attr.startswith("_cmd_")):
+                self._commands[attr[5:].replace("_", "/")] = getattr(self, attr)
+
+
+    def start(self):
+        """ Start serving in a background thread. """
+        if (self.unix_socket):
+            self._server = _UnixServer(self.unix_socket, _UnixHandler)
+        else:
+            self._server = _TcpServer((self.host, self.port), _Handler)
+            self.host, self.port = self._server.server_address[:2]
+        self._server.fake_daemon = self
+        self._thread = Thread(target = self._server.serve_forever, args = (0.05,), daemon = True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        """ Stop serving. """
+        if (self._server):
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            if (self.unix_socket):
+                try:
+                    os.remove(self.unix_socket)
+                except FileNotFoundError:
+                    pass
+
+
+    def __enter__(self):
+        if (self._server == None):
+            self.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def api(self, **kwargs):
+        """
+        Return an :py:class:`~ipfs.api.IpfsApi` connected to this daemon.
+
+        :param kwargs: Further arguments for :py:class:`~ipfs.api.IpfsApi`
+        """
+        from .api import IpfsApi
+        if (self.unix_socket):
+            return IpfsApi(unix_socket = self.unix_socket, **kwargs)
+        return IpfsApi(self.host, self.port, **kwargs)
+
+
+    # HTTP handling
+
+    def _read_body(self, handler):
+        if ("chunked" in handler.headers.get("Transfer-Encoding", "").lower()):
+            chunks = []
+            while (True):
+                size = int(handler.rfile.readline().split(b";", 1)[0].strip(), 16)
+                if (size == 0):
+                    while (handler.rfile.readline() not in (b"\r\n", b"\n", b"")):
+                        pass
+                    break
+                chunks.append(handler.rfile.read(size))
+                handler.rfile.readline()
+            return b"".join(chunks)
+        length = int(handler.headers.get("Content-Length", 0))
+        return handler.rfile.read(length) if (length) else b""
+
+
+    def _write(self, handler, data):
+        if (self.bandwidth):
+            for i in range(0, len(data), self.WRITE_SIZE):
+                piece = data[i : i + self.WRITE_SIZE]
+                handler.wfile.write(piece)
+                time.sleep(len(piece) / self.bandwidth)
+        else:
+            handler.wfile.write(data)
+
+
+    def _send(self, handler, status, result):
+        if (isinstance(result, (bytes, bytearray, memoryview))):
+            content_type = "text/plain"
+            body = bytes(result)
+        elif (isinstance(result, JsonLines)):
+            content_type = "application/json"
+            body = None
+        else:
+            content_type = "application/json"
+            body = json.dumps(result).encode() + b"\n"
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        if (handler.close_connection):
+            # the client asked to close the connection, so tell it that we do
+            handler.send_header("Connection", "close")
+        if (body != None):
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            self._write(handler, body)
+        else:
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+            for item in result.items:
+                line = json.dumps(item).encode() + b"\n"
+                self._write(handler, b"%x\r\n" % len(line) + line + b"\r\n")
+            self._write(handler, b"0\r\n\r\n")
+        handler.wfile.flush()
+
+
+    def _handle(self, handler):
+        url = urlsplit(handler.path)
+        body = self._read_body(handler)
+
+        if (not url.path.startswith(self.ENDPOINT)):
+            self._send(handler, 404, {"Message": "not found", "Code": 0})
+            return
+
+        segments = [unquote(s) for s in url.path[len(self.ENDPOINT):].split("/")]
+        for i in range(len(segments), 0, -1):
+            name = "/".join(segments[:i])
+            command = self._commands.get(name)
+            if (command):
+                break
+        else:
+            self._send(handler, 404, {"Message": "unknown command", "Code": 0})
+            return
+
+        query = parse_qs(url.query, keep_blank_values = True)
+        rest = "/".join(segments[i:])
+        args = ([rest] if (rest) else []) + query.pop("arg", [])
+        opts = {k: v[-1] for k, v in query.items()}
+        content_type = handler.headers.get("Content-Type", "")
+        files = parse_multipart(body, content_type) if (content_type.startswith("multipart/")) else []
+
+        with self._lock:
+            self.calls[name] += 1
+
+        delay = self.latency() if (callable(self.latency)) else self.latency
+        if (delay):
+            time.sleep(delay)
+
+        try:
+            result = command(args, opts, files)
+        except (FakeDaemonError, IndexError, KeyError, ValueError) as e:
+            self._send(handler, 500, {"Message": str(e), "Code": 0})
+        else:
+            self._send(handler, 200, result)
+
+
+    # merkledag helpers
+
+    def get_node(self, key):
+        """ Return a node as dict with ``Data`` and ``Links``. """
+        node = PBNode.loads(self.blockstore.get(key))
+        node.setdefault("Data", b"")
+        node.setdefault("Links", [])
+        return node
+
+
+    def put_node(self, data = b"", links = ()):
+        """
+        Store a node.
+
+        :param data:  The data of the node
+        :param links: A list of dicts with ``Name``, ``Hash`` and ``Size``
+        :return:      The key of the node
+        """
+        node = {"Links": [{"Hash": l["Hash"], "Name": l.get("Name", ""), "Size": l.get("Size", 0)} for l in links]}
+        if (data):
+            node["Data"] = bytes(data)
+        return self.blockstore.put(PBNode.dumps(node))
+
+
+    def cumulative_size(self, key):
+        """ Return the size of a node plus the sizes of all linked nodes. """
+        node = self.get_node(key)
+        return len(self.blockstore.get(key)) + sum(l.get("Size", 0) for l in node["Links"])
+
+
+    def resolve(self, path):
+        """
+        Resolve an IPFS or IPNS path to a key.
+
+        :param path: A path like ``/ipfs/<key>/<name>``, ``/ipns/<name>`` or
+                     ``<key>/<name>``
+        :return:     The key of the referenced node
+        """
+
+        segments = [s for s in path.split("/") if (s)]
+        if (segments and segments[0] == "ipns"):
+            name = segments[1] if (len(segments) > 1) else self.peer_id
+            target = self.names.get(name)
+            if (target == None):
+                raise FakeDaemonError("could not resolve name: {}".format(name))
+            return self.resolve("/".join([target] + segments[2:]))
+        if (segments and segments[0] == "ipfs"):
+            segments = segments[1:]
+        if (not segments):
+            raise FakeDaemonError("invalid ipfs ref path")
+
+        key = segments[0]
+        if (not self.blockstore.has(key)):
+            raise FakeDaemonError("invalid ipfs ref path: {}".format(path))
+        for name in segments[1:]:
+            for link in self.get_node(key)["Links"]:
+                if (link.get("Name") == name):
+                    key = link["Hash"]
+                    break
+            else:
+                raise FakeDaemonError("no link named {!r} under {}".format(name, key))
+        return key
+
+
+    def _link(self, key, name = ""):
+        return {"Name": name, "Hash": key, "Size": self.cumulative_size(key)}
+
+
+    def _node_result(self, key):
+        links = self.get_node(key)["Links"]
+        return {"Hash": key, "Links": [{"Name": l.get("Name", ""), "Hash": l["Hash"], "Size": l.get("Size", 0)} for l in links]}
+
+
+    # unixfs helpers
+
+    def add_bytes(self, data):
+        """
+        Add a unixfs file.
+
+        :param data: The contents of the file
+        :return:     The key of the file
+        """
+
+        if (len(data) <= self.chunk_size):
+            unixfs = {"Type": "File"}
+            if (data):
+                unixfs["Data"] = data
+            unixfs["filesize"] = len(data)
+            return self.put_node(UnixFsData.dumps(unixfs))
+
+        links = []
+        sizes = []
+        for i in range(0, len(data), self.chunk_size):
+            chunk = data[i : i + self.chunk_size]
+            leaf = self.put_node(UnixFsData.dumps({"Type": "File", "Data": chunk, "filesize": len(chunk)}))
+            links.append(self._link(leaf))
+            sizes.append(len(chunk))
+        unixfs = UnixFsData.dumps({"Type": "File", "filesize": len(data), "blocksize": sizes})
+        return self.put_node(unixfs, links)
+
+
+    def add_directory(self, entries):
+        """
+        Add a unixfs directory.
+
+        :param entries: A dict mapping names to keys
+        :return:        The key of the directory
+        """
+        links = [self._link(entries[name], name) for name in sorted(entries)]
+        return self.put_node(UnixFsData.dumps({"Type": "Directory"}), links)
+
+
+    def unixfs(self, key):
+        """ Return the decoded unixfs data of a node. """
+        return UnixFsData.loads(self.get_node(key)["Data"])
+
+
+    def read_file(self, key):
+        """ Return the contents of a unixfs file. """
+        node = self.get_node(key)
+        unixfs = UnixFsData.loads(node["Data"])
+        if (unixfs["Type"] not in ("File", "Raw")):
+            raise FakeDaemonError("this dag node is a directory")
+        return unixfs.get("Data", b"") + b"".join(self.read_file(l["Hash"]) for l in node["Links"])
+
+
+    # commands
+
+    def _cmd_id(self, args, opts, files):
+        return {"ID": self.peer_id, "PublicKey": "", "Addresses": [],
+                "AgentVersion": "fakedaemon/0.1", "ProtocolVersion": "ipfs/0.1.0"}
+
+
+    def _cmd_version(self, args, opts, files):
+        return {"Version": "0.3.11-dev", "Commit": "", "Repo": "2"}
+
+
+    def _cmd_config_show(self, args, opts, files):
+        return {"Identity": {"PeerID": self.peer_id}, "Datastore": {}, "Addresses": {}}
+
+
+    def _cmd_resolve(self, args, opts, files):
+        return {"Path": "/ipfs/" + self.resolve(args[0])}
+
+
+    def _cmd_add(self, args, opts, files):
+        dirs = {}
+        results = []
+        for name, content_type, data in files:
+            name = name.strip("/")
+            if (content_type == "application/x-directory"):
+                dirs.setdefault(name, {})
+                continue
+            key = self.add_bytes(data)
+            results.append({"Name": name or key, "Hash": key})
+            parent, _, base = name.rpartition("/")
+            if (parent in dirs):
+                dirs[parent][base] = key
+
+        # build directories bottom up
+        for path in sorted(dirs, key = lambda p: p.count("/"), reverse = True):
+            key = self.add_directory(dirs[path])
+            results.append({"Name": path, "Hash": key})
+            parent, _, base = path.rpartition("/")
+            if (parent in dirs):
+                dirs[parent][base] = key
+        return JsonLines(results)
+
+
+    def _cmd_cat(self, args, opts, files):
+        return self.read_file(self.resolve(args[0]))
+
+
+    def _cmd_file_ls(self, args, opts, files):
+        arguments = {}
+        objects = {}
+        for path in args:
+            key = self.resolve(path)
+            arguments[path] = key
+            unixfs = self.unixfs(key)
+            links = []
+            if (unixfs["Type"] == "Directory"):
+                for l in self.get_node(key)["Links"]:
+                    child = self.unixfs(l["Hash"])
+                    links.append({"Name": l.get("Name", ""), "Hash": l["Hash"],
+                                  "Size": child.get("filesize", 0), "Type": child["Type"]})
+            objects[key] = {"Hash": key, "Size": unixfs.get("filesize", 0), "Type": unixfs["Type"], "Links": links}
+        return {"Arguments": arguments, "Objects": objects}
+
+
+    def _cmd_object_data(self, args, opts, files):
+        return self.get_node(self.resolve(args[0]))["Data"]
+
+
+    def _cmd_object_links(self, args, opts, files):
+        return self._node_result(self.resolve(args[0]))
+
+
+    def _cmd_object_get(self, args, opts, files):
+        key = self.resolve(args[0])
+        if (opts.get("encoding") == "protobuf"):
+            return self.blockstore.get(key)
+        node = self.get_node(key)
+        return {"Data": node["Data"].decode("utf-8", "replace"),
+                "Links": self._node_result(key)["Links"]}
+
+
+    def _cmd_object_put(self, args, opts, files):
+        if (not files):
+            raise FakeDaemonError("File argument 'data' is required")
+        data = files[0][2]
+        if (opts.get("inputenc", "json") == "protobuf"):
+            node = PBNode.loads(data)
+        else:
+            node = json.loads(data.decode("utf-8"))
+            if (isinstance(node.get("Data"), str)):
+                node["Data"] = node["Data"].encode("utf-8")
+        return self._node_result(self.put_node(node.get("Data", b""), node.get("Links") or []))
+
+
+    def _cmd_object_stat(self, args, opts, files):
+        key = self.resolve(args[0])
+        block = self.blockstore.get(key)
+        node = self.get_node(key)
+        links_size = len(block) - len(node["Data"])
+        return {"Hash": key, "NumLinks": len(node["Links"]), "BlockSize": len(block),
+                "LinksSize": links_size, "DataSize": len(node["Data"]),
+                "CumulativeSize": self.cumulative_size(key)}
+
+
+    def _cmd_object_new(self, args, opts, files):
+        if (args and args[0] == "unixfs-dir"):
+            key = self.put_node(UnixFsData.dumps({"Type": "Directory"}))
+        elif (args):
+            raise FakeDaemonError("unknown template: {}".format(args[0]))
+        else:
+            key = self.put_node()
+        return self._node_result(key)
+
+
+    def _cmd_object_patch(self, args, opts, files):
+        key = self.resolve(args[0])
+        node = self.get_node(key)
+        links = node["Links"]
+        op = args[1]
+        if (op == "add-link"):
+            name = args[2]
+            links = [l for l in links if (l.get("Name") != name)]
+            links.append(self._link(self.resolve(args[3]), name))
+            links.sort(key = lambda l: l.get("Name", ""))
+            new_key = self.put_node(node["Data"], links)
+        elif (op == "rm-link"):
+            new_key = self.put_node(node["Data"], [l for l in links if (l.get("Name") != args[2])])
+        elif (op == "set-data"):
+            new_key = self.put_node(files[0][2] if (files) else b"", links)
+        elif (op == "append-data"):
+            new_key = self.put_node(node["Data"] + (files[0][2] if (files) else b""), links)
+        else:
+            raise FakeDaemonError("unknown patch operation: {}".format(op))
+        return self._node_result(new_key)
+
+
+    def _cmd_block_get(self, args, opts, files):
+        return self.blockstore.get(self.resolve(args[0]))
+
+
+    def _cmd_block_put(self, args, opts, files):
+        if (not files):
+            raise FakeDaemonError("File argument 'data' is required")
+        data = files[0][2]
+        return {"Key": self.blockstore.put(data), "Size": len(data)}
+
+
+    def _cmd_block_stat(self, args, opts, files):
+        key = self.resolve(args[0])
+        return {"Key": key, "Size": len(self.blockstore.get(key))}
+
+
+    def _cmd_pin_add(self, args, opts, files):
+        keys = [self.resolve(path) for path in args]
+        with self._lock:
+            self.pins.update(keys)
+        return {"Pinned": keys}
+
+
+    def _cmd_pin_rm(self, args, opts, files):
+        keys = [self.resolve(path) for path in args]
+        with self._lock:
+            for key in keys:
+                if (key not in self.pins):
+                    raise FakeDaemonError("not pinned: {}".format(key))
+                self.pins.discard(key)
+        return {"Pinned": keys}
+
+
+    def _cmd_pin_ls(self, args, opts, files):
+        with self._lock:
+            pins = sorted(self.pins)
+        return {"Keys": {key: {"Type": "recursive"} for key in pins}}
+
+
+    def _cmd_refs(self, args, opts, files):
+        flag = lambda name: opts.get(name, "false").lower() == "true"
+        format = "<src> -> <dst>" if (flag("edges")) else opts.get("format", "<dst>")
+        max_depth = int(opts.get("max-depth", "-1")) if (flag("recursive")) else 1
+        unique = flag("unique")
+        roots = [self.resolve(path) for path in args]
+        seen = set()
+
+        def refs(key, depth):
+            # like go-ipfs: every ref is followed by the refs of its object
+            depth += 1
+            if (max_depth >= 0 and depth > max_depth):
+                return
+            try:
+                links = self.get_node(key)["Links"]
+            except (FakeDaemonError, KeyError, ValueError) as e:
+                # the response has started already, so errors are reported in it
+                yield {"Ref": "", "Err": str(e)}
+                return
+            for link in links:
+                dst = link["Hash"]
+                if (unique):
+                    if (dst in seen):
+                        continue
+                    seen.add(dst)
+                ref = format.replace("<src>", key).replace("<dst>", dst).replace("<linkname>", link.get("Name", ""))
+                yield {"Ref": ref, "Err": ""}
+                yield from refs(dst, depth)
+
+        return JsonLines(ref for root in roots for ref in refs(root, 0))
+
+
+    def _cmd_refs_local(self, args, opts, files):
+        return JsonLines({"Ref": key, "Err": ""} for key in sorted(self.blockstore.keys()))
+
+
+    def _cmd_name_publish(self, args, opts, files):
+        path = args[0]
+        if (opts.get("resolve", "true").lower() != "false"):
+            path = "/ipfs/" + self.resolve(path)
+        with self._lock:
+            self.names[self.peer_id] = path
+        return {"Name": self.peer_id, "Value": path}
+
+
+    def _cmd_name_resolve(self, args, opts, files):
+        name = args[0] if (args) else self.peer_id
+        if (name.startswith("/ipns/")):
+            name = name[6:]
+        path = self.names.get(name)
+        if (path == None):
+            raise FakeDaemonError("could not resolve name: {}".format(name))
+        return {"Path": path}
+
+
+    def _cmd_repo_gc(self, args, opts, files):
+        reachable = set()
+        stack = list(self.pins)
+        while (stack):
+            key = stack.pop()
+            if (key in reachable or not self.blockstore.has(key)):
+                continue
+            reachable.add(key)
+            try:
+                stack.extend(l["Hash"] for l in self.get_node(key)["Links"])
+            except Exception:
+                # raw blocks can't be decoded as nodes
+                pass
+        removed = []
+        for key in self.blockstore.keys():
+            if (key not in reachable):
+                self.blockstore.delete(key)
+                removed.append({"Key": key})
+        return JsonLines(removed)
+
+
+
+__all__ = [
+    "multihash",
+    "FakeDaemonError",
+    "MemoryBlockstore",
+    "DiskBlockstore",
+    "JsonLines",
+    "parse_multipart",
+    "FakeDaemon"
+]
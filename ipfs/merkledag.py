@@ -11,11 +11,27 @@ To run the following examples start with::
 
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from threading import Lock
+from weakref import WeakValueDictionary
+
+from . import cbor
+from .api.deadline import deadline
+from .api.object import PBNode
+from .cache import CacheStats, LruCache
 
 # jgraef: TODO: Update docs and examples with value instead of data
 
 
+_ENTRY_OVERHEAD = 100
+""" The estimated memory used by a cache entry or a link besides its data. """
+
+FETCH_MODES = ("separate", "object", "block")
+""" The ways a :py:class:`Merkledag` can load nodes. """
+
+
 
 class Link:
     """
@@ -124,7 +140,10 @@ class Node:
 
 
     def flush(self):
-        """ Flush the cached value and links. """
+        """
+        Flush the cached value and links of this node. They stay in the cache
+        of the merkledag, until they're evicted.
+        """
         self._value = None
         self._links = None
         self._links_map = None
@@ -134,12 +153,42 @@ class Node:
         with self._lock:
             if (self._value != None):
                 return
+            value = self._dag._cached("value", self.hash)
+            if (value != None):
+                self._value = value
+                return
 
-            f = self._dag.ipfs.object.data(self.hash)
-            if (self._dag.codec):
-                self._value = self._dag.codec.load(f)
+            if (self._dag.fetch == "separate"):
+                self._set_value(self._dag._load_data(self.hash))
             else:
-                self._value = f.read()
+                self._load_node()
+
+
+    def _set_value(self, data):
+        if (self._dag.codec):
+            self._value = self._dag.codec.loads(data)
+        else:
+            self._value = bytes(data)
+        if (self._dag.cache_value == None or self._dag.cache_value(self._value)):
+            self._dag._cache("value", self.hash, self._value, len(data))
+
+
+    def _set_links(self, links):
+        self._links = tuple((Link(self._dag, name, hash, size) for name, hash, size in links))
+        self._links_map = {}
+        for l in self._links:
+            self._links_map[l.name] = l
+        size = sum(len(l.hash) + len(l.name or "") + _ENTRY_OVERHEAD for l in self._links)
+        self._dag._cache("links", self.hash, (self._links, self._links_map), size)
+
+
+    def _load_node(self):
+        """ Load the value and links that aren't loaded yet with one request. """
+        data, links = self._dag._load_node(self.hash)
+        if (self._value == None):
+            self._set_value(data)
+        if (self._links == None):
+            self._set_links(links)
 
 
     def _lazy_load_links(self):
@@ -148,13 +197,15 @@ class Node:
         with self._lock:
             if (self._links != None):
                 return
+            cached = self._dag._cached("links", self.hash)
+            if (cached != None):
+                self._links, self._links_map = cached
+                return
 
-            links = self._dag.ipfs.object.links(self.hash)["Links"]
-
-            self._links = tuple((Link(self._dag, l["Name"], l["Hash"], l["Size"]) for l in links))
-            self._links_map = {}
-            for l in self._links:
-                self._links_map[l.name] = l
+            if (self._dag.fetch == "separate"):
+                self._set_links(self._dag._load_links(self.hash))
+            else:
+                self._load_node()
 
 
     @property
@@ -409,17 +460,147 @@ class Merkledag:
 
        >>> dag["/ipns/<your peer ID>"]
 
+    A merkledag returns the same :py:class:`Node` instance for a hash, as
+    long as it's referenced. Decoded values and links are also kept in an
+    LRU cache, so they aren't fetched again when a node is accessed later.
+    Cached values are shared, so don't modify them.
+
+    Node data and links can also be kept in a
+    :py:class:`~ipfs.diskcache.DiskCache`, which survives restarts and can be
+    shared by several processes::
+
+       >>> dag = Merkledag(IpfsApi(), disk_cache = DiskCache("/var/cache/dag"))
+
     """
     
-    def __init__(self, ipfs, codec = None):
+    def __init__(self, ipfs, codec = None, timeout = None, cache_size = 32 << 20, disk_cache = None,
+                 fetch = "separate", cache_value = None):
         """
         Create an instance of a merkledage.
 
-        :param ipfs: An IpfsApi instance
-        :param codec: The coded used for encoding and decoding node data
+        :param ipfs:       An IpfsApi instance
+        :param codec:      The coded used for encoding and decoding node data,
+                           e.g. :py:data:`~ipfs.codec.CBOR` for structured
+                           values
+        :param timeout:    The timeout in seconds for loading a node's value
+                           or links, or resolving a name (optional). An
+                           enclosing :py:func:`~ipfs.api.deadline.deadline`
+                           still applies.
+        :param cache_size: The budget of the cache of node values and links
+                           in bytes. The size of a value is the size of its
+                           encoding. 0 disables the cache.
+        :param disk_cache: A :py:class:`~ipfs.diskcache.DiskCache` for the
+                           encoded data and links of nodes that are missing
+                           from the cache in memory (optional)
+        :param fetch:      How a node is loaded:
+
+                           ``"separate"``
+                              The value and links are loaded when they're
+                              first accessed, with ``object/data`` and
+                              ``object/links``.
+                           ``"object"``
+                              Both are loaded with one ``object/get``.
+                           ``"block"``
+                              Both are decoded from the raw block, loaded
+                              with ``block/get``.
+
+                           The latter two halve the requests of traversals
+                           that need values and links.
+        :param cache_value: A function that takes a decoded value and returns
+                            whether it's kept in the cache of node values
+                            (optional). E.g. values that reference the
+                            response they were decoded from (see
+                            ``zero_copy`` of :py:class:`~ipfs.codec.Protobuf2`)
+                            would keep the whole response alive.
         """
+        if (fetch not in FETCH_MODES):
+            raise ValueError("Invalid fetch mode: {!r}".format(fetch))
         self.ipfs = ipfs
         self.codec = codec
+        self.timeout = timeout
+        self.disk_cache = disk_cache
+        self.fetch = fetch
+        self.cache_value = cache_value
+        self._node_cache = LruCache(cache_size) if (cache_size) else None
+        self._nodes = WeakValueDictionary()
+        self._nodes_lock = Lock()
+
+
+    def _cached(self, kind, hash):
+        """ Return a cached value or links of a node, or ``None``. """
+        if (self._node_cache == None):
+            return None
+        return self._node_cache.get((kind, hash))
+
+
+    def _cache(self, kind, hash, value, size):
+        if (self._node_cache != None):
+            self._node_cache.put((kind, hash), value, size + _ENTRY_OVERHEAD)
+
+
+    def _load_data(self, hash):
+        """ Return the encoded data of a node from the disk cache or the daemon. """
+        key = "value:" + hash
+        if (self.disk_cache != None):
+            data = self.disk_cache.get(key)
+            if (data != None):
+                return data
+        with deadline(self.timeout):
+            data = self.ipfs.object.data(hash).read()
+        if (self.disk_cache != None):
+            self.disk_cache.put(key, data)
+        return data
+
+
+    def _load_links(self, hash):
+        """
+        Return the links of a node as ``(name, hash, size)`` from the disk
+        cache or the daemon.
+        """
+        key = "links:" + hash
+        if (self.disk_cache != None):
+            data = self.disk_cache.get(key)
+            if (data != None):
+                return cbor.loads(data)
+        with deadline(self.timeout):
+            links = [(l["Name"], l["Hash"], l["Size"]) for l in self.ipfs.object.links(hash)["Links"]]
+        if (self.disk_cache != None):
+            self.disk_cache.put(key, cbor.dumps(links))
+        return links
+
+
+    def _load_node(self, hash):
+        """
+        Return the encoded data and the links of a node, see
+        :py:meth:`_load_data` and :py:meth:`_load_links`, with one request.
+        """
+        if (self.disk_cache != None):
+            data = self.disk_cache.get("value:" + hash)
+            links = self.disk_cache.get("links:" + hash)
+            if (data != None and links != None):
+                return data, cbor.loads(links)
+        with deadline(self.timeout):
+            if (self.fetch == "block"):
+                node = PBNode.loads(self.ipfs.block.get(hash).read())
+            else:
+                node = self.ipfs.object.get(hash)
+        data = node.get("Data") or b""
+        links = [(l.get("Name", ""), l["Hash"], l.get("Size", 0)) for l in node.get("Links") or ()]
+        if (self.disk_cache != None):
+            self.disk_cache.put("value:" + hash, data)
+            self.disk_cache.put("links:" + hash, cbor.dumps(links))
+        return data, links
+
+
+    def cache_stats(self):
+        """
+        Return statistics about the cache of node values and links.
+
+        :return: A :py:class:`~ipfs.cache.CacheStats` instance
+        """
+        if (self._node_cache == None):
+            return CacheStats()
+        return self._node_cache.stats()
 
 
     def get(self, ref):
@@ -431,11 +612,136 @@ class Merkledag:
         """
         
         if (ref.startswith("/ipns/") or ref.startswith("/ipfs")):
-            hash = self.ipfs.resolve(ref)["Path"][6:]
+            with deadline(self.timeout):
+                hash = self.ipfs.resolve(ref)["Path"][6:]
         else:
             hash = ref
 
-        return Node(self, hash)
+        with self._nodes_lock:
+            node = self._nodes.get(hash)
+            if (node == None):
+                node = self._nodes[hash] = Node(self, hash)
+        return node
+
+
+    def walk(self, root, max_depth = None, predicate = None, order = "bfs", workers = 8, values = False,
+             unique = True):
+        """
+        Visit all nodes reachable from a node, while loading up to
+        ``workers`` nodes ahead in a thread pool::
+
+           >>> for depth, link, node in dag.walk(root, order = "dfs"):
+                   if (link != None):
+                       print("  " * depth + link.name, "->", node.hash)
+
+        The nodes are yielded in breadth-first or depth-first (pre-)order,
+        as they're loaded. Only the nodes that are loaded ahead and the
+        links that haven't been followed yet are kept in memory.
+
+        :param root:      The node, or a reference to it (see :py:meth:`get`)
+        :param max_depth: The maximum depth of the yielded nodes (optional).
+                          The root has depth 0.
+        :param predicate: A function that takes a :py:class:`Link` and
+                          returns whether to follow it (optional), e.g.
+                          ``lambda link: link.name != "parent"``
+        :param order:     ``"bfs"`` for breadth-first or ``"dfs"`` for
+                          depth-first order
+        :param workers:   The number of threads that load nodes
+        :param values:    Whether the values are loaded with the links
+        :param unique:    Whether nodes that were already visited are
+                          skipped. The hashes of all visited nodes are kept
+                          in memory for this.
+        :return:          A generator of ``(depth, link, node)``, where
+                          ``link`` is the link that was followed to the
+                          node, or ``None`` for the root
+        """
+
+        if (order not in ("bfs", "dfs")):
+            raise ValueError("Invalid order: {!r}".format(order))
+        if (not isinstance(root, Node)):
+            root = self.get(root)
+        bfs = (order == "bfs")
+        visited = {root.hash} if (unique) else None
+
+        def load(node, depth):
+            # the links of nodes at the maximum depth aren't followed
+            if (max_depth == None or depth < max_depth):
+                node.links
+            if (values):
+                node.value
+
+        # entries are [depth, link, node, future], taken from the left end
+        # for breadth-first order and the right end for depth-first order
+        pending = deque([[0, None, root, None]])
+        # the number of entries that are loaded, but not yielded yet
+        ahead = 0
+        pool = ThreadPoolExecutor(workers, thread_name_prefix = "ipfs-walk")
+        try:
+            while (pending):
+                for entry in islice(pending if (bfs) else reversed(pending), workers):
+                    if (ahead >= 2 * workers):
+                        break
+                    if (entry[3] == None):
+                        entry[3] = pool.submit(load, entry[2], entry[0])
+                        ahead += 1
+                depth, link, node, future = pending.popleft() if (bfs) else pending.pop()
+                if (future == None):
+                    # loaded ahead too much in depth-first order
+                    future = pool.submit(load, node, depth)
+                    ahead += 1
+                future.result()
+                ahead -= 1
+                yield depth, link, node
+
+                if (max_depth != None and depth >= max_depth):
+                    continue
+                children = []
+                for l in node.links:
+                    if (predicate != None and not predicate(l)):
+                        continue
+                    if (visited != None):
+                        if (l.hash in visited):
+                            continue
+                        visited.add(l.hash)
+                    children.append([depth + 1, l, self.get(l.hash), None])
+                if (bfs):
+                    pending.extend(children)
+                else:
+                    pending.extend(reversed(children))
+        finally:
+            for entry in pending:
+                if (entry[3] != None):
+                    entry[3].cancel()
+            pool.shutdown(wait = False)
+
+
+    def edges(self, root, max_depth = None, unique = None):
+        """
+        Enumerate the links of a node and of all nodes it links recursively
+        with one streaming request (see
+        :py:meth:`~ipfs.api.refs.RefsApi.edges`), instead of one request per
+        node::
+
+           >>> reachable = {link.hash for parent, link in dag.edges(root)}
+
+        The daemon doesn't report the sizes of the links, so they're 0. The
+        nodes aren't loaded, so the caches aren't used either.
+
+        :param root:      The node, or a reference to it (see :py:meth:`get`)
+        :param max_depth: The maximum depth of the links (optional). The links
+                          of the root have depth 1.
+        :param unique:    Whether only the first link to a node is yielded,
+                          and the links of that node only once (default:
+                          false)
+        :return:          An iterator over ``(parent, link)``, where
+                          ``parent`` is the hash of the linking node, in
+                          depth-first order
+        """
+
+        if (not isinstance(root, Node)):
+            root = self.get(root)
+        for src, dst, name in self.ipfs.refs.edges(root.hash, max_depth = max_depth, unique = unique):
+            yield src, Link(self, name, dst, 0)
 
 
     def __getitem__(self, hash):
@@ -448,6 +754,7 @@ class Merkledag:
 
 
 __all__ = [
+    "FETCH_MODES",
     "Link",
     "Node",
     "NodeBuilder",
@@ -1,4 +1,4 @@
 """
 This module contains the protobuf2 protocols used by IPFS.
 """
-__all__ = ["merkledag", "unixfs"]
+__all__ = ["merkledag", "unixfs", "fast", "lazy"]
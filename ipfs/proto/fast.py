@@ -0,0 +1,392 @@
+"""
+This module implements specialized decoders and encoders for the fixed
+protobuf2 schemas used by IPFS, i.e. ``PBNode``/``PBLink`` from
+:py:mod:`ipfs.proto.merkledag` and ``Data`` from :py:mod:`ipfs.proto.unixfs`.
+
+They produce the same objects as the generic pb2nano reader and writer, but
+work on the whole message at once instead of dispatching every field through
+the protocol description. :py:func:`ipfs.codec.PB2` returns them for these
+messages.
+
+Links are decoded to :py:class:`PBLinkView` objects, which behave like
+read-only dicts. Their ``Hash`` is only base58-encoded when it's accessed,
+and encoding an unchanged link doesn't decode it again.
+
+In zero-copy mode the ``Data`` fields are returned as :py:class:`memoryview`
+slices of the decoded buffer instead of copies. The slices keep the whole
+buffer alive, so only use this mode if the decoded objects are short-lived.
+"""
+
+from collections.abc import Mapping
+
+from base58 import b58decode
+from pb2nano.error import Pb2ReaderException, Pb2WriterException
+
+from .merkledag import PBNode, b58encode_str
+from .unixfs import Data, DataType
+
+
+def read_varint(buf, i):
+    """
+    Decode a varint.
+
+    :param buf: The buffer
+    :param i:   The offset of the varint in the buffer
+    :return:    The value and the offset after the varint
+    """
+
+    b = buf[i]
+    if (b < 0x80):
+        return b, i + 1
+    x = b & 0x7F
+    shift = 7
+    while (True):
+        i += 1
+        b = buf[i]
+        x |= (b & 0x7F) << shift
+        if (b < 0x80):
+            return x, i + 1
+        shift += 7
+
+
+def write_varint(out, x):
+    """ Append a varint to a bytearray. """
+    while (x >= 0x80):
+        out.append(0x80 | (x & 0x7F))
+        x >>= 7
+    out.append(x)
+
+
+def _skip(buf, i, wire_type):
+    """ Return the offset after a value of an unknown field. """
+    if (wire_type == 0):
+        return read_varint(buf, i)[1]
+    elif (wire_type == 1):
+        return i + 8
+    elif (wire_type == 2):
+        n, i = read_varint(buf, i)
+        return i + n
+    elif (wire_type == 5):
+        return i + 4
+    raise Pb2ReaderException("Unsupported wire type {:d}".format(wire_type))
+
+
+def _read_bytes(buf, i, end):
+    n, i = read_varint(buf, i)
+    j = i + n
+    if (j > end):
+        raise Pb2ReaderException("Truncated message")
+    return i, j
+
+
+
+class PBLinkView(Mapping):
+    """
+    A decoded ``PBLink``. It's a read-only mapping with the same items as the
+    dict the generic reader would return. Use ``dict(link)`` to get a
+    mutable copy.
+
+    .. py:attribute:: raw_hash
+
+       The binary multihash of the linked node, or ``None``
+
+    """
+
+    __slots__ = ("raw_hash", "_hash", "_name", "_size", "_keys")
+
+    def __init__(self, raw_hash, name, size, keys):
+        self.raw_hash = raw_hash
+        self._hash = None
+        self._name = name
+        self._size = size
+        self._keys = keys
+
+
+    def __getitem__(self, key):
+        if (key in self._keys):
+            if (key == "Hash"):
+                h = self._hash
+                if (h == None):
+                    h = self._hash = b58encode_str(self.raw_hash)
+                return h
+            elif (key == "Name"):
+                return self._name
+            return self._size
+        raise KeyError(key)
+
+
+    def __contains__(self, key):
+        return key in self._keys
+
+
+    def __iter__(self):
+        return iter(self._keys)
+
+
+    def __len__(self):
+        return len(self._keys)
+
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+
+def decode_pblink(buf, i = 0, end = None):
+    """
+    Decode a ``PBLink``.
+
+    :param buf: The buffer
+    :param i:   The offset of the message in the buffer
+    :param end: The offset after the message (default: end of buffer)
+    :return:    A :py:class:`PBLinkView`
+    """
+
+    if (end == None):
+        end = len(buf)
+    raw_hash = None
+    name = None
+    size = None
+    keys = []
+    try:
+        while (i < end):
+            key, i = read_varint(buf, i)
+            field = key >> 3
+            wire_type = key & 7
+            if (field == 1 and wire_type == 2):
+                start, i = _read_bytes(buf, i, end)
+                raw_hash = bytes(buf[start:i])
+                field_name = "Hash"
+            elif (field == 2 and wire_type == 2):
+                start, i = _read_bytes(buf, i, end)
+                name = bytes(buf[start:i]).decode()
+                field_name = "Name"
+            elif (field == 3 and wire_type == 0):
+                size, i = read_varint(buf, i)
+                field_name = "Size"
+            else:
+                i = _skip(buf, i, wire_type)
+                continue
+            if (field_name not in keys):
+                keys.append(field_name)
+    except IndexError:
+        raise Pb2ReaderException("Truncated message") from None
+    if (i > end):
+        raise Pb2ReaderException("Truncated message")
+    return PBLinkView(raw_hash, name, size, tuple(keys))
+
+
+def decode_pbnode(buf, zero_copy = False):
+    """
+    Decode a ``PBNode``.
+
+    :param buf:       A bytes-like object
+    :param zero_copy: Whether ``Data`` is returned as :py:class:`memoryview`
+                      of ``buf`` instead of bytes
+    :return:          A dict that may contain ``Data`` and ``Links``, like the
+                      one returned by the generic reader
+    """
+
+    if (zero_copy and not isinstance(buf, memoryview)):
+        buf = memoryview(buf)
+    node = {}
+    links = None
+    i = 0
+    end = len(buf)
+    try:
+        while (i < end):
+            key, i = read_varint(buf, i)
+            field = key >> 3
+            wire_type = key & 7
+            if (wire_type == 2 and (field == 1 or field == 2)):
+                start, i = _read_bytes(buf, i, end)
+                if (field == 2):
+                    if (links == None):
+                        links = node["Links"] = []
+                    links.append(decode_pblink(buf, start, i))
+                elif (zero_copy):
+                    node["Data"] = buf[start:i]
+                else:
+                    node["Data"] = bytes(buf[start:i])
+            else:
+                i = _skip(buf, i, wire_type)
+    except IndexError:
+        raise Pb2ReaderException("Truncated message") from None
+    if (i > end):
+        raise Pb2ReaderException("Truncated message")
+    return node
+
+
+def _encode_pblink(link):
+    if (isinstance(link, PBLinkView)):
+        raw = link.raw_hash
+        items = ((k, raw if (k == "Hash") else link[k]) for k in link._keys)
+    else:
+        items = ((k, b58decode(v) if (k == "Hash") else v) for k, v in link.items())
+
+    out = bytearray()
+    for k, v in items:
+        if (k == "Hash"):
+            out.append(0x0A)
+            write_varint(out, len(v))
+            out += v
+        elif (k == "Name"):
+            v = v.encode()
+            out.append(0x12)
+            write_varint(out, len(v))
+            out += v
+        elif (k == "Size"):
+            out.append(0x18)
+            write_varint(out, v)
+        else:
+            raise Pb2WriterException("Unknown field name {}".format(k))
+    return out
+
+
+def encode_pbnode(node):
+    """
+    Encode a ``PBNode``. The fields are written in the order of the dict,
+    like the generic writer does, so both produce the same bytes.
+
+    :param node: A dict that may contain ``Data`` and ``Links``
+    :return:     The encoded node as bytes
+    """
+
+    out = bytearray()
+    for k, v in node.items():
+        if (k == "Links"):
+            for link in v:
+                data = _encode_pblink(link)
+                out.append(0x12)
+                write_varint(out, len(data))
+                out += data
+        elif (k == "Data"):
+            out.append(0x0A)
+            write_varint(out, len(v))
+            out += v
+        else:
+            raise Pb2WriterException("Unknown field name {}".format(k))
+    return bytes(out)
+
+
+_DATA_TYPES = DataType.defs_by_number
+_DATA_TYPE_NUMBERS = DataType.defs_by_name
+
+
+def decode_unixfs_data(buf, zero_copy = False):
+    """
+    Decode a unixfs ``Data`` message.
+
+    :param buf:       A bytes-like object
+    :param zero_copy: Whether ``Data`` is returned as :py:class:`memoryview`
+                      of ``buf`` instead of bytes
+    :return:          A dict with ``Type`` and optionally ``Data``,
+                      ``filesize`` and ``blocksize``, like the one returned by
+                      the generic reader
+    """
+
+    if (zero_copy and not isinstance(buf, memoryview)):
+        buf = memoryview(buf)
+    obj = {}
+    blocksize = None
+    i = 0
+    end = len(buf)
+    try:
+        while (i < end):
+            key, i = read_varint(buf, i)
+            field = key >> 3
+            wire_type = key & 7
+            if (field == 2 and wire_type == 2):
+                start, i = _read_bytes(buf, i, end)
+                obj["Data"] = buf[start:i] if (zero_copy) else bytes(buf[start:i])
+            elif (field == 4 and wire_type == 0):
+                if (blocksize == None):
+                    blocksize = obj["blocksize"] = []
+                x, i = read_varint(buf, i)
+                blocksize.append(x)
+            elif (field == 4 and wire_type == 2):
+                # packed encoding
+                if (blocksize == None):
+                    blocksize = obj["blocksize"] = []
+                start, i = _read_bytes(buf, i, end)
+                while (start < i):
+                    x, start = read_varint(buf, start)
+                    blocksize.append(x)
+            elif (field == 3 and wire_type == 0):
+                obj["filesize"], i = read_varint(buf, i)
+            elif (field == 1 and wire_type == 0):
+                x, i = read_varint(buf, i)
+                try:
+                    obj["Type"] = _DATA_TYPES[x]
+                except KeyError:
+                    raise Pb2ReaderException("Value {:d} doesn't match any enum value in DataType".format(x))
+            else:
+                i = _skip(buf, i, wire_type)
+    except IndexError:
+        raise Pb2ReaderException("Truncated message") from None
+    if (i > end):
+        raise Pb2ReaderException("Truncated message")
+    if ("Type" not in obj):
+        raise Pb2ReaderException("Required field Type not present in Data")
+    return obj
+
+
+def encode_unixfs_data(obj):
+    """
+    Encode a unixfs ``Data`` message. See :py:func:`encode_pbnode`.
+
+    :param obj: A dict with ``Type`` and optionally ``Data``, ``filesize``
+                and ``blocksize``
+    :return:    The encoded message as bytes
+    """
+
+    if ("Type" not in obj):
+        raise Pb2WriterException("Required field Type not found")
+    out = bytearray()
+    for k, v in obj.items():
+        if (k == "Data"):
+            out.append(0x12)
+            write_varint(out, len(v))
+            out += v
+        elif (k == "Type"):
+            try:
+                x = _DATA_TYPE_NUMBERS[v]
+            except KeyError:
+                raise Pb2WriterException("{} doesn't match any enum constant in DataType".format(v))
+            out.append(0x08)
+            write_varint(out, x)
+        elif (k == "filesize"):
+            out.append(0x18)
+            write_varint(out, v)
+        elif (k == "blocksize"):
+            for x in v:
+                out.append(0x20)
+                write_varint(out, x)
+        else:
+            raise Pb2WriterException("Unknown field name {}".format(k))
+    return bytes(out)
+
+
+FAST_CODECS = {
+    PBNode: (decode_pbnode, encode_pbnode),
+    Data: (decode_unixfs_data, encode_unixfs_data)
+}
+""" Maps protobuf messages to their specialized decoder and encoder. """
+
+
+
+__all__ = [
+    "read_varint",
+    "write_varint",
+    "PBLinkView",
+    "decode_pblink",
+    "decode_pbnode",
+    "encode_pbnode",
+    "decode_unixfs_data",
+    "encode_unixfs_data",
+    "FAST_CODECS"
+]
@@ -0,0 +1,284 @@
+"""
+This module implements lazily decoded protobuf2 messages.
+
+A :py:class:`LazyMessage` only locates its fields by scanning their tags.
+A field is decoded when it's accessed for the first time, so large fields
+that aren't needed (e.g. the ``Data`` of a unixfs block, when only its
+``blocksize`` is read) are never decoded or copied::
+
+   >>> value = codec.PB2(UnixFsProtocol, "Data", lazy = True).loads(data)
+   >>> value["filesize"]
+   1048576
+
+Lazy messages are read-only mappings with the same items as the dicts
+returned by the generic reader. Nested messages are lazy messages too.
+"""
+
+from collections.abc import Mapping
+from struct import Struct
+
+from pb2nano.error import Pb2ReaderException
+
+from .fast import read_varint
+
+
+_UINT_TYPES = frozenset(["uint32", "uint64"])
+_INT_TYPES = frozenset(["int32", "int64"])
+_SINT_TYPES = frozenset(["sint32", "sint64"])
+_FIXED_TYPES = {
+    "fixed32": Struct("<I"),
+    "fixed64": Struct("<Q"),
+    "sfixed32": Struct("<i"),
+    "sfixed64": Struct("<q"),
+    "float": Struct("<f"),
+    "double": Struct("<d")
+}
+
+SCALAR_TYPES = _UINT_TYPES | _INT_TYPES | _SINT_TYPES | frozenset(_FIXED_TYPES) | frozenset(["bool", "string", "bytes"])
+""" The scalar field types supported by :py:class:`LazyMessage`. """
+
+
+def _signed(x):
+    """ Interpret a varint as two's complement 64 bit integer. """
+    return x - (1 << 64) if (x >> 63) else x
+
+
+def check_types(protocol, message):
+    """
+    Check that all fields of a message and of the messages nested in it have
+    types that :py:class:`LazyMessage` can decode.
+
+    :param protocol: The protocol that defines nested messages and enums
+    :param message:  The type of the message
+    :raise:          :py:exc:`ValueError` for a field of an unknown type
+    """
+
+    pending = [message]
+    seen = set()
+    while (pending):
+        message = pending.pop()
+        if (message.name in seen):
+            continue
+        seen.add(message.name)
+        for field in message.fields_by_name.values():
+            t = field.type
+            if (t in SCALAR_TYPES or t in protocol.enums):
+                continue
+            nested = protocol.messages.get(t)
+            if (nested == None):
+                raise ValueError("Unsupported type {} of field {}.{}".format(t, message.name, field.name))
+            pending.append(nested)
+
+
+class LazyMessage(Mapping):
+    """
+    A protobuf2 message that is decoded on access.
+
+    .. py:attribute:: message
+
+       The :py:class:`pb2nano.protocol.Pb2Message` of this message
+
+    """
+
+    __slots__ = ("message", "_protocol", "_buf", "_zero_copy", "_index", "_values")
+
+    def __init__(self, buf, protocol, message, zero_copy = False):
+        """
+        :param buf:       The encoded message as bytes-like object
+        :param protocol:  The protocol that defines nested messages and enums
+        :param message:   The type of the message
+        :param zero_copy: Whether ``bytes`` fields are returned as
+                          :py:class:`memoryview` of ``buf`` instead of copies
+        """
+
+        self.message = message
+        self._protocol = protocol
+        self._buf = buf if (isinstance(buf, memoryview)) else memoryview(buf)
+        self._zero_copy = zero_copy
+        self._index = None
+        self._values = {}
+
+
+    @property
+    def buffer(self):
+        """ The encoded message as :py:class:`memoryview`. """
+        return self._buf
+
+
+    def scan(self):
+        """
+        Locate all fields and check that required fields are present. This is
+        done on first access, but can be called to detect malformed messages
+        early.
+
+        :return: The message itself
+        """
+
+        if (self._index != None):
+            return self
+        buf = self._buf
+        fields = self.message.fields_by_number
+        index = {}
+        # repeated fields usually come in runs, so remember the last one
+        last_key = None
+        entries = None
+        i = 0
+        end = len(buf)
+        try:
+            while (i < end):
+                key, i = read_varint(buf, i)
+                wire_type = key & 7
+                # varints are stored as int, everything else as
+                # (wire type, start, end)
+                if (wire_type == 0):
+                    entry, i = read_varint(buf, i)
+                elif (wire_type == 2):
+                    n, start = read_varint(buf, i)
+                    i = start + n
+                    entry = (2, start, i)
+                elif (wire_type == 1 or wire_type == 5):
+                    start = i
+                    i += 8 if (wire_type == 1) else 4
+                    entry = (wire_type, start, i)
+                else:
+                    raise Pb2ReaderException("Unsupported wire type {:d}".format(wire_type))
+                if (key != last_key):
+                    last_key = key
+                    field = fields.get(key >> 3)
+                    if (field == None):
+                        entries = None
+                    else:
+                        entries = index.get(field.name)
+                        if (entries == None):
+                            index[field.name] = entries = []
+                if (entries != None):
+                    entries.append(entry)
+        except IndexError:
+            raise Pb2ReaderException("Truncated message") from None
+        if (i > end):
+            raise Pb2ReaderException("Truncated message")
+
+        for field in self.message.fields_by_name.values():
+            if (field.label == "required" and field.name not in index):
+                raise Pb2ReaderException("Required field {} not present in {}".format(field.name, self.message.name))
+
+        self._index = index
+        return self
+
+
+    def _decode(self, field, entry):
+        if (type(entry) == int):
+            a = entry
+        else:
+            wire_type, a, b = entry
+        t = field.type
+        if (t in _UINT_TYPES):
+            val = a
+        elif (t == "bytes"):
+            val = self._buf[a:b] if (self._zero_copy) else bytes(self._buf[a:b])
+        elif (t == "string"):
+            val = str(self._buf[a:b], "utf-8")
+        elif (t == "bool"):
+            val = bool(a)
+        elif (t in _INT_TYPES):
+            val = _signed(a)
+        elif (t in _SINT_TYPES):
+            val = (a >> 1) ^ -(a & 1)
+        elif (t in _FIXED_TYPES):
+            fixed = _FIXED_TYPES[t]
+            if (type(entry) == int or b - a != fixed.size):
+                raise Pb2ReaderException("Wire type doesn't match type {} of field {}".format(t, field.name))
+            val = fixed.unpack_from(self._buf, a)[0]
+        else:
+            message = self._protocol.messages.get(t)
+            if (message != None):
+                val = LazyMessage(self._buf[a:b], self._protocol, message, self._zero_copy)
+            else:
+                enum = self._protocol.enums.get(t)
+                if (enum == None):
+                    raise Pb2ReaderException("Unknown field type {}".format(t))
+                try:
+                    # enum values are int32
+                    val = enum.defs_by_number[_signed(a)]
+                except KeyError:
+                    raise Pb2ReaderException("Value {:d} doesn't match any enum value in {}".format(a, enum.name))
+        if (field.filter):
+            val = field.filter[0](val)
+        return val
+
+
+    def _decode_packed(self, field, entry):
+        """ Decode a packed repeated field of numbers. """
+        wire_type, i, end = entry
+        fixed = _FIXED_TYPES.get(field.type)
+        if (fixed != None):
+            if ((end - i) % fixed.size):
+                raise Pb2ReaderException("Truncated packed field {}".format(field.name))
+            values = [x for x, in fixed.iter_unpack(self._buf[i:end])]
+            return [field.filter[0](x) for x in values] if (field.filter) else values
+        values = []
+        while (i < end):
+            x, i = read_varint(self._buf, i)
+            values.append(self._decode(field, x))
+        return values
+
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        if (self._index == None):
+            self.scan()
+        entries = self._index[name]
+        field = self.message.fields_by_name[name]
+        if (field.label == "repeated"):
+            if (field.type in _UINT_TYPES and not field.filter and all(type(e) == int for e in entries)):
+                val = list(entries)
+                self._values[name] = val
+                return val
+            packable = field.type not in ("bytes", "string") and field.type not in self._protocol.messages
+            val = []
+            for entry in entries:
+                if (packable and type(entry) != int and entry[0] == 2):
+                    val.extend(self._decode_packed(field, entry))
+                else:
+                    val.append(self._decode(field, entry))
+        else:
+            val = self._decode(field, entries[-1])
+        self._values[name] = val
+        return val
+
+
+    def __contains__(self, name):
+        if (self._index == None):
+            self.scan()
+        return name in self._index
+
+
+    def __iter__(self):
+        if (self._index == None):
+            self.scan()
+        return iter(self._index)
+
+
+    def __len__(self):
+        if (self._index == None):
+            self.scan()
+        return len(self._index)
+
+
+    def __repr__(self):
+        return "LazyMessage({}, {!r})".format(self.message.name, dict(self))
+
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+
+__all__ = [
+    "SCALAR_TYPES",
+    "check_types",
+    "LazyMessage"
+]
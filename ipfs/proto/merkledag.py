@@ -2,8 +2,14 @@ from pb2nano.protocol import Pb2Message, Pb2Protocol
 from base58 import b58encode, b58decode
 
 
+def b58encode_str(data):
+    """ Return the base58 encoding of data as str. Newer versions of base58 return bytes. """
+    encoded = b58encode(data)
+    return encoded.decode("ascii") if (isinstance(encoded, bytes)) else encoded
+
+
 PBLink = Pb2Message("PBLink")\
-         .field("optional", "bytes", "Hash", 1, (b58encode, b58decode))\
+         .field("optional", "bytes", "Hash", 1, (b58encode_str, b58decode))\
          .field("optional", "string", "Name", 2)\
          .field("optional", "uint64", "Size", 3)
 
@@ -18,6 +18,7 @@ Example::
 
 from .proto.unixfs import UnixFsProtocol
 from .merkledag import Merkledag
+from .api.deadline import deadline
 from . import codec
 import io
 from bintrees import FastAVLTree
@@ -190,9 +191,15 @@ class FileStream(io.RawIOBase):
     use it as any other file opened by :py:func:`open`.
     """
     
-    def __init__(self, file, mode):
+    def __init__(self, file, mode, timeout = None):
+        """
+        :param file:    The :py:class:`File` to read from
+        :param mode:    The parsed mode
+        :param timeout: The timeout in seconds for every read (optional)
+        """
         self._file = file
         self._mode = mode
+        self._timeout = timeout
         
         self._readable = mode.reading
         self._writable = mode.writing
@@ -228,7 +235,8 @@ class FileStream(io.RawIOBase):
     def readinto(self, buf):
         if (not self._mode.reading):
             raise io.UnsupportedOperation("File not opened for reading")
-        n = self._file._readinto(buf, self._pos, len(buf))
+        with deadline(self._timeout):
+            n = self._file._readinto(buf, self._pos, len(buf))
         self._pos += n
         return n
 
@@ -341,8 +349,10 @@ class File(Inode):
     def _readinto(self, buf, offset, length):
         buf_offset = 0
         for chunk_offset, chunk_size, block in self._block_index.get_chunks(offset, length):
-            buf[buf_offset : buf_offset + chunk_size] =\
-                block._node.value["Data"][chunk_offset : chunk_offset + chunk_size]
+            # the data is a memoryview into the response (see UnixFs), so
+            # this is the only copy of the block
+            data = block._node.value["Data"]
+            buf[buf_offset : buf_offset + chunk_size] = data[chunk_offset : chunk_offset + chunk_size]
             buf_offset += chunk_size
             block._node.flush()
         return buf_offset
@@ -364,17 +374,18 @@ class File(Inode):
                 
 
 
-    def open(self, mode = "r"):
+    def open(self, mode = "r", timeout = None):
         """
         Open the file.
 
-        :param mode: The mode to open the file in. See :py:func:`io.open` for
-                     documentation.
+        :param mode:    The mode to open the file in. See :py:func:`io.open` for
+                        documentation.
+        :param timeout: The timeout in seconds for every read (optional)
         """
         
         mode = ModeParser(mode)
         mode.parse()
-        f = FileStream(self, mode)
+        f = FileStream(self, mode, timeout)
         #f = io.BufferedRandom(f)
         if (mode.text):
             f = io.TextIOWrapper(f)
@@ -484,25 +495,40 @@ class IpnsRoot:
         
 
 
+def _without_data(value):
+    """ Return whether a unixfs node has no data, e.g. a directory. """
+    return not value.get("Data")
+
+
+
 class UnixFs:
     """ The pivot class of the unixfs module. """
 
     def __init__(self, ipfs):
         self._ipfs = ipfs
-        self._dag = Merkledag(ipfs, codec = codec.PB2(UnixFsProtocol, "Data"))
+        # block data is only held until it's copied to the reader's buffer,
+        # so it can reference the response instead of being copied. Fields
+        # are decoded on access, so building a block index doesn't touch the
+        # data of the root block. Values with data are kept out of the shared
+        # cache, where the views would keep whole responses alive.
+        self._dag = Merkledag(ipfs, codec = codec.PB2(UnixFsProtocol, "Data", lazy = True, zero_copy = True),
+                              cache_value = _without_data)
 
 
-    def open(self, path, mode = "r"):
+    def open(self, path, mode = "r", timeout = None):
         """
         Open a unixfs file.
 
-        :param path: Name of the file. Either a plain base58 hash, an IPFS or
-                     IPNS name.
-        :param mode: The mode to open the file in. See :py:func:`io.open` for
-                     documentation. Defaults to "r", which opens the file for
-                     reading in text mode.
+        :param path:    Name of the file. Either a plain base58 hash, an IPFS
+                        or IPNS name.
+        :param mode:    The mode to open the file in. See :py:func:`io.open`
+                        for documentation. Defaults to "r", which opens the
+                        file for reading in text mode.
+        :param timeout: The timeout in seconds for opening the file and for
+                        every read (optional)
         """
-        return self.file(path).open(mode)
+        with deadline(timeout):
+            return self.file(path).open(mode, timeout)
 
 
     def file(self, path):
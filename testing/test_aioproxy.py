@@ -0,0 +1,120 @@
+# coding=utf-8
+import asyncio
+import unittest
+
+from ipfs.api.aioproxy import AsyncHttpProxy
+from ipfs.api.proxy import ProxyError
+
+
+class ScriptedServer:
+    """ An HTTP server that answers every request with the next scripted response. """
+
+    def __init__(self, responses, close_after = False):
+        self.responses = list(responses)
+        self.close_after = close_after
+        self.connections = 0
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while (True):
+            line = await reader.readline()
+            if (not line):
+                break
+            self.requests.append(line.decode().split()[1])
+            while ((await reader.readline()) not in (b"\r\n", b"")):
+                pass
+            response = self.responses.pop(0)
+            writer.write(response)
+            await writer.drain()
+            if (self.close_after or b"Connection: close" in response):
+                # close the connection, with close_after without telling the client
+                break
+        writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def chunked(*chunks, trailers = b""):
+    return b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + b"".join(chunks) + b"0\r\n" + trailers + b"\r\n"
+
+
+class TestAsyncHttpProxy(unittest.TestCase):
+
+    def run_calls(self, responses, calls, close_after = False):
+        async def run():
+            async with ScriptedServer(responses, close_after) as server:
+                proxy = AsyncHttpProxy("127.0.0.1", server.port)
+                results = [await call(proxy) for call in calls]
+                await proxy.close()
+                return server, results
+        return asyncio.run(run())
+
+    @staticmethod
+    async def read(proxy):
+        stream = await proxy.root.version()
+        return await stream.read()
+
+    def test_chunked_with_extensions_and_trailers(self):
+        body = chunked(b"5;name=value\r\nhello\r\n", b"6 ; ext\r\n world\r\n",
+                       trailers = b"X-Checksum: abc\r\nX-Other: 1\r\n")
+        server, results = self.run_calls([body, chunked(b"3\r\nfoo\r\n")], [self.read, self.read])
+        self.assertEqual(results, [b"hello world", b"foo"])
+        # the trailers were consumed, so the connection was reused
+        self.assertEqual(server.connections, 1)
+
+    def test_lines_across_chunks(self):
+        async def lines(proxy):
+            return [line async for line in await proxy.root.version()]
+        body = chunked(b"4\r\n{\"a\"\r\n", b"5\r\n:1}\n{\r\n", b"6\r\n\"b\":2}\r\n")
+        server, results = self.run_calls([body], [lines])
+        self.assertEqual(results[0], [b"{\"a\":1}\n", b"{\"b\":2}"])
+
+    def test_content_length_and_eof(self):
+        responses = [b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nfoo",
+                     b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\nuntil eof"]
+        server, results = self.run_calls(responses, [self.read, self.read])
+        self.assertEqual(results, [b"foo", b"until eof"])
+        self.assertEqual(server.connections, 1)
+
+    def test_stale_connection_is_replaced(self):
+        responses = [b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nfoo"] * 3
+        async def later(proxy):
+            # give the server time to close the idle connection
+            await asyncio.sleep(0.05)
+            return await self.read(proxy)
+        server, results = self.run_calls(responses, [self.read, later, later], close_after = True)
+        self.assertEqual(results, [b"foo"] * 3)
+        self.assertEqual(server.connections, 3)
+
+    def test_error_status(self):
+        responses = [b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 4\r\n\r\noops",
+                     b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"]
+        async def fail(proxy):
+            with self.assertRaises(ProxyError) as cm:
+                await proxy.root.version()
+            return str(cm.exception)
+        server, results = self.run_calls(responses, [fail, self.read])
+        self.assertEqual(results, ["oops", b"ok"])
+        self.assertEqual(server.connections, 1)
+
+    def test_truncated_chunk(self):
+        async def truncated(proxy):
+            stream = await proxy.root.version()
+            with self.assertRaises(ProxyError):
+                await stream.read()
+            return True
+        body = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n10\r\nshort"
+        server, results = self.run_calls([body], [truncated], close_after = True)
+        self.assertEqual(results, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
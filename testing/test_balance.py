@@ -0,0 +1,142 @@
+# coding=utf-8
+import socket
+import unittest
+
+from ipfs.api import IpfsApi, MultiHttpProxy
+from ipfs.api.balance import HashRing, affinity_key
+from ipfs.api.proxy import ProxyError
+from ipfs.fakedaemon import FakeDaemon, MemoryBlockstore
+
+
+def unused_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_distribution(self):
+        ring = HashRing(["a", "b", "c"])
+        counts = {"a": 0, "b": 0, "c": 0}
+        for i in range(3000):
+            counts[ring.lookup(str(i))] += 1
+        self.assertTrue(all(n > 600 for n in counts.values()), counts)
+
+    def test_removing_a_member_only_moves_its_keys(self):
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b"])
+        for i in range(1000):
+            if (before.lookup(str(i)) != "c"):
+                self.assertEqual(before.lookup(str(i)), after.lookup(str(i)))
+
+    def test_preference(self):
+        ring = HashRing(["a", "b", "c"])
+        order = ring.preference("key")
+        self.assertEqual(sorted(order), ["a", "b", "c"])
+        self.assertEqual(order[0], ring.lookup("key"))
+
+
+class TestAffinityKey(unittest.TestCase):
+
+    def test_key(self):
+        self.assertEqual(affinity_key("/object/links", ("Qm1",)), "Qm1")
+        self.assertEqual(affinity_key("/object/data/Qm1", ()), "Qm1")
+        self.assertEqual(affinity_key("/cat", ("/ipfs/Qm1/a/b",)), "Qm1")
+        self.assertIsNone(affinity_key("/cat", ("/ipns/Qm1",)))
+        self.assertIsNone(affinity_key("/version", ()))
+        self.assertIsNone(affinity_key("/object/put", ()))
+
+
+class TestMultiHttpProxy(unittest.TestCase):
+
+    def test_affinity(self):
+        blocks = MemoryBlockstore()
+        with FakeDaemon(blockstore = blocks) as d1, FakeDaemon(blockstore = blocks) as d2:
+            proxy = MultiHttpProxy([(d1.host, d1.port), "{}:{:d}".format(d2.host, d2.port)])
+            ipfs = IpfsApi(proxy = proxy)
+            keys = [d1.put_node(str(i).encode()) for i in range(20)]
+            for i in range(3):
+                for key in keys:
+                    ipfs.object.links(key)
+            proxy.close()
+
+        # every key was always requested from the same daemon
+        counts = [d1.calls["object/links"], d2.calls["object/links"]]
+        self.assertEqual(sum(counts), 60)
+        self.assertTrue(all(n % 3 == 0 and n > 0 for n in counts), counts)
+
+    def test_failover(self):
+        with FakeDaemon() as daemon:
+            proxy = MultiHttpProxy([("127.0.0.1", unused_port()), (daemon.host, daemon.port)], cooldown = 60.0)
+            ipfs = IpfsApi(proxy = proxy)
+            for i in range(5):
+                self.assertIn("Version", ipfs.version())
+            key = daemon.put_node(b"Hello World")
+            self.assertEqual(ipfs.object.data(key).read(), b"Hello World")
+            proxy.close()
+
+        dead, alive = proxy.endpoint_stats()
+        self.assertFalse(dead.healthy)
+        self.assertEqual(dead.failures, 1)
+        self.assertTrue(alive.healthy)
+        self.assertEqual(alive.calls, 6)
+
+    def test_all_down(self):
+        proxy = MultiHttpProxy([("127.0.0.1", unused_port()), ("127.0.0.1", unused_port())])
+        with self.assertRaises(Exception):
+            IpfsApi(proxy = proxy).version()
+        self.assertFalse(any(s.healthy for s in proxy.endpoint_stats()))
+
+    def test_daemon_errors_are_not_retried(self):
+        with FakeDaemon() as d1, FakeDaemon() as d2:
+            proxy = MultiHttpProxy([(d1.host, d1.port), (d2.host, d2.port)])
+            with self.assertRaises(ProxyError):
+                IpfsApi(proxy = proxy).object.data("QmUnknown")
+            proxy.close()
+        self.assertEqual(d1.calls["object/data"] + d2.calls["object/data"], 1)
+        self.assertTrue(all(s.healthy for s in proxy.endpoint_stats()))
+
+    def test_streams_are_in_flight_until_read(self):
+        blocks = MemoryBlockstore()
+        with FakeDaemon(blockstore = blocks) as d1, FakeDaemon(blockstore = blocks) as d2:
+            proxy = MultiHttpProxy([(d1.host, d1.port), (d2.host, d2.port)])
+            ipfs = IpfsApi(proxy = proxy)
+            key = d1.add_bytes(b"x" * 1000000)
+
+            f = ipfs.file.cat(key)
+            self.assertEqual([s.in_flight for s in proxy.endpoint_stats()].count(1), 1)
+            busy = [s.in_flight for s in proxy.endpoint_stats()].index(1)
+            # other calls go to the daemon that isn't busy sending the stream
+            for i in range(4):
+                ipfs.version()
+            self.assertEqual([s.calls for s in proxy.endpoint_stats()][busy], 1)
+            f.read(1000)
+            self.assertEqual(proxy.endpoint_stats()[busy].in_flight, 1)
+            self.assertEqual(len(f.read()), 999000)
+            self.assertEqual([s.in_flight for s in proxy.endpoint_stats()], [0, 0])
+
+            # closing the stream early ends the call too
+            f = ipfs.file.cat(key)
+            f.read(1000)
+            f.close()
+            self.assertEqual([s.in_flight for s in proxy.endpoint_stats()], [0, 0])
+            f.close()
+            self.assertEqual([s.in_flight for s in proxy.endpoint_stats()], [0, 0])
+            proxy.close()
+
+    def test_failed_calls_are_not_in_flight(self):
+        with FakeDaemon() as daemon:
+            proxy = MultiHttpProxy([("127.0.0.1", unused_port()), (daemon.host, daemon.port)])
+            ipfs = IpfsApi(proxy = proxy)
+            ipfs.version()
+            with self.assertRaises(ProxyError):
+                ipfs.object.data("QmUnknown")
+            proxy.close()
+        self.assertEqual([s.in_flight for s in proxy.endpoint_stats()], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
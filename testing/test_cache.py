@@ -0,0 +1,43 @@
+# coding=utf-8
+import unittest
+
+from ipfs.cache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = LruCache(100)
+        self.assertEqual(cache.get("a"), None)
+        cache.put("a", 1, 10)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIn("a", cache)
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries, stats.size), (1, 1, 1, 10))
+        self.assertEqual(stats.hit_rate, 0.5)
+
+
+    def test_eviction_is_lru_by_size(self):
+        cache = LruCache(100)
+        for key in "abcd":
+            cache.put(key, key, 30)
+        self.assertNotIn("a", cache)
+        cache.get("b")
+        cache.put("e", "e", 30)
+        self.assertIn("b", cache)
+        self.assertNotIn("c", cache)
+        self.assertEqual(cache.stats().evictions, 2)
+        self.assertEqual(cache.stats().size, 90)
+
+
+    def test_replace_and_too_large(self):
+        cache = LruCache(100)
+        cache.put("a", 1, 60)
+        cache.put("a", 2, 50)
+        self.assertEqual((cache.get("a"), cache.stats().size), (2, 50))
+        cache.put("a", 3, 101)
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.stats().size, 0)
+        cache.put("b", 1, 10)
+        cache.clear()
+        self.assertEqual((len(cache), cache.stats().size), (0, 0))
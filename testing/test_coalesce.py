@@ -0,0 +1,149 @@
+# coding=utf-8
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Event, Thread
+
+from ipfs.api import IpfsApi, HttpProxy
+from ipfs.api.coalesce import SingleFlight, Coalescer
+from ipfs.api.deadline import DeadlineExceeded
+from ipfs.fakedaemon import FakeDaemon
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        started = Event()
+        release = Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        results = []
+        leader = Thread(target = lambda: results.append(flight.do("key", slow)))
+        leader.start()
+        started.wait()
+        followers = [Thread(target = lambda: results.append(flight.do("key", slow))) for i in range(3)]
+        for t in followers:
+            t.start()
+        while (flight.stats().merged < 3):
+            pass
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("result", False)] + [("result", True)] * 3)
+        stats = flight.stats()
+        self.assertEqual((stats.calls, stats.executed, stats.merged), (4, 1, 3))
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), (1, False))
+        self.assertEqual(flight.do("key", lambda: 2), (2, False))
+
+    def test_error_is_raised(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do("key", lambda: int("x"))
+        self.assertEqual(flight.in_flight(), 0)
+
+
+    def share(self, leader_f, follower_f):
+        """ Run a leader and a follower call and return their outcomes. """
+        flight = SingleFlight()
+        started = Event()
+        release = Event()
+
+        def leader():
+            started.set()
+            release.wait()
+            return leader_f()
+
+        outcomes = [None, None]
+        def run(i, f):
+            try:
+                outcomes[i] = flight.do("key", f, timeout = 5)
+            except BaseException as e:
+                outcomes[i] = e
+        threads = [Thread(target = run, args = (0, leader))]
+        threads[0].start()
+        started.wait()
+        threads.append(Thread(target = run, args = (1, follower_f)))
+        threads[1].start()
+        while (flight.stats().merged < 1):
+            pass
+        release.set()
+        for t in threads:
+            t.join()
+        return outcomes, flight.stats()
+
+    def test_error_is_copied_for_followers(self):
+        error = ValueError("invalid")
+        def fail():
+            raise error
+        (leader, follower), stats = self.share(fail, fail)
+        self.assertIs(leader, error)
+        self.assertIsInstance(follower, ValueError)
+        self.assertIsNot(follower, error)
+        self.assertIs(follower.__cause__, error)
+        self.assertEqual(follower.args, error.args)
+
+    def test_leaders_deadline_is_not_shared(self):
+        def expire():
+            raise DeadlineExceeded("Deadline exceeded")
+        for error in (expire, lambda: exec("raise KeyboardInterrupt"), lambda: exec("raise ConnectionError")):
+            (leader, follower), stats = self.share(error, lambda: "result")
+            self.assertIsInstance(leader, BaseException)
+            self.assertEqual(follower, ("result", False))
+            self.assertEqual((stats.calls, stats.executed, stats.merged), (2, 2, 0))
+
+
+class TestCoalescer(unittest.TestCase):
+
+    def test_key(self):
+        c = Coalescer()
+        self.assertEqual(c.key("/object/links", ("Qm1",), {"encoding": "json"}),
+                         c.key("/object/links", ("Qm1",), {"encoding": "json"}))
+        self.assertNotEqual(c.key("/object/links", ("Qm1",), {}), c.key("/object/links", ("Qm2",), {}))
+        self.assertIsNotNone(c.key("/object/data/Qm1", (), {}))
+        self.assertIsNone(c.key("/object/put", (), {}))
+        self.assertIsNone(c.key("/name/resolve", ("Qm1",), {}))
+        self.assertIsNone(c.key("/object/links", ("/ipns/Qm1",), {}))
+
+
+class TestCoalescingProxy(unittest.TestCase):
+
+    def test_concurrent_identical_calls(self):
+        threads = 8
+        with FakeDaemon(latency = 0.1) as daemon:
+            proxy = HttpProxy(daemon.host, daemon.port, coalesce = True)
+            ipfs = IpfsApi(proxy = proxy)
+            key = daemon.put_node(b"Hello World")
+            barrier = Barrier(threads)
+
+            def call(i):
+                barrier.wait()
+                return ipfs.object.data(key).read(), ipfs.object.links(key)
+
+            with ThreadPoolExecutor(threads) as pool:
+                results = list(pool.map(call, range(threads)))
+            proxy.close()
+
+        self.assertTrue(all(r == (b"Hello World", {"Hash": key, "Links": []}) for r in results))
+        stats = proxy.coalesce_stats()
+        self.assertEqual(stats.calls, 2 * threads)
+        self.assertGreater(stats.merged, 0)
+        self.assertEqual(daemon.calls["object/data"] + daemon.calls["object/links"], stats.executed)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(HttpProxy("localhost", 5001).coalesce_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
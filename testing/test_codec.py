@@ -0,0 +1,393 @@
+# coding=utf-8
+import asyncio
+import threading
+import unittest
+from io import BytesIO
+
+from ipfs import cbor, codec
+from ipfs.fakedaemon import FakeDaemon, multihash
+from ipfs.merkledag import Merkledag
+from ipfs.proto.merkledag import PBMerkleDag
+
+
+def backends():
+    """ Return the names of the installed JSON backends. """
+    names = []
+    for name in codec.JSON_BACKENDS:
+        try:
+            codec.json_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+ITEMS = [{"Ref": multihash(str(i).encode()), "Err": ""} for i in range(100)] + [{"Name": "ü\n", "Size": 1}]
+
+
+class _Trickle(BytesIO):
+    """ A stream that returns at most a few bytes per read. """
+
+    def read1(self, n = -1):
+        return BytesIO.read1(self, min(n, 7))
+
+
+
+class TestJsonBackends(unittest.TestCase):
+
+    def test_stdlib_is_always_available(self):
+        self.assertIn("json", backends())
+
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, codec.json_backend, "foo")
+
+
+    def test_backends_agree(self):
+        data = codec.Json("json").dumps(ITEMS)
+        for name in backends():
+            jcodec = codec.Json(name)
+            self.assertEqual(jcodec.loads(data), ITEMS, name)
+            self.assertEqual(jcodec.loads(jcodec.dumps(ITEMS)), ITEMS, name)
+            self.assertEqual(b"".join(jcodec.dump_iter(ITEMS, chunk_size = 64)), jcodec.dumps(ITEMS), name)
+
+
+    def test_set_json_backend(self):
+        try:
+            self.assertEqual(codec.set_json_backend("json").name, "json")
+            self.assertEqual(codec.JSON.backend.name, "json")
+            self.assertEqual(codec.Json("json").backend, codec.json_backend("json"))
+        finally:
+            codec.set_json_backend(None)
+        self.assertIn(backends()[0], codec.JSON.backend.name)
+
+
+    def test_default_output_is_stdlib(self):
+        # encoded values mustn't depend on the installed libraries
+        value = {"a": [1, 2 ** 70, float("inf")], 1: None}
+        self.assertEqual(codec.JSON.dumps(value), b'{"a": [1, 1180591620717411303424, Infinity], "1": null}')
+        self.assertEqual(b"".join(codec.JSON.dump_iter(value)), codec.JSON.dumps(value))
+        self.assertEqual(codec.json_backend().dumps, codec.json_backend("json").dumps)
+
+
+    def test_mappings_are_serialized(self):
+        node = codec.PB2(PBMerkleDag, "PBNode")
+        link = node.loads(node.dumps({"Links": [{"Hash": multihash(b"a"), "Name": "a", "Size": 1}]}))["Links"][0]
+        for name in backends():
+            self.assertEqual(codec.Json(name).loads(codec.Json(name).dumps([link])), [dict(link)], name)
+
+
+
+class TestJsonVector(unittest.TestCase):
+
+    def encode(self, items):
+        return b"".join(codec.JSON.dumps(item) + b"\n" for item in items)
+
+
+    def test_load(self):
+        data = self.encode(ITEMS)
+        for name in backends():
+            jsonv = codec.JsonVector(name)
+            self.assertEqual(list(jsonv.load(BytesIO(data))), ITEMS, name)
+            self.assertEqual(list(jsonv.loads(data)), ITEMS, name)
+
+
+    def test_lines_span_chunks(self):
+        data = self.encode(ITEMS)
+        jsonv = codec.JsonVector()
+        jsonv.chunk_size = 5
+        self.assertEqual(list(jsonv.load(BytesIO(data))), ITEMS)
+        self.assertEqual(list(codec.JSONV.load(_Trickle(data))), ITEMS)
+
+
+    def test_blank_lines_and_missing_newline(self):
+        data = b"\n" + self.encode(ITEMS[:2]) + b"\r\n\n" + codec.JSON.dumps(ITEMS[2])
+        self.assertEqual(list(codec.JSONV.load(BytesIO(data))), ITEMS[:3])
+        self.assertEqual(list(codec.JSONV.load(BytesIO(b""))), [])
+
+
+    def test_error_is_raised_at_item(self):
+        items = codec.JSONV.load(BytesIO(self.encode(ITEMS[:2]) + b"{\n"))
+        self.assertEqual(next(items), ITEMS[0])
+        self.assertEqual(next(items), ITEMS[1])
+        self.assertRaises(ValueError, next, items)
+
+
+    def test_dump(self):
+        f = BytesIO()
+        codec.JSONV.dump(ITEMS, f)
+        self.assertEqual(f.getvalue(), self.encode(ITEMS))
+        self.assertEqual(codec.JSONV.dumps(ITEMS), self.encode(ITEMS))
+        self.assertEqual(b"".join(codec.JSONV.dump_iter(ITEMS, chunk_size = 100)), self.encode(ITEMS))
+
+
+
+class _AsyncChunks:
+    """ An asynchronous stream that returns the given chunks, one per read. """
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    async def read(self, n = -1):
+        if (not self.chunks):
+            return b""
+        chunk = self.chunks.pop(0)
+        if (isinstance(chunk, asyncio.Event)):
+            await chunk.wait()
+            return await self.read(n)
+        return chunk
+
+
+
+class TestJsonItems(unittest.TestCase):
+
+    DOC = {
+        "Keys": {"Qm{:d}".format(i): {"Type": "recursive", "Deep": [[[{"a": "]}\\\""}]]]} for i in range(200)},
+        "Objects": {"QmA": {"Links": [{"Name": "ü", "Size": i} for i in range(50)]}, "QmB": {"Links": None}},
+        "Other": [1, 2.5, "x", None, True, {"z": "}"}]
+    }
+
+
+    def load(self, path, chunk_size = None, data = None):
+        jcodec = codec.JsonItems(path)
+        if (chunk_size != None):
+            jcodec.chunk_size = chunk_size
+        return list(jcodec.load(BytesIO(data if (data != None) else codec.Json("json").dumps(self.DOC))))
+
+
+    def test_items(self):
+        for chunk_size in (1, 7, 100, None):
+            self.assertEqual(self.load(["Keys"], chunk_size), list(self.DOC["Keys"].items()), chunk_size)
+            self.assertEqual(self.load(["Other"], chunk_size), self.DOC["Other"], chunk_size)
+            self.assertEqual(self.load(["Objects", "*", "Links"], chunk_size), self.DOC["Objects"]["QmA"]["Links"])
+
+
+    def test_backends_agree(self):
+        data = codec.Json("json").dumps(self.DOC)
+        for name in backends():
+            self.assertEqual(list(codec.JsonItems(["Keys"], name).loads(data)), list(self.DOC["Keys"].items()))
+
+
+    def test_paths(self):
+        self.assertEqual(self.load([]), list(self.DOC.items()))
+        self.assertEqual(self.load(["Other", 5]), [("z", "}")])
+        self.assertEqual(self.load(["Missing"]), [])
+        self.assertEqual(self.load(["Objects", "QmB", "Links"]), [])
+        self.assertEqual(self.load(["a"], data = b'{"a": []}'), [])
+
+
+    def test_memory_is_bounded(self):
+        data = b'{"Keys": [' + b",".join(b'{"Key": "Qm%040d"}' % i for i in range(20000)) + b']}'
+        jcodec = codec.JsonItems(["Keys"])
+        items = jcodec.load(BytesIO(data))
+        next(items)
+        self.assertLess(items.gi_frame.f_locals["tokenizer"].buf.__len__(), 2 * jcodec.chunk_size + 100)
+        self.assertEqual(sum(1 for item in items), 19999)
+
+
+    def test_errors(self):
+        for data in (b'{"a": [1, 2', b'{"a": [1 2]}', b'{"a": 5}', b'{"a": []} x', b'{"a": ["x]}'):
+            self.assertRaises(ValueError, self.load, ["a"], data = data)
+
+
+    def test_async_items_arrive_early(self):
+        async def run():
+            arrived = asyncio.Event()
+            items = await codec.JsonItems(["a"]).aload(_AsyncChunks([b'{"a": [1, 2', b', 3', arrived, b"]}"]))
+            received = []
+            async for item in items:
+                received.append(item)
+                # the rest of the document is only sent after the first items
+                # were received
+                arrived.set()
+            return received
+        self.assertEqual(asyncio.run(asyncio.wait_for(run(), 10)), [1, 2, 3])
+
+
+    def test_async_errors(self):
+        async def run(chunks, batch_size = 1000):
+            jcodec = codec.JsonItems(["a"])
+            jcodec.batch_size = batch_size
+            received = []
+            with self.assertRaises(ValueError):
+                async for item in await jcodec.aload(_AsyncChunks(chunks)):
+                    received.append(item)
+            return received
+        self.assertEqual(asyncio.run(run([b'{"a": [1, 2 3]}'])), [1, 2])
+        self.assertEqual(asyncio.run(run([b'{"a": [' + b"1, " * 5000, b"x]}"], 10)), [1] * 5000)
+
+
+    def test_async_close(self):
+        async def run():
+            jcodec = codec.JsonItems(["a"])
+            jcodec.batch_size = 1
+            items = await jcodec.aload(_AsyncChunks([b'{"a": [' + b"1, " * 100 + b"1]}"]))
+            self.assertEqual(await items.__anext__(), 1)
+            await items.aclose()
+        threads = threading.active_count()
+        asyncio.run(run())
+        # the parsing thread notices that the iterator was closed and ends
+        for i in range(50):
+            if (threading.active_count() <= threads):
+                break
+            threading.Event().wait(0.05)
+        self.assertLessEqual(threading.active_count(), threads)
+
+
+
+class TestCbor(unittest.TestCase):
+
+    # from RFC 8949, appendix A
+    VECTORS = [
+        (0, "00"), (23, "17"), (24, "1818"), (1000, "1903e8"), (1000000, "1a000f4240"),
+        (18446744073709551615, "1bffffffffffffffff"), (18446744073709551616, "c249010000000000000000"),
+        (-1, "20"), (-1000, "3903e7"), (-18446744073709551617, "c349010000000000000000"),
+        (0.0, "f90000"), (1.5, "f93e00"), (100000.0, "fa47c35000"), (1.1, "fb3ff199999999999a"),
+        (-4.0, "f9c400"), (float("inf"), "f97c00"), (False, "f4"), (True, "f5"), (None, "f6"),
+        (b"", "40"), (b"\x01\x02\x03\x04", "4401020304"), ("", "60"), ("IETF", "6449455446"),
+        ("\u00fc", "62c3bc"), ([], "80"), ([1, [2, 3], [4, 5]], "8301820203820405"),
+        ({}, "a0"), ({"a": 1, "b": [2, 3]}, "a26161016162820203"), (cbor.Tag(32, "a"), "d8206161")
+    ]
+
+
+    def test_vectors(self):
+        for value, encoded in self.VECTORS:
+            self.assertEqual(cbor.dumps(value).hex(), encoded, value)
+            self.assertEqual(cbor.loads(bytes.fromhex(encoded)), value, encoded)
+
+
+    def test_indefinite_length(self):
+        self.assertEqual(cbor.loads(bytes.fromhex("9f018202039f0405ffff")), [1, [2, 3], [4, 5]])
+        self.assertEqual(cbor.loads(bytes.fromhex("bf61610161629f0203ffff")), {"a": 1, "b": [2, 3]})
+        self.assertEqual(cbor.loads(bytes.fromhex("5f42010243030405ff")), b"\x01\x02\x03\x04\x05")
+        self.assertEqual(cbor.loads(bytes.fromhex("7f657374726561646d696e67ff")), "streaming")
+
+
+    def test_types(self):
+        value = {"list": (1, 2), "view": memoryview(b"ab"), "nested": {1: [{"x": bytearray(b"c")}]}}
+        self.assertEqual(cbor.loads(cbor.dumps(value)), {"list": [1, 2], "view": b"ab", "nested": {1: [{"x": b"c"}]}})
+        self.assertRaises(cbor.CborError, cbor.dumps, {1, 2})
+
+
+    def test_errors(self):
+        for data in ("", "18", "8301", "62c3", "0000", "ff", "1c", "c2 01", "f9 00", "fb"):
+            self.assertRaises(cbor.CborError, cbor.loads, bytes.fromhex(data))
+        # an array as map key, a huge array length and a truncated huge map
+        for data in ("a1 80 01", "9b" + "ff" * 8, "bb" + "ff" * 8, "5b" + "ff" * 8):
+            self.assertRaises(cbor.CborError, cbor.loads, bytes.fromhex(data))
+
+
+    def test_nesting_depth(self):
+        self.assertRaises(cbor.CborError, cbor.loads, b"\x81" * 5000 + b"\x00")
+        self.assertRaises(cbor.CborError, cbor.loads, b"\x9f" * 5000)
+        self.assertRaises(cbor.CborError, cbor.loads, b"\xa1\x00" * 5000 + b"\x00")
+        self.assertRaises(cbor.CborError, cbor.loads, b"\xc6" * 5000 + b"\x00")
+        value = 0
+        for i in range(cbor.MAX_DEPTH):
+            value = [value]
+        self.assertEqual(cbor.loads(cbor.dumps(value)), value)
+
+
+    def test_codec(self):
+        value = {"name": "foo", "hash": multihash(b"foo"), "size": 3, "tags": ["a", "b"]}
+        data = codec.CBOR.dumps(value)
+        self.assertLess(len(data), len(codec.JSON.dumps(value)))
+        self.assertEqual(codec.CBOR.loads(data), value)
+        self.assertEqual(codec.CBOR.load(BytesIO(data)), value)
+
+
+    def test_merkledag_values(self):
+        daemon = FakeDaemon().start()
+        try:
+            ipfs = daemon.api()
+            dag = Merkledag(ipfs, codec = codec.CBOR)
+            value = {"records": [{"name": "a", "hash": b"\x12\x20" + bytes(32)}]}
+            node = dag.builder().value(value).build()
+            self.assertEqual(Merkledag(ipfs, codec = codec.CBOR)[node.hash].value, value)
+            ipfs._proxy.close()
+        finally:
+            daemon.stop()
+
+
+
+class TestCompressed(unittest.TestCase):
+
+    VALUE = {"entries": [{"name": "file-{:d}".format(i), "hash": multihash(str(i).encode())} for i in range(100)]}
+
+
+    def test_compressors(self):
+        raw = codec.JSON.dumps(self.VALUE)
+        for name in ("none", "zlib", "bz2", "lzma"):
+            ccodec = codec.Compressed(codec.JSON, name)
+            data = ccodec.dumps(self.VALUE)
+            self.assertEqual(data[:2], bytes([0, codec.COMPRESSORS[name].id]))
+            if (name != "none"):
+                self.assertLess(len(data), len(raw))
+            self.assertEqual(ccodec.loads(data), self.VALUE, name)
+            self.assertEqual(ccodec.load(BytesIO(data)), self.VALUE, name)
+            f = BytesIO()
+            ccodec.dump(self.VALUE, f)
+            self.assertEqual(ccodec.loads(f.getvalue()), self.VALUE, name)
+
+
+    def test_setting_changed(self):
+        data = codec.Compressed(codec.JSON, "lzma").dumps(self.VALUE)
+        self.assertEqual(codec.Compressed(codec.JSON, "zlib").loads(data), self.VALUE)
+        # values written before compression was enabled
+        raw = codec.JSON.dumps(self.VALUE)
+        self.assertEqual(codec.Compressed(codec.JSON).loads(raw), self.VALUE)
+        self.assertEqual(codec.Compressed(codec.JSON).load(BytesIO(raw)), self.VALUE)
+        self.assertRaises(ValueError, codec.Compressed(codec.JSON).loads, b"\x00\xfe")
+
+
+    def test_streaming_inner_codec(self):
+        items = self.VALUE["entries"]
+        ccodec = codec.Compressed(codec.JSONV)
+        self.assertEqual(list(ccodec.load(BytesIO(ccodec.dumps(items)))), items)
+
+
+    def test_register_compressor(self):
+        self.assertRaises(ValueError, codec.register_compressor, codec.Compressor("zlib", 200, None, None))
+        self.assertRaises(ValueError, codec.register_compressor, codec.Compressor("foo", 1, None, None))
+
+
+
+class TestDumpIter(unittest.TestCase):
+
+    NODE = {"Data": b"x" * 5000, "Links": [{"Hash": multihash(str(i).encode()), "Name": str(i), "Size": i}
+                                           for i in range(100)]}
+
+
+    def dump_iter(self, ccodec, value):
+        """ Return the chunks and whether a thread was running after the first chunk. """
+        threads = threading.active_count()
+        it = ccodec.dump_iter(value, chunk_size = 100, max_chunks = 1)
+        chunks = [next(it)]
+        running = threading.active_count() > threads
+        chunks.extend(it)
+        return chunks, running
+
+
+    def test_cheap_codecs_are_sliced(self):
+        for ccodec, value in ((codec.PB2(PBMerkleDag, "PBNode"), self.NODE),
+                              (codec.Protobuf2(PBMerkleDag, "PBNode"), self.NODE),
+                              (codec.CBOR, TestCompressed.VALUE)):
+            chunks, running = self.dump_iter(ccodec, value)
+            self.assertFalse(running, ccodec)
+            self.assertEqual(b"".join(chunks), ccodec.dumps(value), ccodec)
+            self.assertEqual({len(chunk) for chunk in chunks[:-1]}, {100}, ccodec)
+
+
+    def test_compressed(self):
+        for inner in (codec.CBOR, codec.JSON, codec.Pickle()):
+            ccodec = codec.Compressed(inner, "none")
+            chunks, running = self.dump_iter(ccodec, TestCompressed.VALUE)
+            # the inner codec decides whether a thread is needed
+            self.assertEqual(running, isinstance(inner, codec.Pickle), inner)
+            self.assertEqual(ccodec.loads(b"".join(chunks)), TestCompressed.VALUE, inner)
+
+
+    def test_incremental_codecs_use_pipe(self):
+        chunks, running = self.dump_iter(codec.Pickle(), TestCompressed.VALUE)
+        self.assertTrue(running)
+        self.assertEqual(codec.Pickle().loads(b"".join(chunks)), TestCompressed.VALUE)
@@ -0,0 +1,165 @@
+# coding=utf-8
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from ipfs.api import IpfsApi, AsyncIpfsApi, HttpProxy
+from ipfs.api.deadline import DeadlineExceeded, DeadlineStream, deadline, expires_at, remaining
+from ipfs.api.hedge import Hedger, LatencyWindow
+from ipfs.fakedaemon import FakeDaemon
+from ipfs.merkledag import Merkledag
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_no_deadline(self):
+        self.assertIsNone(expires_at())
+        self.assertIsNone(remaining(None))
+        with deadline(None) as expires:
+            self.assertIsNone(expires)
+
+    def test_nested_deadlines_only_shorten(self):
+        with deadline(10.0) as outer:
+            with deadline(100.0) as inner:
+                self.assertEqual(inner, outer)
+            with deadline(1.0) as inner:
+                self.assertLess(inner, outer)
+            self.assertEqual(expires_at(), outer)
+            self.assertLess(expires_at(0.5), outer)
+        self.assertIsNone(expires_at())
+
+    def test_remaining(self):
+        self.assertAlmostEqual(remaining(expires_at(10.0)), 10.0, places = 1)
+        with self.assertRaises(DeadlineExceeded):
+            remaining(time.monotonic() - 1)
+
+    def test_stream(self):
+        f = DeadlineStream(BytesIO(b"a\nb\n"), expires_at(10.0))
+        self.assertEqual(list(f), [b"a\n", b"b\n"])
+        f = DeadlineStream(BytesIO(b"data"), time.monotonic() - 1)
+        with self.assertRaises(DeadlineExceeded):
+            f.read()
+
+
+class TestDeadlineProxy(unittest.TestCase):
+
+    def test_timeout(self):
+        with FakeDaemon(latency = 0.5) as daemon:
+            ipfs = daemon.api(timeout = 0.1)
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                ipfs.version()
+            self.assertLess(time.monotonic() - start, 0.4)
+            ipfs._proxy.close()
+
+    def test_deadline_context(self):
+        with FakeDaemon(latency = 0.2) as daemon:
+            dag = Merkledag(daemon.api())
+            key = daemon.put_node(b"Hello World")
+            self.assertEqual(dag[key].value, b"Hello World")
+            with self.assertRaises(DeadlineExceeded):
+                with deadline(0.05):
+                    dag[key].links
+            dag.ipfs._proxy.close()
+
+    def test_merkledag_timeout(self):
+        with FakeDaemon(latency = 0.2) as daemon:
+            dag = Merkledag(daemon.api(), timeout = 0.05)
+            key = daemon.put_node(b"Hello World")
+            with self.assertRaises(DeadlineExceeded):
+                dag[key].value
+            dag.ipfs._proxy.close()
+
+    def test_async_timeout(self):
+        async def run(daemon):
+            ipfs = AsyncIpfsApi(daemon.host, daemon.port, timeout = 0.1)
+            try:
+                with self.assertRaises(DeadlineExceeded):
+                    await ipfs.version()
+                # the failed call mustn't leak its connection slot
+                with deadline(2.0):
+                    self.assertIn("Version", await ipfs.version())
+            finally:
+                await ipfs._proxy.close()
+
+        slow = iter([0.5])
+        with FakeDaemon(latency = lambda: next(slow, 0.0)) as daemon:
+            asyncio.run(run(daemon))
+
+
+class TestHedging(unittest.TestCase):
+
+    def test_latency_window(self):
+        window = LatencyWindow(100)
+        for i in range(200):
+            window.add(i / 1000)
+        self.assertEqual(len(window), 100)
+        self.assertAlmostEqual(window.percentile(0.5), 0.15)
+        self.assertAlmostEqual(window.percentile(1.0), 0.199)
+
+    def test_applies(self):
+        hedger = Hedger()
+        self.assertTrue(hedger.applies("/object/data", ("Qm1",)))
+        self.assertFalse(hedger.applies("/object/put", ()))
+        self.assertFalse(hedger.applies("/name/resolve", ("Qm1",)))
+
+    def test_slow_call_is_hedged(self):
+        # every 5th response is slow
+        count = iter(range(1000))
+        latency = lambda: 1.0 if (next(count) % 5 == 4) else 0.0
+        with FakeDaemon(latency = latency) as daemon:
+            key = daemon.put_node(b"Hello World")
+            # fast calls must not be hedged, or they shift which call is slow
+            hedger = Hedger(percentile = 0.5, min_samples = 3, min_delay = 0.1)
+            proxy = HttpProxy(daemon.host, daemon.port, hedge = hedger)
+            ipfs = IpfsApi(proxy = proxy)
+            start = time.monotonic()
+            for i in range(5):
+                self.assertEqual(ipfs.object.data(key).read(), b"Hello World")
+            self.assertLess(time.monotonic() - start, 0.9)
+            proxy.close()
+
+        stats = proxy.hedge_stats()
+        self.assertEqual(stats.calls, 5)
+        self.assertGreaterEqual(stats.hedged, 1)
+        self.assertGreaterEqual(stats.wins, 1)
+
+    def test_more_calls_than_workers(self):
+        hedger = Hedger(min_samples = 3, max_workers = 2, min_delay = 10, max_delay = 10)
+        barrier = threading.Barrier(8, timeout = 5)
+        threads = []
+
+        def call():
+            threads.append(threading.current_thread())
+            barrier.wait()
+            return True
+
+        def run(i):
+            return hedger.run("/object/data", call)
+
+        with ThreadPoolExecutor(8) as callers:
+            # too few samples: calls run on the callers' threads
+            self.assertTrue(all(callers.map(run, range(8))))
+            self.assertTrue(all(t.name.startswith("ThreadPoolExecutor") for t in threads))
+            # every call must reach the barrier, although the pool has only 2 workers
+            self.assertTrue(all(callers.map(run, range(8))))
+        hedger.close()
+        self.assertEqual(hedger.stats().calls, 16)
+
+    def test_errors_are_raised(self):
+        with FakeDaemon() as daemon:
+            proxy = HttpProxy(daemon.host, daemon.port, hedge = True)
+            ipfs = IpfsApi(proxy = proxy)
+            with self.assertRaises(Exception):
+                ipfs.object.data("QmUnknown")
+            proxy.close()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(HttpProxy("localhost", 5001).hedge_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
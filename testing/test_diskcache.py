@@ -0,0 +1,107 @@
+# coding=utf-8
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from ipfs.diskcache import DiskCache
+
+
+def _fill(path, worker, count):
+    with DiskCache(path, max_size = 1 << 20) as cache:
+        for i in range(count):
+            cache.put("key {:d}".format(i), "value {:d} from {:d}".format(i, worker).encode())
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_and_put(self):
+        with DiskCache(self.path) as cache:
+            self.assertEqual(cache.get("a"), None)
+            cache.put("a", b"foo")
+            cache.put("a", b"bar")
+            self.assertEqual(bytes(cache.get("a")), b"foo")
+            self.assertIn("a", cache)
+            stats = cache.stats()
+            self.assertEqual((stats.hits, stats.misses, stats.entries), (1, 1, 1))
+
+    def test_persistent_and_shared(self):
+        with DiskCache(self.path) as first, DiskCache(self.path) as second:
+            first.put("a", b"foo")
+            self.assertEqual(bytes(second.get("a")), b"foo")
+        with DiskCache(self.path) as cache:
+            self.assertEqual(bytes(cache.get("a")), b"foo")
+
+    def test_misses_refresh_on_changes(self):
+        with DiskCache(self.path) as first, DiskCache(self.path) as second:
+            refresh = second._refresh
+            refreshes = []
+            second._refresh = lambda: refreshes.append(1) or refresh()
+            for i in range(10):
+                self.assertEqual(second.get("a"), None)
+            # the files weren't changed
+            self.assertEqual(refreshes, [])
+            first.put("a", b"foo")
+            self.assertEqual(bytes(second.get("a")), b"foo")
+            first.put("b", b"bar")
+            self.assertEqual(bytes(second.get("b")), b"bar")
+            self.assertEqual(second.get("c"), None)
+            self.assertEqual(len(refreshes), 2)
+
+    def test_eviction(self):
+        with DiskCache(self.path, max_size = 4000, generations = 4) as cache:
+            for i in range(100):
+                cache.put(str(i), bytes(100))
+            self.assertLessEqual(cache.size(), 4000)
+            self.assertEqual(cache.get("0"), None)
+            self.assertEqual(bytes(cache.get("99")), bytes(100))
+            self.assertGreater(cache.stats().evictions, 0)
+
+    def test_hits_are_promoted(self):
+        with DiskCache(self.path, max_size = 4000, generations = 4) as cache:
+            cache.put("hot", b"x" * 100)
+            for i in range(100):
+                cache.put(str(i), bytes(100))
+                self.assertEqual(bytes(cache.get("hot")), b"x" * 100)
+
+    def test_torn_and_corrupt_records(self):
+        with DiskCache(self.path) as cache:
+            cache.put("a", b"foo")
+        # a writer crashed while writing an index entry
+        with open(os.path.join(self.path, "00000000.idx"), "ab") as f:
+            f.write(b"\x00" * 7)
+        with DiskCache(self.path) as cache:
+            cache.put("b", b"bar")
+            self.assertEqual(bytes(cache.get("b")), b"bar")
+        with open(os.path.join(self.path, "00000000.pack"), "r+b") as f:
+            data = f.read()
+            f.seek(data.index(b"foo"))
+            f.write(b"FOO")
+        with DiskCache(self.path) as cache:
+            self.assertEqual(cache.get("a"), None)
+            self.assertEqual(bytes(cache.get("b")), b"bar")
+
+    def test_concurrent_processes(self):
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target = _fill, args = (self.path, i, 200)) for i in range(4)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+            self.assertEqual(p.exitcode, 0)
+        with DiskCache(self.path) as cache:
+            self.assertEqual(len(cache), 200)
+            for i in range(200):
+                self.assertRegex(bytes(cache.get("key {:d}".format(i))).decode(),
+                                 r"^value {:d} from \d$".format(i))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# coding=utf-8
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+
+from ipfs.api import AsyncIpfsApi
+from ipfs.api.metrics import MetricsAggregator
+from ipfs.api.proxy import ProxyError
+from ipfs.fakedaemon import FakeDaemon, DiskBlockstore, CHUNK_SIZE, multihash
+
+
+class TestFakeDaemon(unittest.TestCase):
+    EMPTY = 'QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn'
+    NODE = {'Data': b'Hello World'}
+    NODE_KEY = 'QmXy2pAWQ3Ef1PqZqi4Z9TJnpDh1trdkCqAvzBgKNNRrSR'
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.ipfs = self.daemon.api()
+
+    def tearDown(self):
+        self.ipfs._proxy.close()
+        self.daemon.stop()
+
+    def test_object_keys_match_go_ipfs(self):
+        self.assertEqual(self.ipfs.object.new('unixfs-dir')['Hash'], self.EMPTY)
+        self.assertEqual(self.ipfs.object.put(self.NODE)['Hash'], self.NODE_KEY)
+        self.assertEqual(self.ipfs.object.data(self.NODE_KEY).read(), b'Hello World')
+        self.assertEqual(self.ipfs.object.get(self.NODE_KEY), {'Data': b'Hello World'})
+
+    def test_block(self):
+        stat = self.ipfs.block.put(BytesIO(b'foobar'))
+        self.assertEqual(stat, {'Key': 'QmbWTwYGcmdyK9CYfNBcfs9nhZs17a6FQ4Y8oea278xx41', 'Size': 6})
+        self.assertEqual(self.ipfs.block.get(stat['Key']).read(), b'foobar')
+        self.assertEqual(self.ipfs.block.stat(stat['Key'])['Size'], 6)
+
+    def test_add_and_cat_chunked_file(self):
+        data = os.urandom(2 * CHUNK_SIZE + 100)
+        key = self.ipfs.file.add(BytesIO(data))['Hash']
+        self.assertEqual(self.ipfs.file.cat(key).read(), data)
+        self.assertEqual(len(self.ipfs.object.links(key)['Links']), 3)
+
+    def test_add_directory(self):
+        added = list(self.ipfs.file.add_files([('d', None), ('d/b', b'B'), ('d/a', b'A')]))
+        root = added[-1]
+        self.assertEqual(root['Name'], 'd')
+        names = [l['Name'] for l in self.ipfs.object.links(root['Hash'])['Links']]
+        self.assertEqual(names, ['a', 'b'])
+        self.assertEqual(self.ipfs.file.cat(root['Hash'] + '/b').read(), b'B')
+        listing = self.ipfs.file.ls(root['Hash'])
+        self.assertEqual(listing['Objects'][root['Hash']]['Type'], 'Directory')
+        self.assertEqual(list(self.ipfs.file.iter_ls(root['Hash'])), listing['Objects'][root['Hash']]['Links'])
+
+    def test_patch_and_resolve(self):
+        child = self.ipfs.object.put(self.NODE)['Hash']
+        parent = self.ipfs.object.patch(self.EMPTY).add_link('child', child)['Hash']
+        self.assertEqual(self.ipfs.resolve('/ipfs/{}/child'.format(parent)), {'Path': '/ipfs/' + child})
+        self.assertEqual(self.ipfs.object.patch(parent).rm_link('child')['Hash'], self.EMPTY)
+
+    def test_pin_name_and_gc(self):
+        key = self.ipfs.object.put(self.NODE)['Hash']
+        self.ipfs.pin.add(key)
+        self.assertIn(key, self.ipfs.pin.ls()['Keys'])
+        self.assertEqual(dict(self.ipfs.pin.iter_ls()), self.ipfs.pin.ls()['Keys'])
+        self.ipfs.name.publish(key)
+        self.assertEqual(self.ipfs.name.resolve()['Path'], '/ipfs/' + key)
+        garbage = self.ipfs.block.put(BytesIO(b'garbage'))['Key']
+        removed = [r['Key'] for r in self.ipfs.repo_gc()]
+        self.assertIn(garbage, removed)
+        self.assertNotIn(key, removed)
+
+    def test_refs(self):
+        child = self.ipfs.object.put(self.NODE)['Hash']
+        parent = self.daemon.put_node(b'parent', [{'Name': 'a b', 'Hash': child}])
+        root = self.daemon.put_node(b'root', [{'Name': 'c', 'Hash': child}, {'Name': 'a b', 'Hash': parent}])
+        self.assertEqual([r['Ref'] for r in self.ipfs.refs.refs(root)], [child, parent])
+        self.assertEqual(list(self.ipfs.refs.edges(root)),
+                         [(root, child, 'c'), (root, parent, 'a b'), (parent, child, 'a b')])
+        self.assertEqual(list(self.ipfs.refs.edges(root, unique = True)), [(root, child, 'c'), (root, parent, 'a b')])
+        self.assertEqual(list(self.ipfs.refs.edges(root, max_depth = 1)), [(root, child, 'c'), (root, parent, 'a b')])
+        self.assertEqual([r['Ref'] for r in self.ipfs.refs.refs(root, recursive = True, edges = True)][-1],
+                         '{} -> {}'.format(parent, child))
+        local = {r['Ref'] for r in self.ipfs.refs.local()}
+        self.assertTrue({root, parent, child, self.EMPTY} <= local)
+
+    def test_refs_error(self):
+        root = self.daemon.put_node(b'', [{'Name': 'gone', 'Hash': multihash(b'gone')}])
+        with self.assertRaises(ProxyError):
+            list(self.ipfs.refs.edges(root))
+
+    def test_error(self):
+        with self.assertRaises(ProxyError):
+            self.ipfs.object.links('QmNotThere')
+
+    def test_calls_and_metrics(self):
+        metrics = MetricsAggregator()
+        self.ipfs._proxy.add_hook(metrics)
+        self.ipfs.version()
+        self.ipfs.version()
+        self.assertEqual(self.daemon.calls['version'], 2)
+        self.assertEqual(metrics.endpoint('/version').calls, 2)
+
+    def test_async_client(self):
+        async def run():
+            async with AsyncIpfsApi(self.daemon.host, self.daemon.port) as ipfs:
+                return await ipfs.object.put(self.NODE)
+        self.assertEqual(asyncio.run(run())['Hash'], self.NODE_KEY)
+
+    def test_async_edges(self):
+        child = self.daemon.put_node(b'child')
+        root = self.daemon.put_node(b'root', [{'Name': 'a b', 'Hash': child}])
+        broken = self.daemon.put_node(b'', [{'Name': 'gone', 'Hash': multihash(b'gone')}])
+
+        async def run():
+            async with AsyncIpfsApi(self.daemon.host, self.daemon.port) as ipfs:
+                edges = [edge async for edge in ipfs.refs.aedges(root)]
+                with self.assertRaises(ProxyError):
+                    [edge async for edge in ipfs.refs.aedges(broken)]
+                with self.assertRaises(TypeError):
+                    list(ipfs.refs.edges(root))
+                return edges
+        self.assertEqual(asyncio.run(run()), [(root, child, 'a b')])
+
+    def test_async_iter_ls(self):
+        key = self.ipfs.object.put(self.NODE)['Hash']
+        self.ipfs.pin.add(key)
+
+        async def run():
+            async with AsyncIpfsApi(self.daemon.host, self.daemon.port) as ipfs:
+                return dict([item async for item in await ipfs.pin.iter_ls()])
+        self.assertEqual(asyncio.run(run()), self.ipfs.pin.ls()['Keys'])
+
+
+class TestFakeDaemonUnixSocket(unittest.TestCase):
+
+    def test_unix_socket_and_disk_blockstore(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            blockstore = DiskBlockstore(os.path.join(tmp, 'blocks'))
+            with FakeDaemon(blockstore = blockstore, unix_socket = os.path.join(tmp, 'api.sock')) as daemon:
+                ipfs = daemon.api()
+                key = ipfs.file.add(BytesIO(b'Hello World'))['Hash']
+                self.assertEqual(ipfs.file.cat(key).read(), b'Hello World')
+                ipfs._proxy.close()
+            self.assertTrue(blockstore.has(key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# coding=utf-8
+import gc
+import tempfile
+import unittest
+
+from ipfs.diskcache import DiskCache
+from ipfs.fakedaemon import FakeDaemon
+from ipfs.merkledag import Merkledag
+
+
+class TestMerkledagCache(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.ipfs = self.daemon.api()
+        self.calls = []
+        self.ipfs._proxy.add_hook(lambda record: self.calls.append(record.path))
+        leaves = [self.daemon.put_node("leaf {:d}".format(i).encode()) for i in range(3)]
+        self.root = self.daemon.put_node(b"root", [{"Name": str(i), "Hash": key, "Size": 0}
+                                                   for i, key in enumerate(leaves)])
+
+    def tearDown(self):
+        self.ipfs._proxy.close()
+        self.daemon.stop()
+
+    def walk(self, dag):
+        root = dag[self.root]
+        return [root.value] + [link.follow().value for link in root.links]
+
+    def test_nodes_are_interned(self):
+        dag = Merkledag(self.ipfs)
+        node = dag[self.root]
+        self.assertIs(dag[self.root], node)
+        self.assertIs(node.links[0].follow(), node["0"])
+        del node
+        gc.collect()
+        self.assertEqual(len(dag._nodes), 0)
+
+    def test_walking_twice_fetches_once(self):
+        dag = Merkledag(self.ipfs)
+        values = self.walk(dag)
+        self.assertEqual(values, [b"root", b"leaf 0", b"leaf 1", b"leaf 2"])
+        fetched = len(self.calls)
+        gc.collect()
+        self.assertEqual(self.walk(dag), values)
+        self.assertEqual(len(self.calls), fetched)
+        stats = dag.cache_stats()
+        self.assertEqual(stats.misses, 5)
+        self.assertEqual(stats.hits, 5)
+        self.assertEqual(stats.entries, 5)
+
+    def test_flush_keeps_shared_cache(self):
+        dag = Merkledag(self.ipfs)
+        node = dag[self.root]
+        node.value
+        node.flush()
+        self.assertEqual(node.value, b"root")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_budget(self):
+        dag = Merkledag(self.ipfs, cache_size = 250)
+        self.walk(dag)
+        gc.collect()
+        stats = dag.cache_stats()
+        self.assertLessEqual(stats.size, 250)
+        self.assertGreater(stats.evictions, 0)
+
+    def test_disabled(self):
+        dag = Merkledag(self.ipfs, cache_size = 0)
+        self.walk(dag)
+        gc.collect()
+        self.walk(dag)
+        self.assertEqual(len(self.calls), 10)
+        self.assertEqual(dag.cache_stats().entries, 0)
+
+    def test_cache_value(self):
+        dag = Merkledag(self.ipfs, cache_value = lambda value: not value.startswith(b"leaf"))
+        self.walk(dag)
+        gc.collect()
+        fetched = len(self.calls)
+        self.walk(dag)
+        # only the values of the leaves are fetched again
+        self.assertEqual(self.calls[fetched:], ["/object/data"] * 3)
+        self.assertEqual(dag.cache_stats().entries, 2)
+
+    def test_disk_cache_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with DiskCache(tmp) as cache:
+                values = self.walk(Merkledag(self.ipfs, disk_cache = cache))
+            fetched = len(self.calls)
+            with DiskCache(tmp) as cache:
+                dag = Merkledag(self.ipfs, disk_cache = cache)
+                self.assertEqual(self.walk(dag), values)
+                self.assertEqual([l.name for l in dag[self.root].links], ["0", "1", "2"])
+                self.assertEqual(cache.stats().hits, 5)
+            self.assertEqual(len(self.calls), fetched)
+
+
+class TestMerkledagFetch(unittest.TestCase):
+
+    setUp = TestMerkledagCache.setUp
+    tearDown = TestMerkledagCache.tearDown
+    walk = TestMerkledagCache.walk
+
+    def test_fetch_modes(self):
+        expected = {"separate": ["/object/data", "/object/links"] + ["/object/data"] * 3 + ["/object/links"],
+                    "object": ["/object/get"] * 4, "block": ["/block/get"] * 4}
+        links = self.ipfs.object.links(self.root)["Links"]
+        for fetch, paths in expected.items():
+            del self.calls[:]
+            dag = Merkledag(self.ipfs, fetch = fetch)
+            self.assertEqual(self.walk(dag), [b"root", b"leaf 0", b"leaf 1", b"leaf 2"])
+            self.assertEqual([(l.name, l.hash) for l in dag[self.root].links],
+                             [(l["Name"], l["Hash"]) for l in links])
+            self.assertEqual(dag[self.root]["0"].links, ())
+            self.assertEqual(self.calls, paths)
+
+    def test_invalid_fetch_mode(self):
+        with self.assertRaises(ValueError):
+            Merkledag(self.ipfs, fetch = "dag")
+
+
+class TestMerkledagWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.ipfs = self.daemon.api()
+        self.dag = Merkledag(self.ipfs)
+        c = self.daemon.put_node(b"c")
+        a = self.daemon.put_node(b"a", [{"Name": "c", "Hash": c, "Size": 0}])
+        b = self.daemon.put_node(b"b", [{"Name": "c", "Hash": c, "Size": 0}])
+        self.root = self.daemon.put_node(b"root", [{"Name": "a", "Hash": a, "Size": 0},
+                                                   {"Name": "b", "Hash": b, "Size": 0}])
+
+    def tearDown(self):
+        self.ipfs._proxy.close()
+        self.daemon.stop()
+
+    def walk(self, **kwargs):
+        return [(depth, node.value) for depth, link, node in self.dag.walk(self.root, values = True, **kwargs)]
+
+    def test_order(self):
+        self.assertEqual(self.walk(), [(0, b"root"), (1, b"a"), (1, b"b"), (2, b"c")])
+        self.assertEqual(self.walk(order = "dfs"), [(0, b"root"), (1, b"a"), (2, b"c"), (1, b"b")])
+        self.assertEqual(self.walk(order = "dfs", unique = False, workers = 1),
+                         [(0, b"root"), (1, b"a"), (2, b"c"), (1, b"b"), (2, b"c")])
+        with self.assertRaises(ValueError):
+            self.walk(order = "random")
+
+    def test_depth_and_predicate(self):
+        self.assertEqual(self.walk(max_depth = 1), [(0, b"root"), (1, b"a"), (1, b"b")])
+        self.assertEqual(self.walk(predicate = lambda link: link.name != "a"), [(0, b"root"), (1, b"b"), (2, b"c")])
+
+    def test_max_depth_calls(self):
+        children = [{"Name": str(i), "Hash": self.daemon.put_node(str(i).encode()), "Size": 0} for i in range(5)]
+        root = self.daemon.put_node(b"root", children)
+        walked = list(self.dag.walk(root, max_depth = 1))
+        self.assertEqual(len(walked), 6)
+        # only the links of the root are loaded
+        self.assertEqual(self.daemon.calls["object/links"], 1)
+
+    def test_links(self):
+        links = [(link.name if (link) else None, node.hash) for depth, link, node in self.dag.walk(self.root)]
+        self.assertEqual([name for name, hash in links], [None, "a", "b", "c"])
+        self.assertEqual(links[0][1], self.root)
+
+    def test_edges(self):
+        walked = [(link.hash, link.name) for depth, link, node in self.dag.walk(self.root, order = "dfs", unique = False)
+                  if (link != None)]
+        edges = list(self.dag.edges(self.root))
+        self.assertEqual([(link.hash, link.name) for parent, link in edges], walked)
+        self.assertEqual(edges[0][0], self.root)
+        self.assertEqual(len(list(self.dag.edges(self.dag[self.root], unique = True))), 3)
+        self.assertEqual(self.daemon.calls["refs"], 2)
+
+    def test_close_early(self):
+        walk = self.dag.walk(self.root)
+        self.assertEqual(next(walk)[2].hash, self.root)
+        walk.close()
+
+    def test_large_tree(self):
+        def build(depth, name):
+            if (depth == 0):
+                return self.daemon.put_node(name.encode())
+            return self.daemon.put_node(name.encode(), [{"Name": str(i), "Hash": build(depth - 1, name + str(i)),
+                                                         "Size": 0} for i in range(4)])
+        self.root = build(4, "r")
+        for order in ("bfs", "dfs"):
+            values = [value.decode() for depth, value in self.walk(order = order, workers = 3)]
+            self.assertEqual(len(values), 341)
+            if (order == "bfs"):
+                self.assertEqual(values, sorted(values, key = lambda v: (len(v), v)))
+            else:
+                self.assertEqual(values, sorted(values))
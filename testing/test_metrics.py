@@ -0,0 +1,190 @@
+# coding=utf-8
+import asyncio
+import unittest
+from io import BytesIO, StringIO
+
+from ipfs.api import AsyncIpfsApi
+from ipfs.api.metrics import CallRecord, DebugHook, Histogram, MeteredStream, MetricsAggregator, endpoint_of
+from ipfs.api.proxy import ProxyError
+from ipfs.fakedaemon import FakeDaemon
+
+
+class Records(list):
+    """ A hook that keeps all records. """
+
+    def __call__(self, record):
+        self.append(record)
+
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram(lowest = 1, factor = 2, num_buckets = 4)
+        self.assertEqual(h.percentile(0.5), 0.0)
+        for i in range(90):
+            h.add(0.5)
+        for i in range(9):
+            h.add(3)
+        h.add(100)
+        self.assertEqual(h.count, 100)
+        # the upper bounds of the buckets [0, 1], (2, 4] and the overflow bucket
+        self.assertEqual(h.percentile(0.5), 1)
+        self.assertEqual(h.percentile(0.9), 1)
+        self.assertEqual(h.percentile(0.91), 4)
+        self.assertEqual(h.percentile(0.99), 4)
+        self.assertEqual(h.percentile(1.0), 100)
+        self.assertAlmostEqual(h.mean, (90 * 0.5 + 9 * 3 + 100) / 100)
+        self.assertEqual(h.as_dict()["p99"], 4)
+
+    def test_percentile_is_at_most_max(self):
+        h = Histogram()
+        h.add(0.003)
+        self.assertEqual(h.percentile(0.5), 0.003)
+        self.assertEqual(h.percentile(0.0), 0.003)
+
+    def test_bucket_bounds_are_inclusive(self):
+        h = Histogram(lowest = 1, factor = 2, num_buckets = 4)
+        h.add(2)
+        h.add(2)
+        h.add(8)
+        self.assertEqual(h.counts, [0, 2, 0, 1, 0])
+        self.assertEqual(h.percentile(0.5), 2)
+
+
+
+class TestMeteredStream(unittest.TestCase):
+
+    def stream(self, data = b"line 1\nline 2\n"):
+        hook = Records()
+        record = CallRecord("/cat/Qm", "GET", 1)
+        record._hooks = (hook,)
+        return MeteredStream(BytesIO(data), record), hook
+
+    def test_finished_at_eof(self):
+        f, hook = self.stream()
+        f.read(4)
+        self.assertEqual(hook, [])
+        f.read(100)
+        self.assertEqual(hook, [])
+        self.assertEqual(f.read(100), b"")
+        self.assertEqual(len(hook), 1)
+        self.assertEqual(hook[0].response_bytes, 14)
+        # closing after EOF doesn't finish the call again
+        f.close()
+        self.assertEqual(len(hook), 1)
+
+    def test_read_all_and_lines(self):
+        f, hook = self.stream()
+        self.assertEqual(f.read(), b"line 1\nline 2\n")
+        self.assertEqual(len(hook), 1)
+        f, hook = self.stream()
+        self.assertEqual(list(f), [b"line 1\n", b"line 2\n"])
+        self.assertEqual((len(hook), hook[0].response_bytes), (1, 14))
+
+    def test_finished_on_early_close(self):
+        f, hook = self.stream()
+        with f:
+            f.readline()
+        self.assertEqual(len(hook), 1)
+        self.assertEqual((hook[0].response_bytes, hook[0].error), (7, None))
+        self.assertTrue(f.closed)
+
+    def test_read_error(self):
+        f, hook = self.stream()
+        f._f.close()
+        with self.assertRaises(ValueError):
+            f.read(1)
+        self.assertIsInstance(hook[0].error, ValueError)
+
+
+
+class TestHooks(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.ipfs = self.daemon.api()
+        self.records = Records()
+        self.metrics = MetricsAggregator()
+        self.ipfs._proxy.add_hook(self.records)
+        self.ipfs._proxy.add_hook(self.metrics)
+
+    def tearDown(self):
+        self.ipfs._proxy.close()
+        self.daemon.stop()
+
+    def test_endpoint_of(self):
+        self.assertEqual(endpoint_of("/object/links/QmHash"), "/object/links")
+        self.assertEqual(endpoint_of("/name/resolve"), "/name/resolve")
+        self.assertEqual(endpoint_of("/cat/QmHash/a/b"), "/cat")
+
+    def test_json_calls(self):
+        self.ipfs.version()
+        self.ipfs.version()
+        self.assertEqual(len(self.records), 2)
+        record = self.records[0]
+        self.assertEqual((record.endpoint, record.status, record.error), ("/version", 200, None))
+        self.assertGreater(record.response_bytes, 0)
+        self.assertLessEqual(record.ttfb, record.total_time)
+        stats = self.metrics.endpoint("/version")
+        self.assertEqual((stats.calls, stats.errors, stats.latency.count), (2, 0, 2))
+        self.assertEqual(self.metrics.endpoints(), ["/version"])
+
+    def test_stream_hook_fires_on_early_close(self):
+        key = self.daemon.add_bytes(b"x" * 1000000)
+        f = self.ipfs.file.cat(key)
+        # the record isn't finished before the body has been consumed or closed
+        self.assertEqual(self.records, [])
+        self.assertEqual(len(f.read(1000)), 1000)
+        f.close()
+        self.assertEqual(len(self.records), 1)
+        self.assertEqual((self.records[0].response_bytes, self.records[0].error), (1000, None))
+        self.assertEqual(self.metrics.endpoint("/cat").response_bytes, 1000)
+        f.close()
+        self.assertEqual(len(self.records), 1)
+
+    def test_stream_hook_fires_at_eof(self):
+        key = self.daemon.add_bytes(b"x" * 100000)
+        self.assertEqual(len(self.ipfs.file.cat(key).read()), 100000)
+        self.assertEqual(self.records[0].response_bytes, 100000)
+
+    def test_error(self):
+        with self.assertRaises(ProxyError):
+            self.ipfs.file.cat("QmDoesNotExist")
+        self.assertIsInstance(self.records[0].error, ProxyError)
+        self.assertNotEqual(self.records[0].status, 200)
+        self.assertEqual(self.metrics.endpoint("/cat").errors, 1)
+
+    def test_remove_hook(self):
+        self.ipfs._proxy.remove_hook(self.records)
+        self.ipfs.version()
+        self.assertEqual(self.records, [])
+        self.assertEqual(self.metrics.endpoint("/version").calls, 1)
+
+    def test_debug_hook(self):
+        out = StringIO()
+        self.ipfs._proxy.add_hook(DebugHook(out))
+        self.ipfs.version()
+        self.assertIn("/version", out.getvalue())
+        self.assertIn("status=200", out.getvalue())
+
+    def test_async_hook_fires_on_early_close(self):
+        key = self.daemon.add_bytes(b"x" * 1000000)
+        records = Records()
+
+        async def run():
+            async with AsyncIpfsApi(self.daemon.host, self.daemon.port) as ipfs:
+                ipfs._proxy.add_hook(records)
+                f = await ipfs.file.cat(key)
+                await f.read(1000)
+                self.assertEqual(records, [])
+                await f.close()
+        asyncio.run(run())
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].error, None)
+        self.assertGreaterEqual(records[0].response_bytes, 1000)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+# coding=utf-8
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+
+from ipfs import codec
+from ipfs.api import AsyncIpfsApi
+from ipfs.api.multipart import (MultipartEncoder, FilePart, DirectoryPart, LocalFilePart, iter_chunks, aiter_chunks,
+                                as_part, tree_parts)
+from ipfs.fakedaemon import FakeDaemon, parse_multipart
+
+
+class _Lines(codec.Codec):
+    """ A codec that writes one line per item, so it's dumped through the pipe. """
+
+    def __init__(self):
+        self.written = 0
+
+    def dump(self, obj, f):
+        for item in obj:
+            if (isinstance(item, Exception)):
+                raise item
+            f.write(item + b"\n")
+            self.written += 1
+
+
+
+class TestChunks(unittest.TestCase):
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(b"abc")), [b"abc"])
+        self.assertEqual(list(iter_chunks(BytesIO(b"abcdefg"), 3)), [b"abc", b"def", b"g"])
+        self.assertEqual(list(iter_chunks([b"a", b"", b"b"])), [b"a", b"b"])
+
+    def test_aiter_chunks(self):
+        async def collect(f, chunk_size = 3):
+            return [data async for data in aiter_chunks(f, chunk_size)]
+        self.assertEqual(asyncio.run(collect(BytesIO(b"abcdefg"))), [b"abc", b"def", b"g"])
+        # synchronous iterators are advanced in an executor
+        self.assertEqual(asyncio.run(collect(iter([b"a", b"", b"b"]))), [b"a", b"b"])
+
+
+
+class TestMultipartEncoder(unittest.TestCase):
+
+    def test_single_stream(self):
+        encoder = MultipartEncoder(BytesIO(b"x" * 10), boundary = "frontier", chunk_size = 4)
+        chunks = list(encoder)
+        # the stream is never read as a whole
+        self.assertIn(b"xxxx", chunks)
+        self.assertLessEqual(max(len(c) for c in chunks if (b"x" in c and b"-" not in c)), 4)
+        body = b"".join(chunks)
+        self.assertEqual(encoder.bytes_sent, len(body))
+        self.assertTrue(body.endswith(b"--frontier--\r\n"))
+        self.assertEqual(parse_multipart(body, encoder.content_type),
+                         [("data", "application/octet-stream", b"x" * 10)])
+
+    def test_async_body_equals_sync_body(self):
+        async def collect(encoder):
+            return b"".join([data async for data in encoder])
+        sync = b"".join(MultipartEncoder([b"abc", BytesIO(b"def")], boundary = "b"))
+        encoder = MultipartEncoder([b"abc", BytesIO(b"def")], boundary = "b")
+        self.assertEqual(asyncio.run(collect(encoder)), sync)
+        self.assertEqual(encoder.bytes_sent, len(sync))
+
+    def test_dump_iter_input(self):
+        items = [str(i).encode() * 100 for i in range(50)]
+        body = b"".join(MultipartEncoder(_Lines().dump_iter(items, chunk_size = 256), boundary = "b"))
+        data = parse_multipart(body, "multipart/form-data; boundary=b")[0][2]
+        self.assertEqual(data, b"".join(item + b"\n" for item in items))
+
+
+
+class TestParts(unittest.TestCase):
+
+    def test_as_part(self):
+        part = FilePart("a")
+        self.assertIs(as_part(part), part)
+        self.assertIsInstance(as_part(("dir", None)), DirectoryPart)
+        part = as_part(("a/b", b"data"))
+        self.assertEqual((type(part), part.name, part.f, part.field), (FilePart, "a/b", b"data", "file"))
+        part = as_part(b"data")
+        self.assertEqual((part.name, part.field), ("data", "data"))
+
+    def test_filename_quoting(self):
+        names = ["dir/sub dir/file name.txt", "quote\"d", "semi;colon", "ümlaut/€", "100%"]
+        body = b"".join(MultipartEncoder([(name, name.encode()) for name in names], boundary = "b"))
+        for name in names:
+            headers = FilePart(name).headers()
+            # the header can't be broken by quotes, separators or non-ASCII characters
+            self.assertEqual(headers.count(b"\""), 4)
+            self.assertNotIn(b";", headers.split(b"filename=")[1])
+            headers.decode("ascii")
+        self.assertEqual(parse_multipart(body, "multipart/form-data; boundary=b"),
+                         [(name, "application/octet-stream", name.encode()) for name in names])
+
+    def test_tree_parts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, "root")
+            for path in ("b/d", "a", ".hidden"):
+                os.makedirs(os.path.join(root, path))
+            for path in ("z", "b/d/deep", "b/c", "a/.dot", ".hidden/x"):
+                with open(os.path.join(root, path), "w") as f:
+                    f.write(path)
+
+            parts = tree_parts(root)
+            self.assertEqual([(type(p), p.name) for p in parts],
+                             [(DirectoryPart, "root"),
+                              (LocalFilePart, "root/z"),
+                              (DirectoryPart, "root/a"),
+                              (DirectoryPart, "root/b"),
+                              (LocalFilePart, "root/b/c"),
+                              (DirectoryPart, "root/b/d"),
+                              (LocalFilePart, "root/b/d/deep")])
+            names = [p.name for p in tree_parts(root, hidden = True)]
+            self.assertIn("root/.hidden/x", names)
+            self.assertIn("root/a/.dot", names)
+
+            parts = tree_parts(os.path.join(root, "b", "c"))
+            self.assertEqual([(type(p), p.name) for p in parts], [(LocalFilePart, "c")])
+
+    def test_local_files_are_closed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "file")
+            with open(path, "wb") as f:
+                f.write(b"content")
+            opened = []
+            part = LocalFilePart("file", path)
+            open_part = part.open
+            part.open = lambda: opened.append(open_part()) or opened[-1]
+            body = b"".join(MultipartEncoder([part, part], boundary = "b"))
+            self.assertEqual([d for n, t, d in parse_multipart(body, "multipart/form-data; boundary=b")],
+                             [b"content", b"content"])
+            self.assertEqual([f.closed for f in opened], [True, True])
+
+
+
+class TestAddTree(unittest.TestCase):
+
+    def test_add_tree(self):
+        with tempfile.TemporaryDirectory() as tmp, FakeDaemon() as daemon:
+            root = os.path.join(tmp, "my dir")
+            os.makedirs(os.path.join(root, "sub dir", "deeper"))
+            for path in ("top", "sub dir/mid", "sub dir/deeper/leaf name"):
+                with open(os.path.join(root, path), "w") as f:
+                    f.write(path)
+
+            ipfs = daemon.api()
+            entries = list(ipfs.file.add_tree(root))
+            self.assertEqual(entries[-1]["Name"], "my dir")
+            names = {entry["Name"]: entry["Hash"] for entry in entries}
+            self.assertEqual(set(names), {"my dir", "my dir/top", "my dir/sub dir", "my dir/sub dir/mid",
+                                          "my dir/sub dir/deeper", "my dir/sub dir/deeper/leaf name"})
+            self.assertEqual(ipfs.file.cat(names["my dir/sub dir/deeper/leaf name"]).read(),
+                             b"sub dir/deeper/leaf name")
+            listing = ipfs.file.ls(names["my dir/sub dir"])["Objects"][names["my dir/sub dir"]]
+            self.assertEqual(sorted((l["Name"], l["Hash"]) for l in listing["Links"]),
+                             [("deeper", names["my dir/sub dir/deeper"]), ("mid", names["my dir/sub dir/mid"])])
+            # the whole tree was uploaded with a single request
+            self.assertEqual(daemon.calls["add"], 1)
+
+    def test_async_add_files(self):
+        async def add(daemon):
+            async with AsyncIpfsApi(daemon.host, daemon.port) as ipfs:
+                parts = [DirectoryPart("d"), FilePart("d/empty", b""), FilePart("d/a", BytesIO(b"a"))]
+                return [entry async for entry in await ipfs.file.add_files(parts)]
+        with FakeDaemon() as daemon:
+            entries = asyncio.run(add(daemon))
+            # empty parts don't end the chunked body early
+            self.assertEqual([entry["Name"] for entry in entries], ["d/empty", "d/a", "d"])
+            self.assertEqual(daemon.read_file(daemon.resolve(entries[1]["Hash"])), b"a")
+
+
+
+class TestDumpIter(unittest.TestCase):
+
+    def test_chunks(self):
+        items = [b"a" * 10] * 100
+        chunks = list(_Lines().dump_iter(items, chunk_size = 64))
+        self.assertEqual(b"".join(chunks), b"".join(item + b"\n" for item in items))
+        self.assertTrue(all(len(c) < 64 + 11 for c in chunks))
+
+    def test_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            list(_Lines().dump_iter([b"a", ValueError("broken")]))
+
+    def test_producer_stops_when_closed(self):
+        lines = _Lines()
+        it = lines.dump_iter(iter(lambda: b"a" * 100, None), chunk_size = 100, max_chunks = 2)
+        threads = threading.active_count()
+        next(it)
+        it.close()
+        # the producer notices the closed pipe and ends, though the input is endless
+        for i in range(50):
+            if (threading.active_count() < threads + 1):
+                break
+            threading.Event().wait(0.05)
+        self.assertLessEqual(threading.active_count(), threads)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+# coding=utf-8
+import pickle
+import unittest
+
+from pb2nano.error import Pb2ReaderException, Pb2WriterException
+from pb2nano.protocol import Pb2Enum, Pb2Message, Pb2Protocol
+
+from ipfs import codec
+from ipfs.fakedaemon import multihash
+from ipfs.proto.fast import PBLinkView
+from ipfs.proto.lazy import LazyMessage
+from ipfs.proto.merkledag import PBMerkleDag
+from ipfs.proto.unixfs import UnixFsProtocol
+
+
+GENERIC_NODE = codec.Protobuf2(PBMerkleDag, "PBNode")
+GENERIC_DATA = codec.Protobuf2(UnixFsProtocol, "Data")
+PBNode = codec.PB2(PBMerkleDag, "PBNode")
+UnixFsData = codec.PB2(UnixFsProtocol, "Data")
+
+
+def links(n):
+    return [{"Name": "file-{:d}".format(i), "Hash": multihash(str(i).encode()), "Size": 262158 << i}
+            for i in range(n)]
+
+
+class TestPBNode(unittest.TestCase):
+
+    NODES = [
+        {},
+        {"Data": b""},
+        {"Data": b"\x08\x01" * 100},
+        {"Links": links(3)},
+        {"Data": b"data", "Links": links(40)},
+        {"Links": links(2), "Data": b"data"},
+        {"Links": [{"Hash": multihash(b"x")}]}
+    ]
+
+    def test_fast_codec_is_used(self):
+        self.assertIsInstance(PBNode, codec.FastProtobuf2)
+        self.assertIsInstance(UnixFsData, codec.FastProtobuf2)
+        self.assertEqual(str(PBNode), "protobuf/PBNode")
+
+    def test_same_as_generic(self):
+        for node in self.NODES:
+            data = GENERIC_NODE.dumps(node)
+            self.assertEqual(PBNode.dumps(node), data)
+            self.assertEqual(PBNode.loads(data), GENERIC_NODE.loads(data))
+            self.assertEqual(PBNode.loads(data), node)
+            # re-encoding decoded links doesn't touch their hashes
+            self.assertEqual(PBNode.dumps(PBNode.loads(data)), data)
+
+    def test_link_view(self):
+        link = PBNode.loads(PBNode.dumps({"Links": links(1)}))["Links"][0]
+        self.assertIsInstance(link, PBLinkView)
+        self.assertIsNone(link._hash)
+        self.assertEqual(link["Hash"], links(1)[0]["Hash"])
+        self.assertEqual(link.get("Name"), "file-0")
+        self.assertEqual(dict(link), links(1)[0])
+        self.assertEqual(pickle.loads(pickle.dumps(link)), links(1)[0])
+        self.assertEqual(codec.JSON.loads(codec.JSON.dumps(dict(link))), links(1)[0])
+        with self.assertRaises(TypeError):
+            link["Name"] = "other"
+
+    def test_unknown_fields_are_skipped(self):
+        data = b"\x18\x05" + PBNode.dumps({"Data": b"x"})
+        self.assertEqual(PBNode.loads(data), {"Data": b"x"})
+
+    def test_errors(self):
+        data = PBNode.dumps({"Data": b"data", "Links": links(1)})
+        with self.assertRaises(Pb2ReaderException):
+            PBNode.loads(data[:-3])
+        with self.assertRaises(Pb2WriterException):
+            PBNode.dumps({"Size": 1})
+
+    def test_zero_copy(self):
+        fast = codec.PB2(PBMerkleDag, "PBNode", zero_copy = True)
+        data = PBNode.dumps({"Data": b"data", "Links": links(2)})
+        node = fast.loads(data)
+        self.assertIsInstance(node["Data"], memoryview)
+        self.assertIs(node["Data"].obj, data)
+        self.assertEqual(node, PBNode.loads(data))
+        self.assertEqual(fast.dumps(node), data)
+
+
+class TestUnixFsData(unittest.TestCase):
+
+    def test_same_as_generic(self):
+        for obj in ({"Type": "Directory"},
+                    {"Type": "File", "Data": b"Hello", "filesize": 5},
+                    {"Type": "File", "filesize": 1 << 40, "blocksize": [262144] * 10}):
+            data = GENERIC_DATA.dumps(obj)
+            self.assertEqual(UnixFsData.dumps(obj), data)
+            self.assertEqual(UnixFsData.loads(data), GENERIC_DATA.loads(data))
+            self.assertEqual(UnixFsData.loads(data), obj)
+
+    def test_zero_copy(self):
+        fast = codec.PB2(UnixFsProtocol, "Data", zero_copy = True)
+        block = PBNode.dumps({"Data": UnixFsData.dumps({"Type": "File", "Data": b"Hello"})})
+        node = codec.PB2(PBMerkleDag, "PBNode", zero_copy = True).loads(block)
+        obj = fast.loads(node["Data"])
+        self.assertEqual(obj["Data"], b"Hello")
+        self.assertIs(obj["Data"].obj, block)
+
+    def test_packed_blocksize(self):
+        self.assertEqual(UnixFsData.loads(b"\x08\x02\x22\x02\x05\x06"), {"Type": "File", "blocksize": [5, 6]})
+
+    def test_errors(self):
+        with self.assertRaises(Pb2ReaderException):
+            UnixFsData.loads(b"\x18\x05")
+        with self.assertRaises(Pb2ReaderException):
+            UnixFsData.loads(b"\x08\x09")
+        with self.assertRaises(Pb2WriterException):
+            UnixFsData.dumps({"Type": "Unknown"})
+
+
+class TestLazyMessage(unittest.TestCase):
+
+    def test_same_as_generic(self):
+        lazy = codec.PB2(PBMerkleDag, "PBNode", lazy = True)
+        for node in TestPBNode.NODES:
+            data = GENERIC_NODE.dumps(node)
+            msg = lazy.loads(data)
+            self.assertIsInstance(msg, LazyMessage)
+            self.assertEqual(msg, GENERIC_NODE.loads(data))
+            self.assertEqual(lazy.dumps(msg), data)
+            self.assertEqual(GENERIC_NODE.dumps(msg), data)
+
+    def test_fields_are_decoded_on_access(self):
+        lazy = codec.PB2(UnixFsProtocol, "Data", lazy = True, zero_copy = True)
+        data = UnixFsData.dumps({"Type": "File", "Data": b"x" * 1000, "filesize": 1000, "blocksize": [1, 2]})
+        msg = lazy.loads(data)
+        self.assertEqual(msg["blocksize"], [1, 2])
+        self.assertEqual(msg["filesize"], 1000)
+        self.assertIn("Data", msg)
+        self.assertNotIn("Data", msg._values)
+        self.assertIsInstance(msg["Data"], memoryview)
+        self.assertEqual(list(msg), ["Type", "Data", "filesize", "blocksize"])
+
+    def test_nested_messages_are_lazy(self):
+        lazy = codec.PB2(PBMerkleDag, "PBNode", lazy = True)
+        link = lazy.loads(PBNode.dumps({"Links": links(2)}))["Links"][1]
+        self.assertIsInstance(link, LazyMessage)
+        self.assertIsNone(link._index)
+        self.assertEqual(link["Hash"], links(2)[1]["Hash"])
+
+    def test_generic_message(self):
+        lazy = codec.Protobuf2(UnixFsProtocol, "Metadata", lazy = True)
+        self.assertEqual(lazy.loads(b"\x0a\x09text/html"), {"MimeType": "text/html"})
+        with self.assertRaises(Pb2ReaderException):
+            lazy.loads(b"")
+
+    def test_packed_and_unknown_fields(self):
+        lazy = codec.PB2(UnixFsProtocol, "Data", lazy = True)
+        self.assertEqual(lazy.loads(b"\x08\x02\x22\x02\x05\x06\x28\x01"), {"Type": "File", "blocksize": [5, 6]})
+
+
+    SCALARS = Pb2Protocol() \
+              .enum(Pb2Enum("Sign").define("MINUS", -1).define("PLUS", 1)) \
+              .message(Pb2Message("Scalars")
+                       .field("optional", "int32", "i32", 1)
+                       .field("optional", "int64", "i64", 2)
+                       .field("optional", "sint32", "s32", 3)
+                       .field("optional", "sint64", "s64", 4)
+                       .field("optional", "fixed32", "f32", 5)
+                       .field("optional", "sfixed64", "sf64", 6)
+                       .field("optional", "double", "d", 7)
+                       .field("optional", "float", "f", 8)
+                       .field("optional", "Sign", "sign", 9)
+                       .field("repeated", "sint32", "packed", 10)
+                       .field("repeated", "sfixed32", "fixed", 11))
+
+    def test_scalar_types(self):
+        lazy = codec.Protobuf2(self.SCALARS, "Scalars", lazy = True)
+        data = bytes.fromhex(
+            "08 ffffffffffffffffff01"      # i32 = -1
+            "10 80808080808080808001"      # i64 = -2 ** 63
+            "18 03"                        # s32 = -2
+            "20 feffffffffffffffff01"      # s64 = 2 ** 63 - 1
+            "2d ffffffff"                  # f32 = 2 ** 32 - 1
+            "31 feffffffffffffff"          # sf64 = -2
+            "39 000000000000f83f"          # d = 1.5
+            "45 0000c0bf"                  # f = -1.5
+            "48 ffffffffffffffffff01"      # sign = MINUS
+            "52 03 01 02 03"               # packed = [-1, 1, -2]
+            "5d feffffff"                  # fixed = [-2], not packed
+            "5a 08 01000000 00000080")     # fixed += [1, -2 ** 31], packed
+        self.assertEqual(dict(lazy.loads(data)), {
+            "i32": -1, "i64": -2 ** 63, "s32": -2, "s64": 2 ** 63 - 1, "f32": 2 ** 32 - 1, "sf64": -2,
+            "d": 1.5, "f": -1.5, "sign": "MINUS", "packed": [-1, 1, -2], "fixed": [-2, 1, -2 ** 31]})
+
+    def test_wire_type_mismatch(self):
+        lazy = codec.Protobuf2(self.SCALARS, "Scalars", lazy = True)
+        for data in ("28 01", "5a 03 010000"):
+            with self.assertRaises(Pb2ReaderException):
+                dict(lazy.loads(bytes.fromhex(data)))
+
+    def test_unsupported_types_are_rejected(self):
+        protocol = Pb2Protocol() \
+                   .message(Pb2Message("Outer").field("optional", "Inner", "inner", 1)) \
+                   .message(Pb2Message("Inner").field("optional", "uint128", "x", 1))
+        with self.assertRaises(ValueError):
+            codec.Protobuf2(protocol, "Outer", lazy = True)
+        # the generic reader fails only when it meets the field
+        codec.Protobuf2(protocol, "Outer")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,25 @@ from io import BytesIO
 
 __author__ = 'Lorenzo'
 
+from ipfs import codec
 from ipfs.api import HttpProxy
+from ipfs.api.proxy import Proxy, Endpoint
+
+
+class RecordingProxy:
+    """ A root proxy that records calls and returns a fixed response. """
+
+    def __init__(self, response = b'{"Key": "value"}'):
+        self.root = Proxy(self, "")
+        self.calls = []
+        self.response = response
+
+    def _call_endpoint(self, path, args, opts, f_in):
+        self.calls.append((path, args, opts, f_in))
+        return BytesIO(self.response)
+
+    def _load_output(self, outputenc, out):
+        return outputenc.load(out)
 
 
 class TestFile(unittest.TestCase):
@@ -14,6 +32,68 @@ class TestFile(unittest.TestCase):
     def test_call_endopoints(self):
         pass
 
+
+class TestProxyCache(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = RecordingProxy()
+
+    def test_attribute_children_are_cached(self):
+        root = self.proxy.root
+        self.assertIs(root.object.links, root.object.links)
+        self.assertEqual(root.object.links.path, "/object/links")
+
+    def test_item_children_are_not_cached(self):
+        links = self.proxy.root.object.links
+        self.assertIsNot(links["key"], links["key"])
+        self.assertNotIn("key", links.__dict__)
+
+    def test_encoded_proxies_are_cached(self):
+        links = self.proxy.root.object.links
+        self.assertIs(links.with_outputenc(codec.JSON), links.with_outputenc(codec.JSON))
+        self.assertIsNot(links.with_outputenc(codec.JSON), links.with_outputenc(codec.JSONV))
+
+    def test_dunder_attributes_are_not_proxied(self):
+        with self.assertRaises(AttributeError):
+            self.proxy.root.__wrapped__
+
+
+class TestEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = RecordingProxy()
+
+    def test_compile(self):
+        links = self.proxy.root.object.links.compile(codec.JSON)
+        self.assertIsInstance(links, Endpoint)
+        self.assertEqual(links("key"), {"Key": "value"})
+        self.assertEqual(self.proxy.calls, [("/object/links", ("key",), {"encoding": "json"}, None)])
+
+    def test_compile_encoding_proxy(self):
+        put = self.proxy.root.object.put.with_inputenc(codec.JSON).with_outputenc(codec.JSON).compile()
+        self.assertIs(put.inputenc, codec.JSON)
+        self.assertIs(put.outputenc, codec.JSON)
+        put(_in = {"Data": "foo"})
+        path, args, opts, f_in = self.proxy.calls[0]
+        self.assertEqual(opts, {"encoding": "json", "inputenc": "json"})
+        self.assertEqual(b"".join(f_in), b'{"Data": "foo"}')
+
+    def test_compiled_matches_chain(self):
+        self.proxy.root.object.data["key"](opt = 1)
+        self.proxy.root.object.data.compile()("key", opt = 1)
+        (path1, args1, opts1, _), (path2, args2, opts2, _) = self.proxy.calls
+        self.assertEqual(path1, "/object/data/key")
+        self.assertEqual((path2, args2), ("/object/data", ("key",)))
+        self.assertEqual(opts1, opts2)
+
+    def test_api_uses_compiled_endpoints(self):
+        from ipfs.api import IpfsApi
+        ipfs = IpfsApi(proxy = self.proxy)
+        ipfs.object.links("QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn")
+        ipfs.object.patch("QmA").add_link("name", "QmB")
+        self.assertEqual(self.proxy.calls[0][:2], ("/object/links", ("QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn",)))
+        self.assertEqual(self.proxy.calls[1][:2], ("/object/patch", ("QmA", "add-link", "name", "QmB")))
+
+
 if __name__ == '__main__':
     unittest.main()
-
@@ -0,0 +1,127 @@
+# coding=utf-8
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+from ipfs.api import IpfsApi, HttpProxy
+from ipfs.api.deadline import DeadlineExceeded, deadline, expires_at
+from ipfs.api.schedule import (Scheduler, TokenBucket, priority, current_priority,
+                               INTERACTIVE, NORMAL, BACKGROUND)
+from ipfs.fakedaemon import FakeDaemon
+
+
+class TestPriority(unittest.TestCase):
+
+    def test_context(self):
+        self.assertEqual(current_priority(), NORMAL)
+        with priority(BACKGROUND):
+            self.assertEqual(current_priority(), BACKGROUND)
+            with priority(INTERACTIVE):
+                self.assertEqual(current_priority(), INTERACTIVE)
+            self.assertEqual(current_priority(), BACKGROUND)
+        self.assertEqual(current_priority(), NORMAL)
+        with self.assertRaises(ValueError):
+            with priority("urgent"):
+                pass
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rate(self):
+        bucket = TokenBucket(10, 2)
+        now = time.monotonic()
+        self.assertEqual(bucket.take(now), 0.0)
+        self.assertEqual(bucket.take(now), 0.0)
+        self.assertAlmostEqual(bucket.take(now), 0.1)
+        self.assertEqual(bucket.take(now + 0.11), 0.0)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_priority_order(self):
+        scheduler = Scheduler(max_in_flight = 1)
+        scheduler.acquire()
+        order = []
+
+        def call(cls):
+            scheduler.acquire(cls)
+            order.append(cls)
+            scheduler.release()
+
+        threads = []
+        for cls in (BACKGROUND, NORMAL, INTERACTIVE):
+            threads.append(Thread(target = call, args = (cls,)))
+            threads[-1].start()
+            while (scheduler.stats().classes[cls].queued == 0):
+                time.sleep(0.001)
+        scheduler.release()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(order, [INTERACTIVE, NORMAL, BACKGROUND])
+        stats = scheduler.stats()
+        self.assertEqual((stats.in_flight, stats.queued), (0, 0))
+        self.assertEqual(stats.classes[NORMAL].admitted, 2)
+
+    def test_rate_limit(self):
+        scheduler = Scheduler(max_in_flight = 10, rates = {BACKGROUND: (20, 1)})
+        start = time.monotonic()
+        for i in range(5):
+            scheduler.acquire(BACKGROUND)
+            scheduler.release()
+        self.assertGreater(time.monotonic() - start, 0.15)
+        # other classes aren't limited
+        start = time.monotonic()
+        for i in range(5):
+            scheduler.acquire(NORMAL)
+            scheduler.release()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_deadline(self):
+        scheduler = Scheduler(max_in_flight = 1)
+        scheduler.acquire()
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.acquire(NORMAL, expires_at(0.05))
+        stats = scheduler.stats().classes[NORMAL]
+        self.assertEqual((stats.queued, stats.timeouts), (0, 1))
+
+
+class TestSchedulingProxy(unittest.TestCase):
+
+    def test_cap(self):
+        with FakeDaemon(latency = 0.02) as daemon:
+            key = daemon.put_node(b"Hello World")
+            proxy = HttpProxy(daemon.host, daemon.port, schedule = Scheduler(max_in_flight = 2))
+            ipfs = IpfsApi(proxy = proxy)
+            with ThreadPoolExecutor(6) as pool:
+                results = list(pool.map(lambda i: ipfs.object.data(key).read(), range(12)))
+            with priority(BACKGROUND):
+                ipfs.version()
+            proxy.close()
+
+        self.assertEqual(results, [b"Hello World"] * 12)
+        stats = proxy.schedule_stats()
+        self.assertEqual(stats.in_flight, 0)
+        self.assertEqual(stats.classes[NORMAL].admitted, 12)
+        self.assertEqual(stats.classes[BACKGROUND].admitted, 1)
+        self.assertGreater(stats.classes[NORMAL].max_wait, 0.01)
+
+    def test_errors_release(self):
+        with FakeDaemon() as daemon:
+            proxy = HttpProxy(daemon.host, daemon.port, schedule = Scheduler(max_in_flight = 1))
+            ipfs = IpfsApi(proxy = proxy)
+            for i in range(3):
+                with self.assertRaises(Exception):
+                    ipfs.object.data("QmUnknown")
+            with deadline(1.0):
+                self.assertIn("Version", ipfs.version())
+            proxy.close()
+        self.assertEqual(proxy.schedule_stats().in_flight, 0)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(HttpProxy("localhost", 5001).schedule_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# coding=utf-8
+import gc
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+from ipfs.api import IpfsApi, HttpProxy
+from ipfs.api.session import PoolStats, SharedSession, ThreadLocalSessions
+from ipfs.api.unix import UnixHttpProxy
+from ipfs.fakedaemon import FakeDaemon
+
+
+class TestSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+
+    def tearDown(self):
+        self.daemon.stop()
+
+    def api(self, sessions):
+        return IpfsApi(proxy = HttpProxy(self.daemon.host, self.daemon.port, sessions = sessions))
+
+    def test_pool_stats(self):
+        stats = PoolStats(sessions = 1, pools = 1, connections = 2, requests = 5)
+        self.assertEqual((stats.hits, stats.misses), (3, 2))
+        self.assertEqual(stats.as_dict()["hits"], 3)
+        self.assertEqual(PoolStats(connections = 2).hits, 0)
+
+    def test_shared_session_reuses_connection(self):
+        sessions = SharedSession()
+        ipfs = self.api(sessions)
+        for i in range(5):
+            ipfs.version()
+        stats = sessions.stats()
+        self.assertEqual((stats.sessions, stats.pools, stats.connections, stats.requests), (1, 1, 1, 5))
+        self.assertEqual(stats.hits, 4)
+        ipfs._proxy.close()
+
+    def test_stats_survive_close(self):
+        sessions = SharedSession()
+        ipfs = self.api(sessions)
+        ipfs.version()
+        ipfs.version()
+        ipfs._proxy.close()
+        stats = sessions.stats()
+        self.assertEqual((stats.pools, stats.connections, stats.requests), (0, 1, 2))
+        ipfs.version()
+        self.assertEqual(sessions.stats().requests, 3)
+        ipfs._proxy.close()
+
+    def test_no_keep_alive(self):
+        sessions = SharedSession(keep_alive = False)
+        ipfs = self.api(sessions)
+        for i in range(3):
+            ipfs.version()
+        stats = sessions.stats()
+        self.assertEqual((stats.connections, stats.requests, stats.hits), (3, 3, 0))
+        ipfs._proxy.close()
+
+    def test_thread_local_sessions_survive_thread_exit(self):
+        sessions = ThreadLocalSessions()
+        ipfs = self.api(sessions)
+
+        def calls():
+            ipfs.version()
+            ipfs.version()
+        threads = [Thread(target = calls) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        gc.collect()
+
+        stats = sessions.stats()
+        # the sessions of the threads are retired, but their counters are kept
+        self.assertEqual((stats.sessions, stats.pools), (0, 0))
+        self.assertEqual((stats.connections, stats.requests, stats.hits), (3, 6, 3))
+        ipfs.version()
+        stats = sessions.stats()
+        self.assertEqual((stats.sessions, stats.connections, stats.requests), (1, 4, 7))
+        ipfs._proxy.close()
+
+    def test_pool_size(self):
+        self.daemon.latency = 0.05
+        for block, bounded in ((True, True), (False, False)):
+            sessions = SharedSession(pool_maxsize = 1, pool_block = block)
+            ipfs = self.api(sessions)
+            with ThreadPoolExecutor(4) as pool:
+                list(pool.map(lambda i: ipfs.version(), range(8)))
+            stats = sessions.stats()
+            self.assertEqual(stats.requests, 8)
+            if (bounded):
+                # all calls wait for the only connection
+                self.assertEqual(stats.connections, 1)
+            else:
+                # calls open extra connections, which are discarded afterwards
+                self.assertGreater(stats.connections, 1)
+            ipfs._proxy.close()
+
+
+class TestUnixSessions(unittest.TestCase):
+
+    def test_unix_socket_pool_stats(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'api.sock')
+            with FakeDaemon(unix_socket = path):
+                for keep_alive, connections in ((True, 1), (False, 3)):
+                    proxy = UnixHttpProxy(path, sessions = SharedSession(keep_alive = keep_alive))
+                    ipfs = IpfsApi(proxy = proxy)
+                    for i in range(3):
+                        ipfs.version()
+                    stats = proxy.pool_stats()
+                    self.assertEqual((stats.connections, stats.requests), (connections, 3))
+                    proxy.close()
+
+    def test_unix_socket_owns_strategy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'api.sock')
+            with FakeDaemon(unix_socket = path) as daemon:
+                sessions = SharedSession(pool_maxsize = 3)
+                # the strategy has created its session already
+                session = sessions.get()
+                proxy = UnixHttpProxy(path, sessions = sessions)
+                self.assertIsNot(proxy.sessions, sessions)
+                self.assertEqual(proxy.sessions.pool_maxsize, 3)
+                self.assertIn('Version', IpfsApi(proxy = proxy).version())
+                self.assertIs(sessions.get(), session)
+                self.assertNotIn('http+unix://', session.adapters)
+                self.assertEqual(sessions.stats().requests, 0)
+                proxy.close()
+
+    def test_unix_socket_stats_survive_close(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'api.sock')
+            with FakeDaemon(unix_socket = path):
+                proxy = UnixHttpProxy(path)
+                ipfs = IpfsApi(proxy = proxy)
+                for i in range(3):
+                    ipfs.version()
+                proxy.close()
+                stats = proxy.pool_stats()
+                self.assertEqual((stats.pools, stats.connections, stats.requests), (0, 1, 3))
+                ipfs.version()
+                stats = proxy.pool_stats()
+                self.assertEqual((stats.pools, stats.connections, stats.requests), (1, 2, 4))
+                proxy.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# coding=utf-8
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+
+import requests
+
+from ipfs.api import AsyncIpfsApi, IpfsApi
+from ipfs.api.proxy import ProxyError
+from ipfs.api.unix import UnixAdapter, UnixHttpProxy
+from ipfs.fakedaemon import FakeDaemon
+
+
+class TestUnixHttpProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # spaces in the path must not end up in an URL
+        self.path = os.path.join(self.tmp.name, "ipfs api.sock")
+        self.daemon = FakeDaemon(unix_socket = self.path).start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.tmp.cleanup()
+
+    def test_calls(self):
+        ipfs = IpfsApi(unix_socket = self.path)
+        self.assertIsInstance(ipfs._proxy, UnixHttpProxy)
+        self.assertIn("Version", ipfs.version())
+        key = self.daemon.add_bytes(b"Hello World")
+        self.assertEqual(ipfs.file.cat(key).read(), b"Hello World")
+        self.assertEqual(self.daemon.calls["version"], 1)
+        ipfs._proxy.close()
+
+    def test_streamed_input(self):
+        ipfs = IpfsApi(unix_socket = self.path)
+        entries = list(ipfs.file.add_files([("dir", None), ("dir/file", BytesIO(b"x" * 200000))]))
+        self.assertEqual([entry["Name"] for entry in entries], ["dir/file", "dir"])
+        self.assertEqual(ipfs.file.cat(entries[0]["Hash"]).read(), b"x" * 200000)
+        ipfs._proxy.close()
+
+    def test_error_status(self):
+        ipfs = IpfsApi(unix_socket = self.path)
+        with self.assertRaises(ProxyError):
+            ipfs.file.cat("QmDoesNotExist")
+        # the connection is still usable
+        self.assertIn("Version", ipfs.version())
+        ipfs._proxy.close()
+
+    def test_adapter_ignores_host(self):
+        session = requests.Session()
+        session.mount("http://", UnixAdapter(self.path))
+        response = session.post("http://example.invalid:1234/api/v0/version")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Version", response.json())
+        session.close()
+
+    def test_missing_socket(self):
+        ipfs = IpfsApi(unix_socket = os.path.join(self.tmp.name, "missing.sock"))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            ipfs.version()
+        ipfs._proxy.close()
+
+    def test_async_calls(self):
+        key = self.daemon.add_bytes(b"Hello World")
+
+        async def run():
+            async with AsyncIpfsApi(unix_socket = self.path) as ipfs:
+                version = await ipfs.version()
+                f = await ipfs.file.cat(key)
+                return version, await f.read()
+        version, data = asyncio.run(run())
+        self.assertIn("Version", version)
+        self.assertEqual(data, b"Hello World")
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,9 +10,11 @@ Usage:
 
 import unittest
 import io
+import os
 from hashlib import sha1
 
 from ipfs.api import IpfsApi
+from ipfs.fakedaemon import FakeDaemon, CHUNK_SIZE
 from ipfs.unixfs import UnixFs
 
 
@@ -141,6 +143,52 @@ class TestUnixFs(unittest.TestCase):
         del cls
 
 
+class TestUnixFsOffline(unittest.TestCase):
+    """ Reads files from a :py:class:`~ipfs.fakedaemon.FakeDaemon`. """
+
+    def setUp(self):
+        self.daemon = FakeDaemon().start()
+        self.ipfs = self.daemon.api()
+        self.fs = UnixFs(self.ipfs)
+        self.data = os.urandom(2 * CHUNK_SIZE + 100)
+        self.key = self.daemon.add_bytes(self.data)
+
+    def tearDown(self):
+        self.ipfs._proxy.close()
+        self.daemon.stop()
+
+    def test_block_data_is_not_copied(self):
+        chunk_offset, chunk_size, block = next(self.fs.file(self.key)._block_index.get_chunks(0, 1))
+        value = block._node.value
+        self.assertIsInstance(value["Data"], memoryview)
+
+    def test_readall(self):
+        with self.fs.open(self.key, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_readinto_across_blocks(self):
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(bytearray(200))
+        with self.fs.open(self.key, "rb") as f:
+            f.seek(CHUNK_SIZE - 100, io.SEEK_SET)
+            self.assertEqual(f.readinto(view), 200)
+            self.assertEqual(view.tobytes(), self.data[CHUNK_SIZE - 100 : CHUNK_SIZE + 100])
+            self.assertEqual(f.readinto(buf), CHUNK_SIZE)
+            self.assertEqual(buf, self.data[CHUNK_SIZE + 100 : 2 * CHUNK_SIZE + 100])
+
+    def test_block_data_is_not_cached(self):
+        with self.fs.open(self.key, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        # the views of the blocks would keep the responses alive
+        self.assertLess(self.fs._dag.cache_stats().size, CHUNK_SIZE)
+        calls = self.daemon.calls["object/data"]
+        with self.fs.open(self.key, "rb") as f:
+            f.read()
+        # only the blocks are fetched again, the root node is cached
+        self.assertEqual(self.daemon.calls["object/data"], calls + 3)
+
+
+
 if __name__ == '__main__':
     unittest.main()
 